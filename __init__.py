@@ -1,4 +1,4 @@
-from os.path import dirname
+from os.path import dirname, join
 import datetime
 
 from adapt.intent import IntentBuilder
@@ -14,19 +14,29 @@ Note: the @adds_context / @removes_context can't be used with the Remove / set c
 from mycroft.util.parse import extract_number
 from mycroft.audio import wait_while_speaking
 
-import pafy
-import pychromecast
-from pychromecast.controllers.youtube import YouTubeController
-
 import urllib.error
 import urllib.parse
-import urllib.request
 
-import requests
-import re
+import mimetypes
 import time
 import json
 import random
+import threading
+
+from .kodi_addons import AddonRegistry
+from .kodi_cast import CastSessions
+from .kodi_discovery import KodiDiscovery
+from .kodi_events import KodiEventListener
+from .kodi_fleet import DEFAULT_NAME, KodiFleet, build_kodi_path, parse_targets
+from .kodi_health import KodiHealth
+from .kodi_library import KodiLibrary, LibraryQuery
+from .kodi_metrics import metrics
+from .kodi_notifier import KodiNotifier
+from .kodi_parser import UtteranceParser, parse_letter, parse_volume
+from .kodi_proxy import KodiStreamProxy
+from .kodi_rpc import KodiRpc, KodiTimeout, KodiUnavailable, deadline
+from .kodi_search import TitleIndex, normalize_title, unique_titles
+from .kodi_youtube import DataApiSearch, HtmlSearch, StreamResolver, YoutubeSearch, video_id_of
 
 _author__ = 'PCWii'
 this_release = "20190519"
@@ -38,18 +48,35 @@ class KodiSkill(MycroftSkill):
     """
     A Skill to control playback on a Kodi instance via the json-rpc interface.
     """
+    # the letters and digit of each key for kodi's sms style list jumps (the jumpsms2 to jumpsms9 actions)
+    sms_keys = {"2": "abc2", "3": "def3", "4": "ghi4", "5": "jkl5", "6": "mno6", "7": "pqrs7", "8": "tuv8",
+                "9": "wxyz9"}
+
     def __init__(self):
         super(KodiSkill, self).__init__(name="KodiSkill")
         self.kodi_path = ""
+        self.kodi_settings = None  # the connection settings kodi was last set up from
         self.youtube_id = []
         self.youtube_search = ""
         self.kodi_payload = ""
         self.cv_payload = ""
-        self.list_payload = ""
-        self.json_header = {'content-type': 'application/json'}
+        self.kodi = KodiRpc()
+        self.events = KodiEventListener()
+        self.addons = AddonRegistry(self.kodi)
+        self.fleet = KodiFleet()  # every kodi in the house, this skill's kodi is named "kodi"
+        self.health = KodiHealth()  # pings the fleet, commands to a host that is down fail at once
+        self.notifier = KodiNotifier(self.post_kodi_notification)
+        self.youtube = YoutubeSearch()  # searches in the background, remembers what was found per query
+        self.youtube_api_key = ""
+        self.youtube_timeout = 8.0  # seconds to wait for a youtube search before giving up
+        self.streams = StreamResolver()  # audio stream urls per video id, reused until their signature expires
+        self.stream_timeout = 20.0  # seconds to wait for a stream url to be resolved
+        self.stream_prefetch = 2  # the next videos of a playlist resolved while the current one plays
+        self.casts = CastSessions()  # connected chromecasts, reused from one command to the next
+        self.proxy = KodiStreamProxy()  # streams library files to the chromecast, started on first use
+        self.notification_timeout = 1.0  # notifications are best effort, never wait long on kodi
         self.json_response = ""
         self.cv_response = ""
-        self.list_response = ""
         self._is_setup = False
         self.playing_status = False
         self.notifier_bool = False
@@ -59,7 +86,15 @@ class KodiSkill(MycroftSkill):
         self.use_cv = False
         self.start_time = ""
         self.end_time = ""
-        self.music_dict = []
+        self.library = None
+        self.parser = None
+        self.fuzzy_min_score = 0.5  # ranked movies below this score are not offered
+        self.fuzzy_play_score = 0.8  # a ranked movie at or above this score can be played directly
+        self.fuzzy_margin = 0.1  # how far the best ranked movie must lead the next to be played directly
+        self.max_results = 250  # the most matches a title search keeps, more than this is too broad to page through
+        # seconds a whole command may spend talking to kodi, shared by every call it makes
+        self.deadlines = {"play_film": 1.5, "play_music": 3.0, "player": 1.0}
+        self.max_cursor_steps = 50  # the most key presses a single cursor command sends
 
     def initialize(self):
         self.load_data_files(dirname(__file__))
@@ -67,24 +102,36 @@ class KodiSkill(MycroftSkill):
         #  Check and then monitor for credential changes
         #self.settings.set_changed_callback(self.on_websettings_changed)
         self.settings_change_callback = self.on_websettings_changed
+        self.library = KodiLibrary(self.kodi, join(self.file_system.path, "kodi_library.db"))
+        self.parser = UtteranceParser(join(dirname(__file__), "vocab", self.lang))
+        self.events.add_listener("VideoLibrary.", self.library.handle_notification)
+        self.events.add_listener("AudioLibrary.", self.library.handle_notification)
+        self.events.add_listener("AddonManager.", self.addons.invalidate)
         self.on_websettings_changed()
+        self.schedule_repeating_event(self.sync_library, None, 3600, name='KodiLibrarySync')
+        self.schedule_repeating_event(self.dump_metrics, None, 60, name='KodiMetricsDump')
+        self.notifier.start()
+        self.health.start()
         self.add_event('recognizer_loop:wakeword', self.handle_listen)
         self.add_event('recognizer_loop:utterance', self.handle_utterance)
         self.add_event('speak', self.handle_speak)
 
         # eg. stop the movie
         stop_intent = IntentBuilder("StopIntent"). \
-            require("StopKeyword").one_of("FilmKeyword", "KodiKeyword", "YoutubeKeyword", "MusicKeyword").build()
+            require("StopKeyword").one_of("FilmKeyword", "KodiKeyword", "YoutubeKeyword", "MusicKeyword"). \
+            optionally("AllKeyword").build()
         self.register_intent(stop_intent, self.handle_stop_intent)
 
         # eg. pause the movie
         pause_intent = IntentBuilder("PauseIntent"). \
-            require("PauseKeyword").one_of("FilmKeyword", "KodiKeyword", "YoutubeKeyword", "MusicKeyword").build()
+            require("PauseKeyword").one_of("FilmKeyword", "KodiKeyword", "YoutubeKeyword", "MusicKeyword"). \
+            optionally("AllKeyword").build()
         self.register_intent(pause_intent, self.handle_pause_intent)
 
         # eg. resume the movie
         resume_intent = IntentBuilder("ResumeIntent"). \
-            require("ResumeKeyword").one_of("FilmKeyword", "KodiKeyword", "YoutubeKeyword", "MusicKeyword").build()
+            require("ResumeKeyword").one_of("FilmKeyword", "KodiKeyword", "YoutubeKeyword", "MusicKeyword"). \
+            optionally("AllKeyword").build()
         self.register_intent(resume_intent, self.handle_resume_intent)
 
         # eg. turn kodi notifications on
@@ -102,72 +149,132 @@ class KodiSkill(MycroftSkill):
     def on_websettings_changed(self):  # called when updating mycroft home page
         # if not self._is_setup:
         LOG.info('Websettings have changed! Updating path data')
-        kodi_ip = self.settings.get("kodi_ip", "192.168.0.32")
+        kodi_ip = self.settings.get("kodi_ip", "")
         kodi_port = self.settings.get("kodi_port", "8080")
+        youtube_api_key = self.settings.get("youtube_api_key", "")
+        if youtube_api_key != self.youtube_api_key:  # search with the data api once a key is set
+            self.youtube_api_key = youtube_api_key
+            self.youtube.set_backend(DataApiSearch(youtube_api_key) if youtube_api_key else HtmlSearch())
+        kodi_settings = (kodi_ip, kodi_port) + tuple(self.settings.get(each_name) for each_name in
+                                                     ("kodi_user", "kodi_pass", "kodi_timeout", "kodi_tcp_port",
+                                                      "kodi_fleet"))
+        if kodi_settings == self.kodi_settings:
+            return  # nothing kodi is set up from changed, there is no need to reconnect or resync
+        self.kodi_settings = kodi_settings
+        if kodi_ip and kodi_port:
+            self.connect_kodi(kodi_ip, kodi_port)
+        else:  # no address was configured, look for a kodi on the local network
+            threading.Thread(target=self.discover_kodi, args=(kodi_port,), daemon=True).start()
+
+    # find kodi with an SSDP search and connect to the first instance that answers
+    def discover_kodi(self, kodi_port=8080):
+        try:
+            found = KodiDiscovery(default_port=int(kodi_port or 8080)).search()
+        except Exception as e:
+            LOG.error(e)
+            return
+        if found:
+            LOG.info("Using the discovered kodi: " + str(found[0]))
+            self.connect_kodi(found[0]["ip"], found[0]["port"])
+        else:
+            LOG.info("No kodi answered on the local network, set its ip address in the skill settings")
+            self.kodi_settings = None  # search again when the settings are next read
+
+    # point the transport, the fleet, the event listener and the health monitor at kodi_ip
+    def connect_kodi(self, kodi_ip, kodi_port):
         kodi_user = self.settings.get("kodi_user", "")
         kodi_pass = self.settings.get("kodi_pass", "")
+        kodi_timeout = self.settings.get("kodi_timeout", 5)
+        kodi_tcp_port = self.settings.get("kodi_tcp_port", 9090)
+        kodi_fleet = self.settings.get("kodi_fleet", "")
+        try:
+            self.kodi_path = "http://" + kodi_user + ":" + kodi_pass + "@" + kodi_ip + ":" + str(kodi_port) + \
+                             "/jsonrpc"
+            LOG.info(self.kodi_path)
+            self.kodi.configure(self.kodi_path, timeout=float(kodi_timeout or 5))
+            fleet_targets = [(DEFAULT_NAME, self.kodi)]
+            for name, ip, port in parse_targets(kodi_fleet):
+                fleet_targets.append((name, build_kodi_path(ip, port, kodi_user, kodi_pass)))
+            self.fleet.configure(fleet_targets, timeout=float(kodi_timeout or 5))
+            self.health.watch(self.fleet.targets)
+            self.events.start(kodi_ip, kodi_tcp_port or 9090)
+            self.addons.invalidate(forget=True)
+            self._is_setup = True
+            if self.library:
+                self.library.set_host(self.kodi.url)
+                threading.Thread(target=self.sync_library, daemon=True).start()
+        except Exception as e:
+            LOG.error(e)
+            self.kodi_settings = None  # try again when the settings are next read
+
+    # write the latency, rpc and error metrics where a prometheus textfile collector, or a person, can read them
+    def dump_metrics(self, message=None):
         try:
-            if kodi_ip and kodi_port:
-                kodi_ip = self.settings["kodi_ip"  ]
-                kodi_port = self.settings["kodi_port"]
-                kodi_user = self.settings["kodi_user"]
-                kodi_pass = self.settings["kodi_pass"]
-                self.kodi_path = "http://" + kodi_user + ":" + kodi_pass + "@" + kodi_ip + ":" + str(kodi_port) + \
-                                 "/jsonrpc"
-                LOG.info(self.kodi_path)
-                self._is_setup = True
+            metrics.dump(join(self.file_system.path, "kodi_metrics.json"),
+                         join(self.file_system.path, "kodi_metrics.prom"))
         except Exception as e:
             LOG.error(e)
 
+    # replace spoken numbers, ordinals and roman numerals with digits so "rocky two" finds "Rocky II"
     def numeric_replace(self, in_words=""):
-        word_list = in_words.split()
-        return_list = []
-        for each_word in word_list:
-            try:
-                new_word = w2n.word_to_num(each_word)
-            except Exception as e:
-                # LOG.info(e)
-                new_word = each_word
-            return_list.append(new_word)
-            return_string = ' '.join(str(e) for e in return_list)
-        return return_string
+        return normalize_title(in_words)
+
+    # bring the local library index up to date with kodi
+    def sync_library(self, message=None):
+        self.library.sync()
+        try:
+            self.library.index("song", "title")  # build the search index now rather than on the next request
+        except Exception as e:
+            LOG.error(e)
 
     # find the movies in the library that match the optional search criteria
+    @metrics.timed("kodi_step_seconds")
     def find_movies_with_filter(self, title=""):
         title = self.numeric_replace(title)
         found_list = []  # this is a dict
-        movie_list = self.list_all_movies()
         title_list = title.replace("-", "").lower().split()
+        if self.library.is_synced("movie"):
+            # token index lookup, no scan
+            movie_list = self.library.search("movie", title_list, "label", self.max_results)
+        else:  # the index is still loading, let kodi filter its library
+            movie_list = self.list_all_movies(title_list, self.max_results)
+            if not movie_list:  # kodi does not know "2" is "II", fall back to the local index
+                movie_list = self.library.search("movie", title_list, "label", self.max_results)
+        LOG.info("Found " + str(len(movie_list)) + " movies matching: " + title)
         for each_movie in movie_list:
-            movie_name = each_movie["label"].replace("-", "")
-            movie_name = self.numeric_replace(movie_name)
-            LOG.info(movie_name)
-            if all(words in movie_name.lower() for words in title_list):
-                LOG.info("Found " + movie_name + " : " + "MovieID: " + str(each_movie["movieid"]))
-                info = {
-                    "label": each_movie['label'],
-                    "movieid": each_movie['movieid']
-                }
-                found_list.append(info)
-        temp_list = []  # this is a dict
-        for each_movie in found_list:
-            movie_title = str(each_movie['label'])
             info = {
                 "label": each_movie['label'],
                 "movieid": each_movie['movieid']
             }
-            if movie_title not in str(temp_list):
-                temp_list.append(info)
-            else:
-                if len(each_movie['label']) == len(movie_title):
-                    LOG.info('found duplicate')
-                else:
-                    temp_list.append(info)
-        found_list = temp_list
+            found_list.append(info)
+        found_list = unique_titles(found_list)  # remove duplicates
         return found_list  # returns a dictionary of matched movies
 
+    # rank the library movies by how closely they match the spoken title, best first
+    @metrics.timed("kodi_step_seconds")
+    def rank_movies(self, title="", limit=5):
+        ranked_list = []
+        for score, each_movie in self.library.fuzzy_search("movie", self.numeric_replace(title), limit,
+                                                           self.fuzzy_min_score):
+            LOG.info("Ranked " + each_movie["label"] + " : " + "Score: " + str(round(score, 2)))
+            ranked_list.append({
+                "label": each_movie['label'],
+                "movieid": each_movie['movieid'],
+                "score": score
+            })
+        return unique_titles(ranked_list)
+
+    # true when the best ranked movie is close enough, and far enough ahead of the next, to play without asking
+    def is_clear_winner(self, ranked_list):
+        if not ranked_list or ranked_list[0]["score"] < self.fuzzy_play_score:
+            return False
+        return len(ranked_list) < 2 or ranked_list[0]["score"] - ranked_list[1]["score"] >= self.fuzzy_margin
+
     # check if kodi is currently playing, required for some functions
     def is_kodi_playing(self):
+        if self.events.connected:  # the notification socket keeps the player state current
+            self.playing_status = self.events.state.active
+            return self.playing_status
         method = "Player.GetActivePlayers"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -175,7 +282,7 @@ class KodiSkill(MycroftSkill):
             "id": 1
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             parse_response = json.loads(kodi_response.text)["result"]
             if not parse_response:
@@ -187,25 +294,15 @@ class KodiSkill(MycroftSkill):
         LOG.info("Is Kodi Playing?...", str(self.playing_status))
         return self.playing_status
 
-    def list_all_movies(self):
-        method = "VideoLibrary.GetMovies"
-        self.kodi_payload = {
-            "jsonrpc": "2.0",
-            "method": method,
-            "id": 1,
-            "params": {
-                "properties": [
-                ],
-            }
-        }
+    # ask kodi for the movies whose title contains all the search words, up to limit of them,
+    # only label and movieid are returned
+    def list_all_movies(self, search_words=None, limit=None):
+        query = LibraryQuery("movie", properties=[]).contains_words(["label"], search_words or [])
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
-            LOG.info(kodi_response.text)
-            movie_list = json.loads(kodi_response.text)["result"]["movies"]
-            return movie_list
+            return query.fetch(self.kodi, limit)
         except Exception as e:
             LOG.info(e)
-            return "NONE"
+            return []
 
 # Added Music Functions here 20200514 #
     # add the songid to the active playlist songid is an integer
@@ -223,153 +320,92 @@ class KodiSkill(MycroftSkill):
             }
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             #LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
 
-    def list_all_music(self):
-        LOG.info('Refreshing Music List!...')
-        method = "AudioLibrary.GetSongs"
-        self.kodi_payload = {
-            "jsonrpc": "2.0",
-            "method": method,
-            "id": 1,
-            "params": {
-                "properties": [
-                    "artist",
-                    "duration",
-                    "album",
-                    "track"
-                ],
-            }
-        }
+    # ask kodi for the songs where any of the categories contains all the search words,
+    # up to limit of them, only label, songid, artist and album are returned
+    def list_all_music(self, search_words=None, categories=("label",), limit=None):
+        if isinstance(categories, str):
+            categories = [categories]
+        query = LibraryQuery("song", properties=["artist", "album"]).contains_words(list(categories),
+                                                                                  search_words or [])
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
-            ret_music_list = json.loads(kodi_response.text)["result"]["songs"]
-            return ret_music_list
+            return query.fetch(self.kodi, limit)
         except Exception as e:
             LOG.info(e)
-            return "NONE"
+            return []
 
-    def search_music_item(self, search_item, category="label"):
-        # category options: label, artist, album
+    # search every category in one pass, returns a dict of category -> list of matched songs
+    @metrics.timed("kodi_step_seconds")
+    def search_music_categories(self, search_item, categories):
         search_item = self.numeric_replace(search_item)
-        found_list = []  # this is a dict of all the items found that match the search
-        if len(self.music_dict) < 1:  # Only read the music library if it is empty
-            self.music_dict = self.list_all_music()
-        #LOG.info("Music List: " + str(self.music_dict))
         search_words = search_item.replace("-", "").lower().split()
-        search_length = len(search_words)
-        # check each movie in the list for strings that match all the words in the search
         self.start_time = datetime.datetime.now()
-        for each_song in self.music_dict:  # check each song in the list for the one we are looking for
-            if category == "artist":  # artist is an array element so need to specify the index
-                item_name = each_song[category][0].replace("-", "")
-            else:
-                #LOG.info('Not Filtered by Artist: ' + str(each_song))
-                item_name = each_song[category].replace("-", "")
-            if len(item_name) > 0:
-                # print(item_name.lower())
-                item_name = self.numeric_replace(item_name)
-                if all(words in item_name.lower() for words in search_words):
-                    found_length = len(each_song['label'].split())
-                    # print("Found Item: " + item_name + " : " + "SongID: " + str(each_song["songid"]))
-                    info = {
-                        "label": each_song['label'],
-                        "songid": each_song['songid'],
-                        "artist": each_song['artist']
-                    }
-                    found_list.append(info)
-        # remove duplicates
-        temp_list = []  # this is a dict
-        for each_song in found_list:
-            info = {
-                "label": each_song['label'],
-                "songid": each_song['songid'],
-                "artist": each_song['artist']
-            }
-            song_title = str(each_song['label'])
-            if song_title not in str(temp_list):
-                temp_list.append(info)
-            else:
-                if len(each_song['label']) == len(song_title):
-                    LOG.info('found duplicate')
-                else:
-                    temp_list.append(info)
-        found_list = temp_list
+        if self.library.is_synced("song"):
+            # the token index matches the search words against every category at once
+            found_songs = self.library.search_fields("song", search_words, categories, self.max_results)
+        else:  # the index is still loading, let kodi filter its library in a single query
+            song_list = self.list_all_music(search_words, categories, self.max_results)
+            # kodi or-s the categories together, sort its answer back into categories locally
+            found_songs = TitleIndex(song_list, categories).search_fields(search_words, categories)
+            if not any(found_songs.values()):  # kodi does not know "2" is "II", fall back to the local index
+                found_songs = self.library.search_fields("song", search_words, categories, self.max_results)
+        found_lists = {}
+        for each_category in categories:
+            found_list = []  # this is a dict of all the items found that match the search
+            for each_song in found_songs[each_category]:
+                info = {
+                    "label": each_song['label'],
+                    "songid": each_song['songid'],
+                    "artist": each_song['artist']
+                }
+                found_list.append(info)
+            found_lists[each_category] = unique_titles(found_list)  # remove duplicates
         self.end_time = datetime.datetime.now()
         delta_time_s = self.end_time - self.start_time
         LOG.info("Searching and preparing the requested music list took: " + str(delta_time_s) + ", seconds")
-        return found_list  # returns a dictionary of matched movies
+        return found_lists
+
+    def search_music_item(self, search_item, category="label"):
+        # category options: label, artist, album
+        return self.search_music_categories(search_item, [category])[category]  # returns a list of matched songs
 
     def search_music_library(self, search_string, category="any"):
-        found_list = []  # this is a dict that will contain all the items found in the library
         LOG.info("searching the music library for: " + search_string + ", " + category)
-        if category == "any":
-            found_list = self.search_music_item(search_string, category="label")
-            if len(found_list) > 0:
-                return found_list
-            LOG.info("Label: " + search_string + ", Not Found!")
-            found_list = self.search_music_item(search_string, category="artist")
-            if len(found_list) > 0:
-                return found_list
-            LOG.info("Artist: " + search_string + ", Not Found!")
-            found_list = self.search_music_item(search_string, category="album")
-            if len(found_list) == 0:
-                LOG.info("Album: " + search_string + ", Not Found!")
-                return
+        if category == "any":  # label, artist and album are searched together, the first match wins
+            categories = ["label", "artist", "album"]
         else:
-            found_list = self.search_music_item(search_string, category=str(category))
-        if len(found_list) > 0:
-            return found_list
-
+            categories = [str(category)]
+        found_lists = self.search_music_categories(search_string, categories)
+        for each_category in categories:
+            if len(found_lists[each_category]) > 0:
+                return found_lists[each_category]
+            LOG.info(each_category.title() + ": " + search_string + ", Not Found!")
+
+    @metrics.timed("kodi_step_seconds")
     def queue_and_play_music(self, music_playlist):
-        self.clear_playlist()
-        self.music_dict = []
+        # clear, queue every song and start playback in a single round trip
+        batch = self.kodi.batch()
+        batch.add("Playlist.Clear", {"playlistid": 1})
         for each_song in music_playlist:
             LOG.info("Adding to Kodi Playlist: " + str(each_song["label"]) +", ID: "+ str(each_song["songid"]))
-            self.add_song_playlist(each_song["songid"])
-        self.play_normal()
+            batch.add("Playlist.Add", {"playlistid": 1, "item": {"songid": each_song["songid"]}})
+        batch.add("Player.Open", {"item": {"playlistid": 1}})
+        try:
+            with deadline(self.deadlines["play_music"]):
+                batch.send()
+        except Exception as e:
+            LOG.error(e)
 
+    # returns what was spoken in the utterance as a ParseResult, the query is "" when nothing was found
     def parse_music_utterance(self, message):
-        # returns what was spoken in the utterance
-        return_type = "any"
         str_request = str(message.data.get('utterance'))
         LOG.info("Parse Music Received: " + str_request)
-        primary_regex = r"((?<=album) (?P<album>.*$))|((?<=artist) (?P<artist>.*$))|((?<=song) (?P<label>.*$))"
-        if str_request.find('some') != -1:
-            secondary_regex = r"((?<=some) (?P<any>.*$))"
-        else:
-            secondary_regex = r"((?<=play) (?P<any>.*$))"
-        key_found = re.search(primary_regex, str_request)
-        if key_found:
-            LOG.info("Primary Regex Key Found")
-            if key_found.group("label"):
-                LOG.info("found label")
-                return_item = key_found.group("label")
-                return_type = "label"
-            elif key_found.group("artist"):
-                LOG.info("found artist")
-                return_item = key_found.group("artist")
-                return_type = "artist"
-            elif key_found.group("album"):
-                LOG.info("found album")
-                return_item = key_found.group("album")
-                return_type = "album"
-        else:
-            LOG.info("Primary Regex Key Not Found")
-            key_found = re.search(secondary_regex, str_request)
-            if key_found.group("any"):
-                LOG.info("Secondary Regex Key Found")
-                return_item = key_found.group("any")
-                return_type = "any"
-            else:
-                LOG.info("Secondary Regex Key Not Found")
-                return_item = "none"
-                return_type = "none"
-        # Returns the item that was requested and the type of the requested item ie. artist, album, label
-        return return_item, return_type
+        # the field is the item type requested ie. artist, album, label or any
+        return self.parser.parse_music(str_request)
 
 # End of Added Music Functions here 20200514 #
 
@@ -388,7 +424,7 @@ class KodiSkill(MycroftSkill):
             "id": "1"
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
@@ -405,7 +441,7 @@ class KodiSkill(MycroftSkill):
             }
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
@@ -425,8 +461,7 @@ class KodiSkill(MycroftSkill):
             "id": 1
         }
         try:
-            self.cv_response = requests.post(self.kodi_path, data=json.dumps(self.cv_payload),
-                                             headers=self.json_header)
+            self.cv_response = self.kodi.post(self.cv_payload)
             LOG.info(self.cv_response.text)
         except Exception as e:
             LOG.error(e)
@@ -445,8 +480,7 @@ class KodiSkill(MycroftSkill):
             "id": 1
         }
         try:
-            self.json_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload),
-                                               headers=self.json_header)
+            self.json_response = self.kodi.post(self.kodi_payload)
             LOG.info(self.json_response.text)
         except Exception as e:
             LOG.error(e)
@@ -466,7 +500,7 @@ class KodiSkill(MycroftSkill):
             }
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
@@ -484,7 +518,8 @@ class KodiSkill(MycroftSkill):
             "id": 1
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            with deadline(self.deadlines["player"]):
+                kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
@@ -501,71 +536,35 @@ class KodiSkill(MycroftSkill):
             "id": 1
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            with deadline(self.deadlines["player"]):
+                kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
 
-    # check if the youtube addon exists
+    # check if the youtube addon exists, answered from the cached addon registry
     def check_youtube_present(self):
-        method = "Addons.GetAddons"
-        addon_video = "xbmc.addon.video"
-        self.kodi_payload = {
-            "jsonrpc": "2.0",
-            "method": method,
-            "id": "1",
-            "params": {
-                "type": addon_video
-            }
-        }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            return self.addons.has_addon("plugin.video.youtube")
         except Exception as e:
             LOG.info(e)
             return False
-        if "plugin.video.youtube" in kodi_response.text:
-            return True
-        else:
-            return False
 
-    # check if the cinemavision addon exists
+    # check if the cinemavision addon exists, answered from the cached addon registry
     def check_cinemavision_present(self):
-        self.list_payload = {
-            "jsonrpc": "2.0",
-            "method": "Addons.GetAddons",
-            "params": {
-                "type": "xbmc.addon.executable"
-            },
-            "id": "1"
-        }
         try:
-            self.list_response = requests.post(self.kodi_path, data=json.dumps(self.list_payload), headers=self.json_header)
-            LOG.info(self.list_response.text)
+            return self.addons.has_addon("script.cinemavision")
         except Exception as e:
             LOG.info(e)
             return False
-        if "script.cinemavision" in self.list_response.text:
-            return True
-        else:
-            return False
 
     # use regex to find any movie names found in the utterance
     def movie_regex(self, message):
-        film_regex = r"((movie|film) (?P<Film1>.*))| ((movie|film) (?P<Film2>.*)(with|using) (cinemavision))"
-        utt_str = message
-        film_matches = re.finditer(film_regex, utt_str, re.MULTILINE | re.DOTALL)
-        for film_match_num, film_match in enumerate(film_matches):
-            group_id = "Film1"
-            my_movie = "{group}".format(group=film_match.group(group_id))
-            self.cv_request = False
-            if my_movie == "None":
-                group_id = "Film2"
-                my_movie = "{group}".format(group=film_match.group(group_id))
-                self.cv_request = True
-        LOG.info(my_movie)
-        my_movie = re.sub('\W', ' ', my_movie)
-        my_movie = re.sub(' +', ' ', my_movie)
-        return my_movie.strip()
+        movie_request = self.parser.parse_movie(message)
+        if "cinemavision" in movie_request.modifiers:
+            self.cv_request = True
+        LOG.info(movie_request.query)
+        return movie_request.query
 
     # check the cursor control utterance for repeat commands
     def repeat_regex(self, message):
@@ -580,25 +579,14 @@ class KodiSkill(MycroftSkill):
             repeat_value = 1
         return repeat_value
 
-    # send a URI to Chromecast and play
-    def cast_link(self, source_link, device_ip):
-        cast = pychromecast.Chromecast(device_ip)
-        cast.wait()
-        mc = cast.media_controller
+    # send a URI to Chromecast and play, once the device reports it has loaded it
+    def cast_link(self, source_link, device_ip, content_type='video/mp4'):
         LOG.info(source_link)
-        mc.play_media(source_link, 'video/mp4')
-        time.sleep(7) #wait for CC to be ready to play
-        mc.block_until_active()
-        mc.play()
-        #mc.stop()
+        return self.casts.play_media(device_ip, source_link, content_type)
 
     # send a youtube videoID and play
     def cast_youtube(self, video_id, device_ip):
-        cast = pychromecast.Chromecast(device_ip)
-        cast.wait()
-        yt = YouTubeController()
-        cast.register_handler(yt)
-        yt.play_video(video_id)
+        self.casts.play_youtube(device_ip, video_id)
 
     # return the id of a movie from the kodi library based on its name
     def get_kodi_movie_id(self, movie_name):
@@ -606,9 +594,8 @@ class KodiSkill(MycroftSkill):
         my_id = found_list[0]["movieid"]
         return my_id
 
-    # returns the full URI of a movie from the kodi library
-    def get_kodi_movie_path(self, movie_name):
-        movie_id = self.get_kodi_movie_id(movie_name)
+    # returns the file of a movie as kodi knows it, eg. a local path or an smb:// or nfs:// url
+    def get_kodi_movie_file(self, movie_id):
         method = "VideoLibrary.GetMovieDetails"
         kodi_payload = {
             "jsonrpc": "2.0",
@@ -648,17 +635,33 @@ class KodiSkill(MycroftSkill):
                        ],
                        }
         }
+        kodi_response = self.kodi.post(kodi_payload)
+        return json.loads(kodi_response.text)["result"]["moviedetails"]["file"]
+
+    # the url kodi's web server serves a library file from, on the host and port of the json-rpc interface
+    def kodi_vfs_url(self, file_path):
+        base_path = self.kodi.url.rsplit('/jsonrpc', 1)[0] + '/vfs/'
+        return base_path + urllib.parse.quote(file_path, safe='')
+
+    # returns the full URI of a movie from the kodi library
+    def get_kodi_movie_path(self, movie_name):
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
-            movie_path = json.loads(kodi_response.text)["result"]["moviedetails"]["file"]
-            base_path = 'http://' + self.kodi_ip + ':' + self.kodi_port + '/vfs/'
-            url_path = base_path + urllib.parse.quote(movie_path, safe='')
+            movie_id = self.get_kodi_movie_id(movie_name)
+            url_path = self.kodi_vfs_url(self.get_kodi_movie_file(movie_id))
             LOG.info('Found Kodi Movie Path ' + url_path)
             return url_path
         except Exception as e:
             LOG.info(e)
             return "NONE"
 
+    # stream a library movie to the chromecast through the local proxy, kodi keeps its credentials
+    # and the device seeks with range requests, returns True once the device has started it
+    def cast_kodi_movie(self, movie_id, device_ip):
+        movie_file = self.get_kodi_movie_file(movie_id)
+        local_url = self.proxy.add(self.kodi_vfs_url(movie_file), self.kodi.auth, movie_file, device_ip)
+        content_type = mimetypes.guess_type(movie_file)[0] or 'video/mp4'
+        return self.cast_link(local_url, device_ip, content_type)
+
     # play the supplied video_id with the youtube addon
     def play_youtube_video(self, video_id):
         LOG.info('play youtube ID: ' + str(video_id))
@@ -681,20 +684,47 @@ class KodiSkill(MycroftSkill):
         }
         LOG.info(yt_link)
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
 
-    def get_yt_audio_url(self, youtube_url):
-        base_url = 'https://www.youtube.com'
-        abs_url = base_url + youtube_url
-        LOG.debug('pafy processing: ' + abs_url)
-        streams = pafy.new(abs_url)
-        LOG.debug('audiostreams found: ' + str(streams.audiostreams));
-        bestaudio = streams.getbestaudio()
-        LOG.debug('audiostream selected: ' + str(bestaudio));
-        return bestaudio.url
+    # the audio stream url of a youtube video, eg. "/watch?v=<id>", resolved once and then cached
+    # next_urls are the videos queued after it, the first stream_prefetch of them are resolved in the background
+    def get_yt_audio_url(self, youtube_url, next_urls=()):
+        audio_url = self.streams.url(video_id_of(youtube_url), timeout=self.stream_timeout)
+        self.streams.prefetch([video_id_of(each_url) for each_url in list(next_urls)[:self.stream_prefetch]])
+        return audio_url
+
+    # play only the sound of the videos found for query, kodi plays the audio streams itself so the youtube
+    # addon is not needed, links is the answer of the search for query
+    # the first stream is resolved now, the next stream_prefetch results are resolved while it plays and
+    # queued after it, returns False when the search found no video
+    def play_youtube_audio(self, query, links):
+        video_ids = self.youtube.video_ids(query) or [each_link for each_link in links if len(each_link) == 11]
+        video_ids = video_ids[:1 + self.stream_prefetch]
+        if not video_ids:
+            return False
+        audio_url = self.get_yt_audio_url(video_ids[0], video_ids[1:])
+        # playlist 0 is kodi's audio playlist, clear, queue and start it in a single round trip
+        batch = self.kodi.batch()
+        batch.add("Playlist.Clear", {"playlistid": 0})
+        batch.add("Playlist.Add", {"playlistid": 0, "item": {"file": audio_url}})
+        batch.add("Player.Open", {"item": {"playlistid": 0}})
+        with deadline(self.deadlines["player"]):
+            batch.send()
+        if len(video_ids) > 1:
+            threading.Thread(target=self.queue_youtube_audio, args=(video_ids[1:],), daemon=True).start()
+        return True
+
+    # add the audio of the prefetched videos to kodi's audio playlist, in order, as each one is resolved
+    def queue_youtube_audio(self, video_ids):
+        for each_id in video_ids:
+            try:
+                audio_url = self.streams.url(each_id, timeout=self.stream_timeout)
+                self.kodi.call("Playlist.Add", {"playlistid": 0, "item": {"file": audio_url}})
+            except Exception as e:
+                LOG.error(e)
 
     # stop any playing movie not youtube
     def stop_all(self):
@@ -708,7 +738,8 @@ class KodiSkill(MycroftSkill):
             "id": 1
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            with deadline(self.deadlines["player"]):
+                kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
@@ -717,109 +748,51 @@ class KodiSkill(MycroftSkill):
 
     # extract the requested youtube item from the utterance
     def youtube_query_regex(self, req_string):
-        return_list = []
-        pri_regex = re.search(r'play (?P<item1>.*) from youtube', req_string)
-        sec_regex = re.search(r'play some (?P<item1>.*) from youtube|play the (?P<item2>.*)from youtube', req_string)
-        if pri_regex:
-            if sec_regex:  # more items requested
-                temp_results = sec_regex
-            else:  # single item requested
-                temp_results = pri_regex
-        if temp_results:
-            item_result = temp_results.group(temp_results.lastgroup)
-            return_list = item_result
-            LOG.info(return_list)
-            return return_list
+        youtube_request = self.parser.parse_youtube(req_string)
+        LOG.info(youtube_request.query)
+        return youtube_request.query
 
     # extract the youtube links from the provided search_list
+    # returns the first video id and the first playlist id found, from the cache on a repeated search
     def get_youtube_links(self, search_list):
-        # search_text = str(search_list[0])
-        search_text = str(search_list)
-        query = urllib.parse.quote(search_text)
-        url = "https://www.youtube.com/results?search_query=" + query
-        response = urllib.request.urlopen(url)
-        html = response.read()
-        # Get all video links from page
-        temp_links = []
-        all_video_links = re.findall(r'href=\"\/watch\?v=(.{11})', html.decode())
-        for each_video in all_video_links:
-            if each_video not in temp_links:
-                temp_links.append(each_video)
-        video_links = temp_links
-        # Get all playlist links from page
-        temp_links = []
-        all_playlist_results = re.findall(r'href=\"\/playlist\?list\=(.{34})', html.decode())
-        sep = '"'
-        for each_playlist in all_playlist_results:
-            if each_playlist not in temp_links:
-                cleaned_pl = each_playlist.split(sep, 1)[0]  # clean up dirty playlists
-                temp_links.append(cleaned_pl)
-        playlist_links = temp_links
-        yt_links = []
-        if video_links:
-            yt_links.append(video_links[0])
-            LOG.info("Found Single Links: " + str(video_links))
-        if playlist_links:
-            yt_links.append(playlist_links[0])
-            LOG.info("Found Playlist Links: " + str(playlist_links))
-        return yt_links
+        return self.youtube.search(str(search_list)).result(timeout=self.youtube_timeout)
 
     # push a message to the kodi notification popup
+    # called on the notifier thread, errors are counted there
     def post_kodi_notification(self, message):
-        method = "GUI.ShowNotification"
-        display_timeout = 5000
-        self.kodi_payload = {
-            "jsonrpc": "2.0",
-            "method": method,
-            "params": {
-                "title": "Kelsey.AI",
-                "message": str(message),
-                "displaytime": display_timeout,
-            },
-            "id": 1
-        }
-        try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
-            LOG.info(kodi_response.text)
-        except Exception as e:
-            LOG.error(e)
+        fleet_results = self.fleet.notify("Kelsey.AI", str(message), timeout=self.notification_timeout,
+                                          display_time=5000)
+        succeeded, failed = self.fleet.summarize(fleet_results)
+        if not succeeded:  # counted as failed by the notifier
+            raise Exception("Kodi notification failed on: " + ", ".join(failed))
 
     # listening event used for kodi notifications
     def handle_listen(self, message):
         voice_payload = "Listening"
         if self.notifier_bool:
-            try:
-                self.post_kodi_notification(voice_payload)
-            except Exception as e:
-                LOG.error(e)
-                self.on_websettings_changed()
+            self.notifier.post(voice_payload)
 
     # utterance event used for kodi notifications
     def handle_utterance(self, message):
         utterance = message.data.get('utterances')
         voice_payload = utterance
         if self.notifier_bool:
-            try:
-                self.post_kodi_notification(voice_payload)
-            except Exception as e:
-                LOG.error(e)
-                self.on_websettings_changed()
+            self.notifier.post(voice_payload)
 
     # mycroft speaking event used for kodi notificatons
     def handle_speak(self, message):
         voice_payload = message.data.get('utterance')
         if self.notifier_bool:
-            try:
-                self.post_kodi_notification(voice_payload)
-            except Exception as e:
-                LOG.error(e)
-                self.on_websettings_changed()
+            self.notifier.post(voice_payload)
 
     # Primary Play Movie request - now handles music and films with optionally
     @intent_handler(IntentBuilder('PlayLocalIntent').require("AskKeyword").require("KodiKeyword").
                     require("PlayKeyword").optionally("FilmKeyword").
                     optionally("CinemaVisionKeyword").optionally('RandomKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_play_local_intent(self, message):
+        if self.kodi_is_down():
+            return
         LOG.info("Called Play Film Intent")
         if message.data.get("FilmKeyword"):
             LOG.info("Continue with Play Film intent")
@@ -829,14 +802,22 @@ class KodiSkill(MycroftSkill):
             LOG.info("Continue with Play Music intent")
             self.continue_play_music_intent(message)
 
+    @metrics.timed("kodi_intent_seconds")
     def continue_play_music_intent(self, message):
         play_request = self.parse_music_utterance(message)  # get the requested Music Item
         LOG.info("Parse Routine Returned: "+str(play_request))
-        music_playlist = self.search_music_library(play_request[0], category=play_request[1])  # search for the item in the library
-        self.speak_dialog('play.music', data={"title": str(play_request[0]), "category": str(play_request[1])},
+        if not play_request.query:
+            self.speak_dialog('no.results', data={"result": str(message.data.get('utterance'))}, expect_response=False)
+            return
+        music_playlist = self.search_music_library(play_request.query, category=play_request.field)  # search for the item in the library
+        if not music_playlist:
+            self.speak_dialog('no.results', data={"result": play_request.query}, expect_response=False)
+            return
+        self.speak_dialog('play.music', data={"title": play_request.query, "category": play_request.field},
                           expect_response=False)
         self.queue_and_play_music(music_playlist)
 
+    @metrics.timed("kodi_intent_seconds")
     def continue_play_film_intent(self, message):
         if message.data.get("CinemaVisionKeyword"):
             self.cv_request = True
@@ -850,7 +831,7 @@ class KodiSkill(MycroftSkill):
             try:
                 LOG.info("movie: " + movie_name)
                 self.speak_dialog("please.wait")
-                results = self.find_movies_with_filter(movie_name)
+                results = self.find_best_movies(movie_name)
                 self.movie_list = results
                 self.movie_index = 0
                 LOG.info("possible movies are: " + str(results))
@@ -865,50 +846,119 @@ class KodiSkill(MycroftSkill):
                 #####
             except Exception as e:
                 LOG.info('an error was detected')
-                LOG.error(e)
-                self.on_websettings_changed()
+                self.handle_kodi_error(e)
+
+    # the movies matching a spoken title, a single one when it matches exactly or clearly ranks first
+    def find_best_movies(self, movie_name):
+        results = self.find_movies_with_filter(movie_name)
+        if len(results) != 1:  # no single exact match, rank the library by spoken similarity
+            ranked_results = self.rank_movies(movie_name)
+            if self.is_clear_winner(ranked_results):
+                results = ranked_results[:1]
+            elif not results:
+                results = ranked_results
+        return results
+
+    # speak an error when kodi is down or too slow, any other failure re-reads the settings, which only
+    # reconnects when they changed
+    def handle_kodi_error(self, e):
+        LOG.error(e)
+        if isinstance(e, KodiUnavailable):
+            self.speak_dialog("kodi.unavailable", expect_response=False)
+        elif isinstance(e, KodiTimeout):
+            self.speak_dialog("kodi.timeout", expect_response=False)
+        else:
+            self.on_websettings_changed()
+
+    # fail fast with a spoken error, rather than a tcp timeout, while the health monitor sees kodi down
+    def kodi_is_down(self):
+        if self.health.is_up(DEFAULT_NAME) is False:
+            self.speak_dialog("kodi.unavailable", expect_response=False)
+            return True
+        return False
+
+    # the fleet instances an utterance is aimed at, every one for "all" or the rooms named in it
+    # returns None when no room was named, the command is then for this skill's kodi only
+    def fleet_names(self, message):
+        if message.data.get("AllKeyword"):
+            return self.fleet.names()
+        return self.fleet.names_in(message.data.get("utterance", "")) or None
+
+    # tell the user which instances of a fan-out command did not answer
+    def report_fleet_results(self, fleet_results):
+        succeeded, failed = self.fleet.summarize(fleet_results)
+        if failed:
+            LOG.info("Kodi fleet failures: " + str(dict((each_name, fleet_results[each_name]["error"])
+                                                        for each_name in failed)))
+            self.speak_dialog("fleet.failed", data={"result": ", ".join(failed)},
+                              expect_response=False)
 
     # stop film was requested in the utterance
+    @metrics.timed("kodi_intent_seconds")
     def handle_stop_intent(self, message):
         try:
+            fleet_names = self.fleet_names(message)
+            if fleet_names is not None:
+                self.report_fleet_results(self.fleet.stop(fleet_names))
+                return
+            if self.kodi_is_down():
+                return
             self.stop_all()
         except Exception as e:
-            LOG.error(e)
-            self.on_websettings_changed()
+            self.handle_kodi_error(e)
 
     # pause film was requested in the utterance
+    @metrics.timed("kodi_intent_seconds")
     def handle_pause_intent(self, message):
         try:
+            fleet_names = self.fleet_names(message)
+            if fleet_names is not None:
+                self.report_fleet_results(self.fleet.pause(fleet_names))
+                return
+            if self.kodi_is_down():
+                return
             self.pause_all()
         except Exception as e:
-            LOG.error(e)
-            self.on_websettings_changed()
+            self.handle_kodi_error(e)
 
     # resume the film was requested in the utterance
+    @metrics.timed("kodi_intent_seconds")
     def handle_resume_intent(self, message):
         try:
+            fleet_names = self.fleet_names(message)
+            if fleet_names is not None:
+                self.report_fleet_results(self.fleet.resume(fleet_names))
+                return
+            if self.kodi_is_down():
+                return
             self.resume_all()
         except Exception as e:
-            LOG.error(e)
-            self.on_websettings_changed()
+            self.handle_kodi_error(e)
 
     # turn notifications on requested in the utterance
+    @metrics.timed("kodi_intent_seconds")
     def handle_notification_on_intent(self, message):
         self.notifier_bool = True
         self.speak_dialog("notification", data={"result": "On"})
 
     # turn notifications off requested in the utterance
+    @metrics.timed("kodi_intent_seconds")
     def handle_notification_off_intent(self, message):
         self.notifier_bool = False
+        LOG.info("Kodi notification counters: " + str(self.notifier.counters))
         self.speak_dialog("notification", data={"result": "Off"})
 
     # move cursor utterance processing
     @intent_handler(IntentBuilder('MoveCursorIntent').require('MoveKeyword').require('CursorKeyword').
                     one_of('UpKeyword', 'DownKeyword', 'LeftKeyword', 'RightKeyword', 'EnterKeyword',
                            'SelectKeyword', 'BackKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_move_cursor_intent(self, message):  # a request was made to move the kodi cursor
+        if self.kodi_is_down():
+            return
         self.set_context('MoveKeyword', 'move')  # in future the user does not have to say the move keyword
         self.set_context('CursorKeyword', 'cursor')  # in future the user does not have to say the cursor keyword
+        direction_kw = None
         if "UpKeyword" in message.data:
             direction_kw = "Up"  # these english words are required by the kodi api
         if "DownKeyword" in message.data:
@@ -927,38 +977,103 @@ class KodiSkill(MycroftSkill):
         LOG.info('utterance: ' + str(message.data.get('utterance')))
         LOG.info('repeat_count: ' + str(repeat_count))
         if direction_kw:
-            method = "Input." + direction_kw
-            for each_count in range(0, int(repeat_count)):
-                self.kodi_payload = {
-                    "jsonrpc": "2.0",
-                    "method": method,
-                    "id": 1
-                }
-                try:
-                    kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload),
-                                                  headers=self.json_header)
-                    LOG.info(kodi_response.text)
-                except Exception as e:
-                    LOG.error(e)
-                    self.on_websettings_changed()
-                self.speak_dialog("direction", data={"result": direction_kw},
-                                  expect_response=True)
-                time.sleep(1)
+            repeat_count = min(int(repeat_count), self.max_cursor_steps)
+            try:  # every step goes to kodi at once, then the move is confirmed once
+                LOG.info(self.send_inputs([("Input." + direction_kw, None)] * repeat_count))
+            except Exception as e:
+                self.handle_kodi_error(e)
+                return
+            self.speak_dialog("direction", data={"result": direction_kw},
+                              expect_response=True)
+
+    # page up or down through a list, eg. "page down three"
+    @intent_handler(IntentBuilder('PageCursorIntent').require('PageKeyword').one_of('UpKeyword', 'DownKeyword').
+                    optionally('CursorKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
+    def handle_page_cursor_intent(self, message):
+        if self.kodi_is_down():
+            return
+        if "UpKeyword" in message.data:
+            page_action = "pageup"
+        else:
+            page_action = "pagedown"
+        repeat_count = min(int(self.repeat_regex(message.data.get('utterance'))), self.max_cursor_steps)
+        try:
+            LOG.info(self.send_inputs([("Input.ExecuteAction", {"action": page_action})] * repeat_count))
+        except Exception as e:
+            self.handle_kodi_error(e)
+            return
+        self.speak_dialog("direction", data={"result": page_action.replace("page", "page ")},
+                          expect_response=False)
+
+    # jump to the first list entry starting with a letter, eg. "jump to letter m"
+    @intent_handler(IntentBuilder('JumpLetterIntent').require('JumpKeyword').require('LetterKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
+    def handle_jump_letter_intent(self, message):
+        if self.kodi_is_down():
+            return
+        letter = parse_letter(message.data.get('utterance'))
+        if not letter or letter in "01":
+            self.speak_dialog("letter.error", expect_response=False)
+            return
+        try:
+            LOG.info(self.send_inputs(self.letter_jump_calls(letter)))
+        except Exception as e:
+            self.handle_kodi_error(e)
+            return
+        self.speak_dialog("direction", data={"result": letter}, expect_response=False)
+
+    # the sms style key presses that make a kodi list jump to letter, eg. "c" is the 2 key pressed three times
+    def letter_jump_calls(self, letter):
+        for each_key, each_letters in self.sms_keys.items():
+            if letter in each_letters:
+                return [("Input.ExecuteAction", {"action": "jumpsms" + each_key})] * (each_letters.index(letter) + 1)
+        return []
+
+    # send the calls to kodi as a single batch, or one at a time kodi_cursor_pacing seconds apart
+    # when the skin needs time between key presses, returns the kodi responses
+    def send_inputs(self, calls):
+        pacing = float(self.settings.get("kodi_cursor_pacing", 0) or 0)
+        if pacing <= 0:
+            batch = self.kodi.batch()
+            for method, params in calls:
+                batch.add(method, params)
+            return batch.send()
+        responses = []
+        for position, (method, params) in enumerate(calls):
+            if position:
+                time.sleep(pacing)
+            responses.append(self.kodi.call(method, params))
+        return responses
 
     # play the movie based on movie ID
+    @metrics.timed("kodi_step_seconds")
     def play_film(self, movieid):
-        self.clear_playlist()
-        self.add_movie_playlist(movieid)
-        if self.check_cinemavision_present():  # Cinemavision is installed
+        # the addon probe, clear, add and play all share the play_film deadline
+        try:
+            with deadline(self.deadlines["play_film"]):
+                cv_present = self.check_cinemavision_present()
+                # clear the playlist, add the movie and, without cinemavision, start it in a single round trip
+                batch = self.kodi.batch()
+                batch.add("Playlist.Clear", {"playlistid": 1})
+                batch.add("Playlist.Add", {"playlistid": 1, "item": {"movieid": movieid}})
+                if not cv_present:  # Cinemavision is NOT installed
+                    batch.add("Player.Open", {"item": {"playlistid": 1}})
+                LOG.info(batch.send())
+        except Exception as e:
+            self.handle_kodi_error(e)
+            return
+        if cv_present:  # Cinemavision is installed
             self.set_context('CinemaVisionContextKeyword', 'CinemaVisionContext')
             self.speak_dialog('cinema.vision', expect_response=True)
-        else:  # Cinemavision is NOT installed
-            self.play_normal()
 
     # execute cinemavision addon decision
     @intent_handler(IntentBuilder('CinemavisionRequestIntent').require('CinemaVisionContextKeyword')
                     .one_of('YesKeyword', 'NoKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_cinemavision_request_intent(self, message):
+        if self.kodi_is_down():
+            return
         self.set_context('CinemaVisionContextKeyword', '')
         if "YesKeyword" in message.data:  # Yes was spoken to navigate the list
             LOG.info('User responded with: ' + message.data.get("YesKeyword"))
@@ -970,6 +1085,7 @@ class KodiSkill(MycroftSkill):
     # movie list navigation decision utterance
     @intent_handler(IntentBuilder('NavigateDecisionIntent').require('NavigateContextKeyword').
                     one_of('YesKeyword', 'NoKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_navigate_Decision_intent(self, message):
         self.set_context('NavigateContextKeyword', '')
         if "YesKeyword" in message.data:  # Yes was spoken to navigate the list, reading the first item
@@ -984,19 +1100,22 @@ class KodiSkill(MycroftSkill):
     # the currently listed move was selected to play
     @intent_handler(IntentBuilder('NavigatePlayIntent').require('ListContextKeyword').require("PlayKeyword").
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_navigate_play_intent(self, message):
+        if self.kodi_is_down():
+            return
         self.set_context('ListContextKeyword', '')
         msg_payload = str(self.movie_list[self.movie_index]['label'])
         self.speak_dialog('play.film', data={"result": msg_payload}, expect_response=False)
         try:
             self.play_film(self.movie_list[self.movie_index]['movieid'])
         except Exception as e:
-            LOG.error(e)
-            self.on_websettings_changed()
+            self.handle_kodi_error(e)
 
     # the user has requested to skip the currently listed movie
     @intent_handler(IntentBuilder('ParseNextIntent').require('ListContextKeyword').require('NextKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_parse_next_intent(self, message):
         self.set_context('ListContextKeyword', 'ListContext')
         self.movie_index += 1
@@ -1010,6 +1129,7 @@ class KodiSkill(MycroftSkill):
     # the user has requested to stop navigating the list
     @intent_handler(IntentBuilder('NavigateStopIntent').require('NavigateContextKeyword').require('StopKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_navigate_stop_intent(self, message):
         self.set_context('NavigateContextKeyword', '')
         self.speak_dialog('cancel', expect_response=False)
@@ -1017,6 +1137,7 @@ class KodiSkill(MycroftSkill):
     # the user has requested to stop parsing the list
     @intent_handler(IntentBuilder('ParseCancelIntent').require('ListContextKeyword').require('StopKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_parse_cancel_intent(self, message):
         self.set_context('ListContextKeyword', '')
         self.speak_dialog('cancel', expect_response=False)
@@ -1024,6 +1145,7 @@ class KodiSkill(MycroftSkill):
     # Cancel was spoken, Cancel the list navigation
     @intent_handler(IntentBuilder('CursorCancelIntent').require('MoveKeyword').require('CursorKeyword').
                     require('StopKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_cursor_cancel_intent(self, message):
         self.set_context('MoveKeyword', '')
         self.set_context('CursorKeyword', '')
@@ -1036,17 +1158,28 @@ class KodiSkill(MycroftSkill):
 
     # the movie information dialog was requested in the utterance
     @intent_handler(IntentBuilder('SetVolumeIntent').require('SetsKeyword').require('KodiKeyword').
-                    require('VolumeKeyword').build())
+                    require('VolumeKeyword').optionally('AllKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_set_volume_intent(self, message):
         str_remainder = str(message.utterance_remainder())
-        volume_level = re.findall('\d+', str_remainder)
-        if volume_level:
-            if int(volume_level[0]) < 101:
-                new_volume = self.set_volume(int(volume_level[0]))
+        volume_level = parse_volume(str_remainder)
+        if volume_level is not None:
+            if volume_level < 101:
+                fleet_names = self.fleet_names(message)
+                if fleet_names is not None:
+                    fleet_results = self.fleet.set_volume(volume_level, fleet_names)
+                    self.report_fleet_results(fleet_results)
+                    if not self.fleet.summarize(fleet_results)[0]:
+                        return
+                    new_volume = volume_level
+                elif self.kodi_is_down():
+                    return
+                else:
+                    new_volume = self.set_volume(volume_level)
                 LOG.info("Kodi Volume Now: " + str(new_volume))
                 self.speak_dialog('volume.set', data={'result': str(new_volume)}, expect_response=False)
             else:
-                self.speak_dialog('volume.error', data={'result': int(volume_level[0])}, expect_response=False)
+                self.speak_dialog('volume.error', data={'result': volume_level}, expect_response=False)
 
     def set_volume(self, level):
         method = "Application.SetVolume"
@@ -1059,7 +1192,8 @@ class KodiSkill(MycroftSkill):
             "id": 1
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            with deadline(self.deadlines["player"]):
+                kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             return json.loads(kodi_response.text)["result"]
             # return level
@@ -1070,7 +1204,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ShowMovieInfoIntent').require('VisibilityKeyword').require('InfoKeyword').
                     optionally('KodiKeyword').optionally('FilmKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_show_movie_info_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "Input.Info"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1078,7 +1215,7 @@ class KodiSkill(MycroftSkill):
             "id": 1
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
         except Exception as e:
             LOG.error(e)
@@ -1087,7 +1224,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('SkipMovieIntent').require("NextKeyword").require('FilmKeyword').
                     one_of('ForwardKeyword', 'BackwardKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_skip_movie_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "Player.Seek"
         backward_kw = message.data.get("BackwardKeyword")
         if backward_kw:
@@ -1105,8 +1245,7 @@ class KodiSkill(MycroftSkill):
         }
         if self.is_kodi_playing():
             try:
-                kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload),
-                                              headers=self.json_header)
+                kodi_response = self.kodi.post(self.kodi_payload)
                 LOG.info(kodi_response.text)
             except Exception as e:
                 LOG.error(e)
@@ -1117,7 +1256,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('SubtitlesOnIntent').require("KodiKeyword").require('SubtitlesKeyword').
                     require('OnKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_subtitles_on_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "Player.SetSubtitle"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1130,8 +1272,7 @@ class KodiSkill(MycroftSkill):
         }
         if self.is_kodi_playing():
             try:
-                kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload),
-                                              headers=self.json_header)
+                kodi_response = self.kodi.post(self.kodi_payload)
                 LOG.info(kodi_response)
             except Exception as e:
                 LOG.error(e)
@@ -1142,7 +1283,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('SubtitlesOffIntent').require("KodiKeyword").require('SubtitlesKeyword').
                     require('OffKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_subtitles_off_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "Player.SetSubtitle"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1155,8 +1299,7 @@ class KodiSkill(MycroftSkill):
         }
         if self.is_kodi_playing():
             try:
-                kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload),
-                                              headers=self.json_header)
+                kodi_response = self.kodi.post(self.kodi_payload)
                 LOG.info(kodi_response)
             except Exception as e:
                 LOG.error(e)
@@ -1167,7 +1310,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ShowMoviesAddedIntent').require("ListKeyword").require('RecentKeyword').
                     require('FilmKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_show_movies_added_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "GUI.ActivateWindow"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1181,7 +1327,7 @@ class KodiSkill(MycroftSkill):
             "id": "1"
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             sort_kw = message.data.get("RecentKeyword")
             self.speak_dialog('sorted.by', data={"result": sort_kw}, expect_response=False)
@@ -1192,7 +1338,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ShowMoviesGenresIntent').require("ListKeyword").require('FilmKeyword').
                     require('GenreKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_show_movies_genres_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "GUI.ActivateWindow"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1206,7 +1355,7 @@ class KodiSkill(MycroftSkill):
             "id": "1"
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             sort_kw = message.data.get("GenreKeyword")
             self.speak_dialog('sorted.by', data={"result": sort_kw}, expect_response=False)
@@ -1217,7 +1366,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ShowMoviesActorsIntent').require("ListKeyword").require('FilmKeyword').
                     require('ActorKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_show_movies_actors_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "GUI.ActivateWindow"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1231,7 +1383,7 @@ class KodiSkill(MycroftSkill):
             "id": "1"
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             sort_kw = message.data.get("ActorKeyword")
             self.speak_dialog('sorted.by', data={"result": sort_kw}, expect_response=False)
@@ -1242,7 +1394,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ShowMoviesStudioIntent').require("ListKeyword").require('FilmKeyword').
                     require('StudioKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_show_movies_studio_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "GUI.ActivateWindow"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1256,7 +1411,7 @@ class KodiSkill(MycroftSkill):
             "id": "1"
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             sort_kw = message.data.get("StudioKeyword")
             self.speak_dialog('sorted.by', data={"result": sort_kw}, expect_response=False)
@@ -1267,7 +1422,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ShowMoviesTitleIntent').require("ListKeyword").require('FilmKeyword').
                     require('TitleKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_show_movies_title_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "GUI.ActivateWindow"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1281,7 +1439,7 @@ class KodiSkill(MycroftSkill):
             "id": "1"
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             sort_kw = message.data.get("TitleKeyword")
             self.speak_dialog('sorted.by', data={"result": sort_kw}, expect_response=False)
@@ -1292,7 +1450,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ShowMoviesSetsIntent').require("ListKeyword").require('FilmKeyword').
                     require('SetsKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_show_movies_sets_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "GUI.ActivateWindow"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1306,7 +1467,7 @@ class KodiSkill(MycroftSkill):
             "id": "1"
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             sort_kw = message.data.get("SetsKeyword")
             self.speak_dialog('sorted.by', data={"result": sort_kw}, expect_response=False)
@@ -1317,7 +1478,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ShowAllMoviesIntent').require("ListKeyword").require('AllKeyword').
                     require('FilmKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_show_all_movies_intent(self, message):
+        if self.kodi_is_down():
+            return
         self.show_root()
         method = "GUI.ActivateWindow"
         self.kodi_payload = {
@@ -1332,7 +1496,7 @@ class KodiSkill(MycroftSkill):
             "id": "1"
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             sort_kw = message.data.get("AllKeyword")
             self.speak_dialog('sorted.by', data={"result": sort_kw}, expect_response=False)
@@ -1343,7 +1507,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('CleanLibraryIntent').require("CleanKeyword").require('KodiKeyword').
                     require('LibraryKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_clean_library_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "VideoLibrary.Clean"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1354,7 +1521,7 @@ class KodiSkill(MycroftSkill):
             }
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             update_kw = message.data.get("CleanKeyword")
             self.speak_dialog('update.library', data={"result": update_kw}, expect_response=False)
@@ -1365,7 +1532,10 @@ class KodiSkill(MycroftSkill):
     @intent_handler(IntentBuilder('ScanLibraryIntent').require("ScanKeyword").require('KodiKeyword').
                     require('LibraryKeyword').
                     build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_scan_library_intent(self, message):
+        if self.kodi_is_down():
+            return
         method = "VideoLibrary.Scan"
         self.kodi_payload = {
             "jsonrpc": "2.0",
@@ -1376,23 +1546,77 @@ class KodiSkill(MycroftSkill):
             }
         }
         try:
-            kodi_response = requests.post(self.kodi_path, data=json.dumps(self.kodi_payload), headers=self.json_header)
+            kodi_response = self.kodi.post(self.kodi_payload)
             LOG.info(kodi_response.text)
             update_kw = message.data.get("ScanKeyword")
             self.speak_dialog('update.library', data={"result": update_kw}, expect_response=False)
         except Exception as e:
             LOG.error(e)
 
+    # user has requested a library movie on the chromecast
+    # eg. "ask kodi to play the movie iron man on the chromecast"
+    @intent_handler(IntentBuilder('CastFilmIntent').require("AskKeyword").require("KodiKeyword").
+                    require("PlayKeyword").require("FilmKeyword").require("CastKeyword").build())
+    @metrics.timed("kodi_intent_seconds")
+    def handle_cast_film_intent(self, message):
+        if self.kodi_is_down():
+            return
+        device_ip = self.settings.get("chromecast_ip", "")
+        if not device_ip:
+            self.speak_dialog('cast.error', expect_response=False)
+            return
+        movie_name = self.movie_regex(message.data.get('utterance'))
+        try:
+            results = self.find_best_movies(movie_name)
+            if not results:
+                self.speak_dialog('no.results', data={"result": movie_name}, expect_response=False)
+                return
+            self.speak_dialog('cast.film', data={"result": results[0]['label']}, expect_response=False)
+            if not self.cast_kodi_movie(results[0]['movieid'], device_ip):
+                self.speak_dialog('cast.error', expect_response=False)
+        except (KodiUnavailable, KodiTimeout) as e:
+            self.handle_kodi_error(e)
+        except Exception as e:
+            LOG.error(e)
+            self.speak_dialog('cast.error', expect_response=False)
+
     # user has requested to play a video from youtube
     # changed this intent to avoid common-play-framework
+    # eg. "ask kodi to play the audio of queen from youtube" plays the sound only
     @intent_handler(IntentBuilder('PlayYoutubeIntent').require("AskKeyword").require("KodiKeyword").
-                    require("PlayKeyword").require('FromYoutubeKeyword').build())
+                    require("PlayKeyword").require('FromYoutubeKeyword').optionally('AudioKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_play_youtube_intent(self, message):
+        if self.kodi_is_down():
+            return
         self.youtube_search = self.youtube_query_regex(message.data.get('utterance'))
-        self.youtube_id = self.get_youtube_links(self.youtube_search)
-        if self.check_youtube_present():
+        if not self.youtube_search:
+            self.speak_dialog('no.results', data={"result": str(message.data.get('utterance'))}, expect_response=False)
+            return
+        # the search runs in the background while the addon is checked
+        pending_links = self.youtube.search(self.youtube_search)
+        audio_only = bool(message.data.get('AudioKeyword'))  # kodi plays the stream, no addon is needed
+        if audio_only or self.check_youtube_present():
+            try:
+                self.youtube_id = pending_links.result(timeout=self.youtube_timeout)
+            except Exception as e:
+                LOG.error(e)
+                self.youtube_id = []
+            if not self.youtube_id:
+                self.speak_dialog('no.results', data={"result": self.youtube_search}, expect_response=False)
+                return
             wait_while_speaking()
-            if len(self.youtube_id) > 1:
+            if audio_only:
+                self.speak_dialog('play.youtube', data={"result": self.youtube_search}, expect_response=False)
+                try:
+                    if not self.play_youtube_audio(self.youtube_search, self.youtube_id):
+                        self.speak_dialog('no.results', data={"result": self.youtube_search}, expect_response=False)
+                except (KodiUnavailable, KodiTimeout) as e:
+                    self.handle_kodi_error(e)
+                except Exception as e:
+                    LOG.error(e)
+                    self.speak_dialog('youtube.audio.error', expect_response=False)
+            elif len(self.youtube_id) > 1:
                 self.set_context('PlaylistContextKeyword', 'PlaylistContext')
                 self.speak_dialog('youtube.playlist.present', expect_response=True)
             else:
@@ -1404,6 +1628,7 @@ class KodiSkill(MycroftSkill):
     # user is requested to make a decision to play a single youtube link or a playlist link
     @intent_handler(IntentBuilder('YoutubePlayTypeDecisionIntent').require('PlaylistContextKeyword').
                     one_of('YesKeyword', 'NoKeyword').build())
+    @metrics.timed("kodi_intent_seconds")
     def handle_youtube_play_type_decision_intent(self, message):
         self.set_context('PlaylistContextKeyword', '')
         self.speak_dialog('play.youtube', data={"result": self.youtube_search}, expect_response=False)
@@ -1414,10 +1639,14 @@ class KodiSkill(MycroftSkill):
             LOG.info('Playing youtube id: ' + str(self.youtube_id[0]))
             self.play_youtube_video(self.youtube_id[0])
 
+    @metrics.timed("kodi_intent_seconds")
     def handle_random_movie_select_intent(self):
-        full_list = self.list_all_movies()
-        random_id = random.randint(1, len(full_list))
-        selected_entry = full_list[random_id]
+        # the index is still loading, let kodi list its movies
+        full_list = self.library.movies() if self.library.is_synced("movie") else self.list_all_movies()
+        if not full_list:  # an empty library, or kodi could not be reached
+            self.speak_dialog('no.results', data={"result": "random movie"}, expect_response=False)
+            return
+        selected_entry = random.choice(full_list)
         selected_name = selected_entry['label']
         selected_id = selected_entry['movieid']
         LOG.info(selected_name, selected_id)
@@ -1425,12 +1654,25 @@ class KodiSkill(MycroftSkill):
         try:
             self.play_film(selected_id)
         except Exception as e:
-            LOG.error(e)
-            self.on_websettings_changed()
+            self.handle_kodi_error(e)
 
     def stop(self):
         pass
 
+    def shutdown(self):
+        self.notifier.stop()
+        self.youtube.close()
+        self.streams.close()
+        self.casts.close()
+        self.proxy.stop()
+        self.health.stop()
+        self.events.stop()
+        self.fleet.close()
+        self.kodi.close()
+        if self.library:
+            self.library.close()
+        super(KodiSkill, self).shutdown()
+
 
 def create_skill():
     return KodiSkill()
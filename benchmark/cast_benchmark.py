@@ -0,0 +1,80 @@
+"""
+Offline benchmark of casting to a chromecast, against a fake cast device.
+Times the skill's cast_link and cast_youtube with their kept sessions, the first command
+connecting and the later ones reusing the connection, next to the old way of connecting
+for every command and sleeping a fixed 7 seconds before starting the media.
+
+    python3 benchmark/cast_benchmark.py --connect-latency 1.0 --ready-latency 0.8
+
+It needs the skill's own requirements (mycroft, adapt, pafy, pychromecast) to be importable.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_cast import FakeCastDevice  # noqa: E402
+from skill_benchmark import load_skill_module, percentile  # noqa: E402
+
+DEVICE_IP = "192.168.0.40"
+OLD_READY_SLEEP = 7  # seconds the skill used to sleep after loading the media
+
+
+# the old cast_link, a new connection for every command and a fixed sleep
+def old_cast_link(device, source_link):
+    cast = device.connect(DEVICE_IP)
+    cast.wait()
+    media_controller = cast.media_controller
+    media_controller.play_media(source_link, "video/mp4")
+    time.sleep(OLD_READY_SLEEP)
+    media_controller.block_until_active()
+    media_controller.play()
+
+
+def time_calls(call, iterations):
+    latencies = []
+    for each_index in range(iterations):
+        start_time = time.perf_counter()
+        call(each_index)
+        latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connect-latency", type=float, default=1.0, help="seconds a device takes to connect")
+    parser.add_argument("--ready-latency", type=float, default=0.8, help="seconds a device takes to load media")
+    parser.add_argument("--iterations", type=int, default=5, help="casts per scenario")
+    parser.add_argument("--old-iterations", type=int, default=1, help="casts the old way, each one takes 7 s")
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+    skill_module = load_skill_module()
+    device = FakeCastDevice(args.connect_latency, args.ready_latency)
+    skill = skill_module.KodiSkill()
+    skill.casts = skill_module.CastSessions(connect=device.connect)
+    try:
+        print("  %-28s %10s %10s %12s" % ("scenario", "first ms", "p50 ms", "connections"))
+        scenarios = (
+            ("old cast_link", args.old_iterations,
+             lambda index: old_cast_link(device, "http://127.0.0.1/old/" + str(index) + ".mp4")),
+            ("cast_link", args.iterations,
+             lambda index: skill.cast_link("http://127.0.0.1/movie/" + str(index) + ".mp4", DEVICE_IP)),
+            ("cast_youtube", args.iterations, lambda index: skill.cast_youtube("dQw4w9WgXcQ", DEVICE_IP))
+        )
+        for each_name, each_iterations, each_call in scenarios:
+            connections = device.connections
+            latencies = time_calls(each_call, each_iterations)
+            print("  %-28s %10.1f %10.1f %12d" % (each_name, latencies[0] * 1000,
+                                                  percentile(sorted(latencies), 0.5) * 1000,
+                                                  device.connections - connections))
+    finally:
+        skill.casts.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
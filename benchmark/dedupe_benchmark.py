@@ -0,0 +1,43 @@
+"""
+Regression benchmark for the search result de-duplication.
+Times unique_titles on growing result lists and fails when the cost per item
+grows with the list size, ie. when the de-duplication stops being linear.
+
+    python3 benchmark/dedupe_benchmark.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kodi_search import unique_titles  # noqa: E402
+
+SIZES = [1000, 10000, 100000]
+MAX_PER_ITEM_GROWTH = 3.0  # allowed growth of the per item cost from the smallest to the largest size
+
+
+# a result list where every title appears twice and many titles are substrings of others
+def make_results(size):
+    return [{"label": "Iron Man " + str(each_item // 2), "movieid": each_item} for each_item in range(size)]
+
+
+def main():
+    per_item = []
+    for each_size in SIZES:
+        results = make_results(each_size)
+        runs = max(1, 100000 // each_size)
+        elapsed = min(timeit.repeat(lambda: unique_titles(results), number=runs, repeat=3)) / runs
+        assert len(unique_titles(results)) == each_size // 2
+        per_item.append(elapsed / each_size)
+        print("%7d results: %8.2f ms, %6.3f us per result" % (each_size, elapsed * 1000, per_item[-1] * 1e6))
+    growth = per_item[-1] / per_item[0]
+    print("per result cost growth: %.2fx" % growth)
+    if growth > MAX_PER_ITEM_GROWTH:
+        print("FAIL: de-duplication no longer scales linearly")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
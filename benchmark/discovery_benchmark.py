@@ -0,0 +1,65 @@
+"""
+Offline check of the skill's kodi discovery against a fake SSDP responder.
+A fake kodi and a television that is not kodi answer the skill's M-SEARCH, both for each
+search target it sends. The search must return the kodi alone, once, with the json-rpc port
+from its presentationURL, and that port must answer a ping. Reported is the search time.
+
+    python3 benchmark/discovery_benchmark.py --timeout 0.5
+
+It needs the skill's own requirements (mycroft, adapt, pafy, pychromecast) to be importable.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import urllib.parse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_kodi import FakeKodi  # noqa: E402
+from fake_ssdp import FakeSsdp  # noqa: E402
+from skill_benchmark import load_skill_module  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--timeout", type=float, default=0.5, help="seconds the search listens for answers")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the devices answer")
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+    skill_module = load_skill_module()
+    kodi = FakeKodi(movies=10, songs=10)
+    url = kodi.start()
+    kodi_port = urllib.parse.urlsplit(url).port
+    responder = FakeSsdp([("Living Room Tv", "Samsung", 8001), ("Living Room", "Kodi", kodi_port)],
+                         latency=args.latency)
+    address = responder.start()
+    try:
+        discovery = skill_module.KodiDiscovery(address=address, timeout=args.timeout)
+        start_time = time.perf_counter()
+        found = discovery.search()
+        seconds = time.perf_counter() - start_time
+        assert len(found) == 1, found
+        assert found[0]["name"] == "Living Room" and found[0]["port"] == kodi_port, found
+        assert responder.searches == len(discovery.search_targets), responder.searches
+        rpc = skill_module.KodiRpc(skill_module.build_kodi_path(found[0]["ip"], found[0]["port"]))
+        try:
+            assert rpc.ping(), "the discovered kodi does not answer"
+        finally:
+            rpc.close()
+        print("  %-36s %10.1f ms, found %s at %s:%d" % ("search", seconds * 1000, found[0]["name"], found[0]["ip"],
+                                                       found[0]["port"]))
+
+        responder.devices = [("Living Room Tv", "Samsung", 8001)]
+        assert discovery.search() == [], "a device that is not kodi was taken for one"
+        print("  %-36s %10s" % ("no kodi on the network", "ok"))
+    finally:
+        responder.stop()
+        kodi.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
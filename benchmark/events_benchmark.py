@@ -0,0 +1,113 @@
+"""
+Offline check of the kodi notification listener against a fake kodi's tcp notification socket.
+The skill's library index is synced from the fake, then a renamed and a removed movie are
+announced with VideoLibrary.OnUpdate / OnRemove and the index is checked to follow them.
+Notifications of an unexpected shape must be ignored without dropping the connection.
+The fake then drops every client, as a restarting kodi does, and the listener must reconnect
+and keep applying notifications. Reported are the time from a notification to the index
+changing and the time the listener took to reconnect.
+
+    python3 benchmark/events_benchmark.py --movies 1000
+
+It needs the skill's own requirements (mycroft, adapt, pafy, pychromecast) to be importable.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_kodi import FakeKodi  # noqa: E402
+from skill_benchmark import load_skill_module, make_skill  # noqa: E402
+
+TIMEOUT = 5.0  # seconds to wait for the listener before failing the check
+
+
+# poll until check() is true, returns the seconds it took
+def wait_until(check, what):
+    start_time = time.perf_counter()
+    while not check():
+        if time.perf_counter() - start_time > TIMEOUT:
+            raise AssertionError("timed out waiting for " + what)
+        time.sleep(0.001)
+    return time.perf_counter() - start_time
+
+
+def labels(library):
+    return dict((each_movie["movieid"], each_movie["label"]) for each_movie in library.movies())
+
+
+def rename_movie(kodi, library, movie_id):
+    kodi.by_id["movie"][movie_id]["label"] = "Renamed " + str(movie_id)
+    kodi.notify("VideoLibrary.OnUpdate", {"data": {"item": {"type": "movie", "id": movie_id}}})
+    return wait_until(lambda: labels(library).get(movie_id) == "Renamed " + str(movie_id),
+                      "OnUpdate of movie " + str(movie_id))
+
+
+def remove_movie(kodi, library, movie_id):
+    kodi.library["movie"].remove(kodi.by_id["movie"].pop(movie_id))
+    kodi.notify("VideoLibrary.OnRemove", {"data": {"type": "movie", "id": movie_id}})  # the kodi v8 form
+    return wait_until(lambda: movie_id not in labels(library), "OnRemove of movie " + str(movie_id))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--movies", type=int, default=1000, help="movies in the fake library")
+    parser.add_argument("--restarts", type=int, default=3, help="times the fake drops every client")
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+    skill_module = load_skill_module()
+    kodi = FakeKodi(movies=args.movies, songs=10)
+    url = kodi.start()
+    port = kodi.start_notifications()
+    listener = skill_module.KodiEventListener()
+    listener.reconnect_delay = 0.05
+    with tempfile.TemporaryDirectory() as data_dir:
+        skill = make_skill(skill_module, url, os.path.join(data_dir, "kodi_library.db"))
+        try:
+            skill.library.sync()
+            listener.add_listener("VideoLibrary.", skill.library.handle_notification)
+            listener.start("127.0.0.1", port)
+            wait_until(lambda: listener.connected and listener.state.volume == 80, "the first connection")
+            print("  %-36s %10.2f ms" % ("OnUpdate applied", rename_movie(kodi, skill.library, 1) * 1000))
+            print("  %-36s %10.2f ms" % ("OnRemove applied", remove_movie(kodi, skill.library, 2) * 1000))
+
+            clients = list(kodi.clients)
+            kodi.notify("JSONRPC.NotifyAll", {"data": "not an object"})
+            kodi.notify("Player.OnPlay", {"data": {"player": "not an object"}})
+            kodi.notify("Player.OnPause", "not an object")
+            rename_movie(kodi, skill.library, 100)
+            assert listener.connected and kodi.clients == clients, "a malformed notification dropped the connection"
+            print("  %-36s %10s" % ("malformed notifications ignored", "ok"))
+
+            for each_restart in range(args.restarts):
+                kodi.drop_clients()
+                wait_until(lambda: not listener.connected, "the listener to notice the dropped socket")
+                reconnect = wait_until(lambda: listener.connected and kodi.clients, "the listener to reconnect")
+                movie_id = 3 + each_restart * 2
+                rename_movie(kodi, skill.library, movie_id)
+                remove_movie(kodi, skill.library, movie_id + 1)
+                print("  %-36s %10.2f ms" % ("reconnected after drop " + str(each_restart + 1), reconnect * 1000))
+
+            kodi.stop_notifications()
+            wait_until(lambda: not listener.connected, "the listener to notice kodi stopped")
+            time.sleep(listener.reconnect_delay * 4)  # a few refused reconnects, backing off
+            kodi.start_notifications(port)
+            reconnect = wait_until(lambda: listener.connected and kodi.clients, "the listener to reconnect")
+            rename_movie(kodi, skill.library, 101)
+            print("  %-36s %10.2f ms" % ("reconnected after kodi restarted", reconnect * 1000))
+            assert len(skill.library.movies()) == args.movies - 1 - args.restarts, len(skill.library.movies())
+        finally:
+            listener.stop()
+            skill.library.close()
+            skill.kodi.close()
+            kodi.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
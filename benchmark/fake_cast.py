@@ -0,0 +1,90 @@
+"""
+A local stand-in for a chromecast, shaped like the pychromecast objects the skill uses.
+Connecting takes connect_latency, and a loaded media reports BUFFERING then PLAYING to the
+media status listeners from a device thread after ready_latency, the way a real device does
+once it has fetched enough of the stream. It needs nothing outside the standard library.
+
+    device = FakeCastDevice(connect_latency=1.0, ready_latency=0.8)
+    sessions = CastSessions(connect=device.connect)
+"""
+import threading
+import time
+
+
+class FakeMediaStatus(object):
+    def __init__(self, content_id, player_state):
+        self.content_id = content_id
+        self.player_state = player_state
+
+
+class FakeSocketClient(object):
+    def __init__(self):
+        self.is_connected = True
+
+
+class FakeMediaController(object):
+    def __init__(self, device):
+        self.device = device
+        self.listeners = []
+        self.status = None
+        self.played = []
+
+    def register_status_listener(self, listener):
+        self.listeners.append(listener)
+
+    def send_status(self, content_id, player_state):
+        self.status = FakeMediaStatus(content_id, player_state)
+        for each_listener in self.listeners:
+            each_listener.new_media_status(self.status)
+
+    def play_media(self, url, content_type):
+        self.played.append(url)
+
+        def load():
+            time.sleep(self.device.ready_latency)
+            self.send_status(url, "BUFFERING")
+            time.sleep(self.device.ready_latency / 10.0)
+            self.send_status(url, "PLAYING")
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def block_until_active(self, timeout=None):
+        pass
+
+    def play(self):
+        if self.status is not None:
+            self.send_status(self.status.content_id, "PLAYING")
+
+
+class FakeChromecast(object):
+    def __init__(self, device, host):
+        self.device = device
+        self.host = host
+        self.socket_client = FakeSocketClient()
+        self.media_controller = FakeMediaController(device)
+        self.handlers = []
+
+    def wait(self, timeout=None):
+        time.sleep(self.device.connect_latency)
+
+    def register_handler(self, handler):
+        self.handlers.append(handler)
+
+    def disconnect(self):
+        self.socket_client.is_connected = False
+
+
+class FakeCastDevice(object):
+    """
+    Makes FakeChromecast connections, counting them.
+    """
+    def __init__(self, connect_latency=1.0, ready_latency=0.8):
+        self.connect_latency = connect_latency
+        self.ready_latency = ready_latency
+        self.connections = 0
+        self.last_cast = None
+
+    def connect(self, host):
+        self.connections += 1
+        self.last_cast = FakeChromecast(self, host)
+        return self.last_cast
@@ -0,0 +1,346 @@
+"""
+A local stand-in for the kodi json-rpc http interface, serving a synthetic library.
+It answers the library queries (filter, sort, limits and properties), the details calls,
+batches and the playlist, player and addon methods the skill uses, after an optional
+per request latency. Every library file is also served from /vfs/, vfs_size bytes long,
+with range requests and, when credentials are given, basic authentication. The tcp
+notification socket is served too: it answers requests sent over it and pushes the
+notifications given to notify() to every connected client, back to back like kodi does.
+Used by the benchmarks, it needs nothing outside the standard library.
+
+    server = FakeKodi(movies=10000, songs=10000, latency=0.005)
+    url = server.start()  # http://127.0.0.1:<port>/jsonrpc
+    port = server.start_notifications()  # the tcp notification port
+    server.notify("VideoLibrary.OnRemove", {"data": {"type": "movie", "id": 7}})
+    server.drop_clients()  # as if kodi restarted
+    ...
+    server.stop()
+"""
+import base64
+import datetime
+import http.server
+import json
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+
+WORDS = ["night", "star", "iron", "blue", "river", "ghost", "summer", "dark", "city", "love", "storm", "king",
+         "moon", "wild", "secret", "fire", "silent", "golden", "lost", "empire", "shadow", "dream", "heart",
+         "rock", "winter", "ocean", "mountain", "steel", "glass", "thunder", "garden", "road", "queen", "echo"]
+NUMBER_WORDS = ["", "", "", " 2", " 3", " II", " III", " Part 2"]
+
+# library filter fields -> the item field they are matched against
+FILTER_FIELDS = {"title": "label", "artist": "artist", "album": "album", "dateadded": "dateadded"}
+# the content of every vfs file repeats this block, byte n of a file is n % 256
+VFS_BLOCK = bytes(range(256)) * 4096
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def make_title(rng, words=3):
+    return " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, words))) + rng.choice(NUMBER_WORDS)
+
+
+def make_library(movies, songs, seed=1):
+    rng = random.Random(seed)
+    first_day = datetime.date(2015, 1, 1)
+    movie_items = []
+    for each_id in range(1, movies + 1):
+        label = make_title(rng)
+        movie_items.append({
+            "movieid": each_id,
+            "label": label,
+            "file": "/media/movies/" + label + " (" + str(each_id) + ").mp4",
+            "dateadded": str(first_day + datetime.timedelta(days=each_id * 2000 // max(movies, 1))) + " 12:00:00"
+        })
+    artists = [make_title(rng, 2) for _ in range(max(1, songs // 20))]
+    albums = [make_title(rng, 3) for _ in range(max(1, songs // 10))]
+    song_items = []
+    for each_id in range(1, songs + 1):
+        song_items.append({
+            "songid": each_id,
+            "label": make_title(rng),
+            "artist": [rng.choice(artists)],
+            "album": rng.choice(albums),
+            "duration": rng.randint(90, 480),
+            "track": rng.randint(1, 14),
+            "dateadded": str(first_day + datetime.timedelta(days=each_id * 2000 // max(songs, 1))) + " 12:00:00"
+        })
+    return {"movie": movie_items, "song": song_items}
+
+
+def field_text(item, field):
+    value = item.get(FILTER_FIELDS.get(field, field), "")
+    if isinstance(value, list):
+        value = " / ".join(value)
+    return str(value)
+
+
+# evaluate a kodi library filter, and / or groups of field rules, against one item
+def matches(item, rule):
+    if "and" in rule:
+        return all(matches(item, each_rule) for each_rule in rule["and"])
+    if "or" in rule:
+        return any(matches(item, each_rule) for each_rule in rule["or"])
+    text = field_text(item, rule["field"]).lower()
+    value = str(rule["value"]).lower()
+    operator = rule["operator"]
+    if operator == "contains":
+        return value in text
+    if operator == "is":
+        return value == text
+    if operator in ("after", "greaterthan"):
+        return text > value
+    if operator in ("before", "lessthan"):
+        return text < value
+    raise ValueError("unsupported filter operator " + operator)
+
+
+class FakeKodi(object):
+    """
+    A threaded http server answering kodi json-rpc requests from a synthetic library.
+    """
+    list_methods = {"VideoLibrary.GetMovies": ("movie", "movies"), "AudioLibrary.GetSongs": ("song", "songs")}
+    details_methods = {"VideoLibrary.GetMovieDetails": ("movie", "moviedetails"),
+                       "AudioLibrary.GetSongDetails": ("song", "songdetails")}
+
+    def __init__(self, movies=1000, songs=1000, latency=0.0, seed=1, addons=(), vfs_size=64 * 1048576,
+                 credentials=None):
+        self.library = make_library(movies, songs, seed)
+        self.by_id = dict((each_type, dict((each_item[each_type + "id"], each_item) for each_item in each_items))
+                          for each_type, each_items in self.library.items())
+        self.latency = latency
+        self.addons = list(addons)
+        self.requests = 0
+        self.calls = {}  # method -> count
+        self.vfs_size = vfs_size
+        self.credentials = credentials  # (user, password) the vfs requests must carry
+        self.connections = 0
+        self.vfs_bytes = 0  # vfs file bytes sent
+        self.server = None
+        self.thread = None
+        self.notification_server = None
+        self.clients = []  # connected notification sockets
+        self.clients_lock = threading.Lock()
+
+    def start(self):
+        fake_kodi = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are separate writes, do not wait on delayed acks
+
+            def setup(self):
+                fake_kodi.connections += 1
+                http.server.BaseHTTPRequestHandler.setup(self)
+
+            def do_GET(self):
+                fake_kodi.send_vfs(self, send_body=True)
+
+            def do_HEAD(self):
+                fake_kodi.send_vfs(self, send_body=False)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                body = json.dumps(fake_kodi.answer(request)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return "http://127.0.0.1:" + str(self.server.server_port) + "/jsonrpc"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.stop_notifications()
+
+    # serve the tcp notification socket, on port when given, eg. the port of an earlier run
+    def start_notifications(self, port=0):
+        fake_kodi = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with fake_kodi.clients_lock:
+                    fake_kodi.clients.append(self.request)
+                decoder = json.JSONDecoder()
+                buffer = ""
+                try:
+                    while True:
+                        chunk = self.request.recv(65536)
+                        if not chunk:
+                            break
+                        buffer += chunk.decode("utf-8")
+                        while buffer.strip():
+                            try:
+                                request, end = decoder.raw_decode(buffer.lstrip())
+                            except ValueError:
+                                break
+                            buffer = buffer.lstrip()[end:]
+                            if "id" in request:
+                                fake_kodi.send_to(self.request, fake_kodi.answer_call(request))
+                except OSError:
+                    pass
+                finally:
+                    with fake_kodi.clients_lock:
+                        if self.request in fake_kodi.clients:
+                            fake_kodi.clients.remove(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.notification_server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+        self.notification_server.daemon_threads = True
+        threading.Thread(target=self.notification_server.serve_forever, daemon=True).start()
+        return self.notification_server.server_address[1]
+
+    def stop_notifications(self):
+        if self.notification_server is not None:
+            self.notification_server.shutdown()
+            self.notification_server.server_close()
+            self.notification_server = None
+        self.drop_clients()
+
+    @staticmethod
+    def send_to(client, message):
+        try:
+            client.sendall(json.dumps(message).encode("utf-8"))
+        except OSError:
+            pass
+
+    # push a notification to every connected client
+    def notify(self, method, params):
+        with self.clients_lock:
+            clients = list(self.clients)
+        for each_client in clients:
+            self.send_to(each_client, {"jsonrpc": "2.0", "method": method, "params": params})
+        return len(clients)
+
+    # close every notification connection, the clients see kodi go away
+    def drop_clients(self):
+        with self.clients_lock:
+            clients, self.clients = self.clients, []
+        for each_client in clients:
+            try:
+                each_client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            each_client.close()
+
+    # answer a /vfs/ request for any file with vfs_size bytes, the whole file or the range asked for
+    def send_vfs(self, handler, send_body):
+        if not handler.path.startswith("/vfs/"):
+            handler.send_error(404)
+            return
+        if self.credentials and handler.headers.get("Authorization") != \
+                "Basic " + base64.b64encode(":".join(self.credentials).encode("utf-8")).decode("ascii"):
+            handler.send_error(401)
+            return
+        first, last = 0, self.vfs_size - 1
+        byte_range = BYTE_RANGE.match(handler.headers.get("Range", ""))
+        if byte_range and byte_range.group(1):
+            first = int(byte_range.group(1))
+            last = min(int(byte_range.group(2)), last) if byte_range.group(2) else last
+        elif byte_range and byte_range.group(2):
+            first = max(0, self.vfs_size - int(byte_range.group(2)))
+        if first > last:
+            handler.send_response(416)
+            handler.send_header("Content-Range", "bytes */" + str(self.vfs_size))
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        handler.send_response(206 if byte_range else 200)
+        handler.send_header("Content-Type", "video/mp4")
+        handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("Content-Length", str(last - first + 1))
+        if byte_range:
+            handler.send_header("Content-Range", "bytes %d-%d/%d" % (first, last, self.vfs_size))
+        handler.end_headers()
+        if not send_body:
+            return
+        block = memoryview(VFS_BLOCK)
+        position = first
+        while position <= last:
+            start = position % len(VFS_BLOCK)
+            length = min(len(VFS_BLOCK) - start, last - position + 1)
+            try:
+                handler.wfile.write(block[start:start + length])
+            except (BrokenPipeError, ConnectionResetError):
+                handler.close_connection = True
+                return
+            self.vfs_bytes += length
+            position += length
+
+    def answer(self, request):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(request, list):
+            return [self.answer_call(each_call) for each_call in request]
+        return self.answer_call(request)
+
+    def answer_call(self, call):
+        method = call.get("method", "")
+        self.calls[method] = self.calls.get(method, 0) + 1
+        try:
+            result = self.result(method, call.get("params") or {})
+        except Exception as e:
+            return {"id": call.get("id"), "jsonrpc": "2.0", "error": {"code": -32602, "message": str(e)}}
+        return {"id": call.get("id"), "jsonrpc": "2.0", "result": result}
+
+    def result(self, method, params):
+        if method in self.list_methods:
+            media_type, result_key = self.list_methods[method]
+            return self.list_items(media_type, result_key, params)
+        if method in self.details_methods:
+            media_type, result_key = self.details_methods[method]
+            item = self.by_id[media_type][params[media_type + "id"]]
+            return {result_key: self.project(media_type, item, params.get("properties", []))}
+        if method == "Addons.GetAddons":
+            return {"addons": [{"addonid": each_addon, "type": "xbmc.python.pluginsource"}
+                               for each_addon in self.addons],
+                    "limits": {"start": 0, "end": len(self.addons), "total": len(self.addons)}}
+        if method == "JSONRPC.Ping":
+            return "pong"
+        if method == "Player.GetActivePlayers":
+            return []
+        if method == "Application.GetProperties":
+            return {"volume": 80, "muted": False}
+        if method == "Application.SetVolume":
+            return params.get("volume", 0)
+        return "OK"  # playlist, player, input and gui commands
+
+    @staticmethod
+    def project(media_type, item, properties):
+        projected = {media_type + "id": item[media_type + "id"], "label": item["label"]}
+        for each_property in properties:
+            projected[each_property] = item.get(each_property, "")
+        return projected
+
+    def list_items(self, media_type, result_key, params):
+        items = self.library[media_type]
+        if params.get("filter"):
+            items = [each_item for each_item in items if matches(each_item, params["filter"])]
+        sort = params.get("sort") or {}
+        if sort.get("method") and sort["method"] != "dateadded":  # the library is generated in dateadded order
+            items = sorted(items, key=lambda each_item: field_text(each_item, sort["method"]).lower())
+        if sort.get("order") == "descending":
+            items = list(reversed(items))
+        limits = params.get("limits") or {}
+        start = limits.get("start", 0)
+        end = min(limits.get("end", len(items)), len(items))
+        page = [self.project(media_type, each_item, params.get("properties", [])) for each_item in items[start:end]]
+        result = {"limits": {"start": start, "end": end, "total": len(items)}}
+        if page:  # like kodi, an empty result has no item array
+            result[result_key] = page
+        return result
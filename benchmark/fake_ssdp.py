@@ -0,0 +1,119 @@
+"""
+A local stand-in for the UPnP devices on a network, answering SSDP searches on a unicast udp
+port and serving their device descriptions over http. Each device is a kodi, or any other
+brand, whose presentationURL points at a json-rpc port; every device answers every search
+target, as kodi does, so a search hears each one more than once. It needs nothing outside
+the standard library.
+
+    responder = FakeSsdp([("Living Room", "Kodi", 8080), ("Tv", "Samsung", None)])
+    address = responder.start()  # ("127.0.0.1", <port>), the address to send M-SEARCH to
+    ...
+    responder.stop()
+"""
+import http.server
+import socket
+import threading
+
+DESCRIPTION = """<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <specVersion><major>1</major><minor>0</minor></specVersion>
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+    <friendlyName>%(name)s</friendlyName>
+    <manufacturer>%(brand)s Foundation</manufacturer>
+    <modelName>%(brand)s</modelName>
+    <UDN>uuid:fake-%(index)d</UDN>%(presentation)s
+  </device>
+</root>
+"""
+
+
+class FakeSsdp(object):
+    """
+    Answers M-SEARCH requests for a list of (friendly name, brand, json-rpc port or None) devices.
+    """
+    def __init__(self, devices, host="127.0.0.1", latency=0.0):
+        self.devices = list(devices)
+        self.host = host
+        self.latency = latency  # seconds before the devices answer a search
+        self.searches = 0
+        self.sock = None
+        self.server = None
+        self.stopping = False
+
+    def start(self):
+        fake_ssdp = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                index = int(self.path.strip("/").split("/")[-1].split(".")[0])
+                body = fake_ssdp.description(index).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((self.host, 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.stopping = False
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.bind((self.host, 0))
+        threading.Thread(target=self.answer_searches, daemon=True).start()
+        return self.sock.getsockname()
+
+    def stop(self):
+        self.stopping = True
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def description(self, index):
+        name, brand, port = self.devices[index]
+        presentation = ""
+        if port:
+            presentation = "\n    <presentationURL>http://%s:%d/</presentationURL>" % (self.host, port)
+        return DESCRIPTION % {"name": name, "brand": brand, "index": index, "presentation": presentation}
+
+    def answer_searches(self):
+        sock = self.sock
+        while not self.stopping:
+            try:
+                data, sender = sock.recvfrom(65507)
+            except OSError:
+                return
+            request = data.decode("utf-8", "replace")
+            if not request.startswith("M-SEARCH") or "ssdp:discover" not in request:
+                continue
+            self.searches += 1
+            search_target = ""
+            for each_line in request.split("\r\n"):
+                if each_line.lower().startswith("st:"):
+                    search_target = each_line[3:].strip()
+            threading.Thread(target=self.respond, args=(sock, sender, search_target), daemon=True).start()
+
+    def respond(self, sock, sender, search_target):
+        if self.latency:
+            threading.Event().wait(self.latency)
+        for each_index in range(len(self.devices)):
+            response = ("HTTP/1.1 200 OK\r\n"
+                        "CACHE-CONTROL: max-age=1800\r\n"
+                        "EXT:\r\n"
+                        "LOCATION: http://%s:%d/description/%d.xml\r\n"
+                        "SERVER: Linux UPnP/1.0 Fake/1.0\r\n"
+                        "ST: %s\r\n"
+                        "USN: uuid:fake-%d::%s\r\n"
+                        "\r\n") % (self.host, self.server.server_port, each_index, search_target, each_index,
+                                   search_target)
+            try:
+                sock.sendto(response.encode("ascii"), sender)
+            except OSError:
+                return
@@ -0,0 +1,112 @@
+"""
+A local stand-in for the youtube search endpoints the skill uses: the html results page and
+the data api search. Every query gets its own stable set of video and playlist ids, served
+after an optional per request latency. resolve() stands in for the stream extraction, it
+answers a signed url that expires after url_lifetime seconds once resolve_latency has passed.
+It needs nothing outside the standard library.
+
+    server = FakeYoutube(latency=0.3, resolve_latency=2.0)
+    base_url = server.start()  # http://127.0.0.1:<port>
+    HtmlSearch(base_url), DataApiSearch("key", base_url + "/youtube/v3"), StreamResolver(server.resolve)
+    server.stop()
+"""
+import hashlib
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+ID_CHARACTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+# a stable youtube style id of the given length for the text
+def make_id(text, length):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return "".join(ID_CHARACTERS[each_byte % len(ID_CHARACTERS)] for each_byte in digest[:length])
+
+
+def results_for(query, videos=20, playlists=3):
+    return ([make_id(query + "/video/" + str(each_index), 11) for each_index in range(videos)],
+            ["PL" + make_id(query + "/playlist/" + str(each_index), 32) for each_index in range(playlists)])
+
+
+# a results page shaped like youtube's, every video is linked from its thumbnail and its title
+def results_page(query):
+    video_ids, playlist_ids = results_for(query)
+    parts = ["<html><head><title>" + query + " - YouTube</title></head><body>"]
+    for each_id in video_ids:
+        parts.append('<a href="/watch?v=' + each_id + '" class="thumbnail"><img src="/vi/' + each_id + '.jpg"></a>')
+        parts.append('<a href="/watch?v=' + each_id + '" class="title">' + query + " video</a>")
+    for each_id in playlist_ids:
+        parts.append('<a href="/playlist?list=' + each_id + '" class="title">' + query + " playlist</a>")
+    parts.append("<div>" + "x" * 200000 + "</div></body></html>")  # real results pages are a few hundred KB
+    return "\n".join(parts)
+
+
+class FakeYoutube(object):
+    """
+    A threaded http server answering youtube searches with generated results.
+    """
+    def __init__(self, latency=0.0, resolve_latency=0.0, url_lifetime=21600):
+        self.latency = latency
+        self.resolve_latency = resolve_latency
+        self.url_lifetime = url_lifetime
+        self.requests = 0
+        self.resolved = 0
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        fake_youtube = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fake_youtube.requests += 1
+                if fake_youtube.latency:
+                    time.sleep(fake_youtube.latency)
+                url = urllib.parse.urlsplit(self.path)
+                params = urllib.parse.parse_qs(url.query)
+                if url.path == "/results":
+                    body, content_type = results_page(params["search_query"][0]), "text/html"
+                elif url.path == "/youtube/v3/search":
+                    video_ids, playlist_ids = results_for(params["q"][0])
+                    items = [{"id": {"kind": "youtube#video", "videoId": each_id}} for each_id in video_ids]
+                    items[3:3] = [{"id": {"kind": "youtube#playlist", "playlistId": each_id}}
+                                  for each_id in playlist_ids]  # the api mixes playlists in with the videos
+                    body, content_type = json.dumps({"items": items[:int(params["maxResults"][0])]}), \
+                        "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return "http://127.0.0.1:" + str(self.server.server_port)
+
+    def resolve(self, video_id):
+        self.resolved += 1
+        if self.resolve_latency:
+            time.sleep(self.resolve_latency)
+        return ("https://rr1---sn-fake.googlevideo.com/videoplayback?expire=" +
+                str(int(time.time() + self.url_lifetime)) + "&id=" + video_id + "&itag=251&mime=audio%2Fwebm")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,63 @@
+"""
+Benchmark of the utterance parser.
+Parses a set of typical requests, checks what each one parses to and reports the parse
+time per utterance in microseconds, failing when it grows past MAX_MICROSECONDS.
+
+    python3 benchmark/parser_benchmark.py
+"""
+import os
+import sys
+import timeit
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SKILL_DIR)
+
+from kodi_parser import ParseResult, UtteranceParser, parse_volume  # noqa: E402
+
+MAX_MICROSECONDS = 50.0  # allowed mean parse time per utterance
+
+# utterance -> what it must parse to
+UTTERANCES = {
+    "ask kodi to play the artist elvis presley": ParseResult("music", "artist", "elvis presley", frozenset()),
+    "ask kodi to play all shook up": ParseResult("music", "any", "all shook up", frozenset()),
+    "ask kodi to play the album appeal to reason": ParseResult("music", "album", "appeal to reason", frozenset()),
+    "ask kodi to play some queen": ParseResult("music", "any", "queen", frozenset(["some"])),
+    "ask kodi to play the movie guardians of the galaxy":
+        ParseResult("movie", "label", "guardians of the galaxy", frozenset()),
+    "ask kodi to play the film planet of the apes with cinemavision":
+        ParseResult("movie", "label", "planet of the apes", frozenset(["cinemavision"])),
+    "ask kodi to play the movie iron man on the chromecast":
+        ParseResult("movie", "label", "iron man", frozenset(["cast"])),
+    "ask kodi to play a random movie": ParseResult("movie", "label", "", frozenset(["random"])),
+    "ask kodi to play some elvis from youtube": ParseResult("youtube", "any", "elvis", frozenset(["some"])),
+    "ask kodi to play the beatles from you tube": ParseResult("youtube", "any", "beatles", frozenset()),
+    "ask kodi to play the audio of the sound of silence from youtube":
+        ParseResult("youtube", "any", "the sound of silence", frozenset(["audio"])),
+    "ask kodi to play bohemian rhapsody audio only from youtube":
+        ParseResult("youtube", "any", "bohemian rhapsody", frozenset(["audio"])),
+    "ask kodi": ParseResult("music", "any", "", frozenset())
+}
+
+
+def main():
+    parser = UtteranceParser(os.path.join(SKILL_DIR, "vocab", "en-us"))
+    failed = 0
+    for each_utterance, each_expected in UTTERANCES.items():
+        parsed = parser.parse(each_utterance)
+        if parsed != each_expected:
+            print("FAIL: " + each_utterance + " parsed to " + str(parsed))
+            failed += 1
+    assert parse_volume("set kodi volume to 25") == 25 and parse_volume("set kodi volume") is None
+    runs = 2000
+    elapsed = min(timeit.repeat(lambda: [parser.parse(each_utterance) for each_utterance in UTTERANCES],
+                                number=runs, repeat=3))
+    microseconds = elapsed / runs / len(UTTERANCES) * 1e6
+    print("%d utterances: %.1f us per utterance" % (len(UTTERANCES), microseconds))
+    if microseconds > MAX_MICROSECONDS:
+        print("FAIL: parsing is slower than %.0f us per utterance" % MAX_MICROSECONDS)
+        failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
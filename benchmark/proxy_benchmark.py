@@ -0,0 +1,161 @@
+"""
+Offline benchmark of casting a library movie through the skill's streaming proxy.
+A fake kodi, asking for basic authentication on its /vfs/ files, serves the movie and a fake
+cast device plays the proxied url. Reported are the proxy's throughput next to reading kodi
+directly, the time and the bytes kodi sends for every seek (a range request the device drops
+after a MiB, as a player does when it seeks again), the kodi connections the proxy opens for
+a run of range requests, and the throughput of a file this host reads itself with sendfile.
+A guessed token and a stream left unused past its ttl must be refused.
+
+    python3 benchmark/proxy_benchmark.py --size 256
+
+It needs the skill's own requirements (mycroft, adapt, pafy, pychromecast) to be importable.
+"""
+import argparse
+import http.client
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.parse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_cast import FakeCastDevice  # noqa: E402
+from fake_kodi import VFS_BLOCK, FakeKodi  # noqa: E402
+from skill_benchmark import load_skill_module, make_skill, percentile  # noqa: E402
+
+MIB = 1048576
+CREDENTIALS = ("kodi", "secret")
+
+
+# byte n of every fake kodi file is n % 256
+def check_bytes(data, first):
+    start = first % len(VFS_BLOCK)
+    assert data == (VFS_BLOCK * (len(data) // len(VFS_BLOCK) + 2))[start:start + len(data)], "wrong bytes"
+
+
+# read url with a get, the whole body or only its first read_bytes, returns (status, body, seconds)
+def fetch(connection, url, byte_range=None, read_bytes=None, headers=None):
+    headers = dict(headers or {})
+    if byte_range:
+        headers["Range"] = byte_range
+    start_time = time.perf_counter()
+    split_url = urllib.parse.urlsplit(url)
+    connection.request("GET", split_url.path, headers=headers)
+    response = connection.getresponse()
+    body = response.read(read_bytes) if read_bytes else response.read()
+    return response.status, body, time.perf_counter() - start_time
+
+
+def new_connection(url):
+    return http.client.HTTPConnection(urllib.parse.urlsplit(url).netloc, timeout=30)
+
+
+def throughput(url, size, headers=None):
+    connection = new_connection(url)
+    status, body, seconds = fetch(connection, url, headers=headers)
+    connection.close()
+    assert status == 200 and len(body) == size, (status, len(body))
+    check_bytes(body[:MIB], 0)
+    return size / MIB / seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=256, help="MiB in the movie file")
+    parser.add_argument("--seeks", type=int, default=20, help="seeks to random positions")
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+    size = args.size * MIB
+    skill_module = load_skill_module()
+    kodi = FakeKodi(movies=100, songs=10, vfs_size=size, credentials=CREDENTIALS)
+    url = kodi.start()
+    device = FakeCastDevice(connect_latency=0.05, ready_latency=0.05)
+    with tempfile.TemporaryDirectory() as data_dir:
+        skill = make_skill(skill_module, url, os.path.join(data_dir, "kodi_library.db"))
+        skill.kodi.configure(url.replace("http://", "http://" + ":".join(CREDENTIALS) + "@"))
+        skill.casts = skill_module.CastSessions(connect=device.connect)
+        try:
+            skill.library.sync()
+            movie = kodi.library["movie"][7]
+            vfs_url = skill.get_kodi_movie_path(movie["label"])
+            assert vfs_url == url.rsplit("/jsonrpc", 1)[0] + "/vfs/" + urllib.parse.quote(movie["file"], safe=""), \
+                vfs_url
+            assert skill.cast_kodi_movie(movie["movieid"], "127.0.0.1")
+            proxy_url = device.last_cast.media_controller.played[-1]
+            print("cast %s from %s" % (movie["label"], proxy_url))
+
+            auth_header = {"Authorization": skill.proxy.streams[proxy_url.split("/")[4]]["authorization"]}
+            print("  %-36s %10.1f MiB/s" % ("kodi, direct", throughput(vfs_url, size, auth_header)))
+            print("  %-36s %10.1f MiB/s" % ("kodi, through the proxy", throughput(proxy_url, size)))
+
+            rng = random.Random(1)
+            latencies = []
+            upstream_bytes = []
+            for _ in range(args.seeks):
+                first = rng.randrange(size - MIB)
+                sent_before = kodi.vfs_bytes
+                connection = new_connection(proxy_url)
+                status, body, seconds = fetch(connection, proxy_url, "bytes=%d-" % first, MIB)
+                connection.close()  # the player seeks again, dropping the rest of the range
+                assert status == 206 and len(body) == MIB, (status, len(body))
+                check_bytes(body, first)
+                latencies.append(seconds)
+                time.sleep(0.05)  # let the proxy notice the dropped request
+                upstream_bytes.append(kodi.vfs_bytes - sent_before)
+            latencies.sort()
+            print("  %-36s %10.2f ms p50 %8.2f ms p99, kodi sent %.1f MiB per seek at most" %
+                  ("seek, first MiB", percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+                   max(upstream_bytes) / float(MIB)))
+
+            connections_before = kodi.connections
+            connection = new_connection(proxy_url)
+            for each_index in range(args.seeks):
+                first = rng.randrange(size - MIB)
+                status, body, _ = fetch(connection, proxy_url, "bytes=%d-%d" % (first, first + MIB - 1))
+                assert status == 206 and len(body) == MIB, (status, len(body))
+                check_bytes(body, first)
+            connection.close()
+            print("  %-36s %10d kodi connections for %d ranges" % ("bounded ranges, kept alive",
+                                                                   kodi.connections - connections_before,
+                                                                   args.seeks))
+
+            local_path = os.path.join(data_dir, "movie.mp4")
+            with open(local_path, "wb") as movie_file:
+                for _ in range(size // len(VFS_BLOCK)):
+                    movie_file.write(VFS_BLOCK)
+            local_url = skill.proxy.add(skill.kodi_vfs_url(local_path), skill.kodi.auth, local_path)
+            print("  %-36s %10.1f MiB/s" % ("local file, sendfile", throughput(local_url, size)))
+            connection = new_connection(local_url)
+            status, body, _ = fetch(connection, local_url, "bytes=%d-%d" % (size - 10, size + 10))
+            connection.close()
+            assert status == 206 and len(body) == 10, (status, len(body))
+            check_bytes(body, size - 10)
+
+            # a stream is only served under its own random token, and only until it is left unused for stream_ttl
+            guessed_url = local_url.rsplit("/", 2)[0] + "/" + "A" * 22 + "/" + local_url.rsplit("/", 1)[1]
+            status, _, _ = fetch(new_connection(guessed_url), guessed_url)
+            assert status == 404, status
+            skill.proxy.stream_ttl = 0.2
+            expiring_url = skill.proxy.add(skill.kodi_vfs_url(local_path), skill.kodi.auth, local_path)
+            status, _, _ = fetch(new_connection(expiring_url), expiring_url, "bytes=0-9")
+            assert status == 206, status
+            time.sleep(0.3)
+            status, _, _ = fetch(new_connection(expiring_url), expiring_url, "bytes=0-9")
+            assert status == 404, status
+            print("  %-36s %10s" % ("guessed and expired tokens refused", "ok"))
+        finally:
+            skill.casts.close()
+            skill.proxy.stop()
+            skill.library.close()
+            skill.kodi.close()
+            kodi.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Offline benchmark of the skill's search and playback paths against a fake kodi.
+For every library size a FakeKodi serving that many movies and songs is started, the skill's
+library index is synced from it and each scenario is run against the real skill methods.
+Throughput, p50 / p99 latency and the peak python memory of every scenario are reported.
+
+    python3 benchmark/skill_benchmark.py --sizes 1000,10000,100000 --latency 0.002
+    python3 benchmark/skill_benchmark.py --json results.json
+    python3 benchmark/skill_benchmark.py --baseline results.json  # exit 1 on a regression
+
+It needs the skill's own requirements (mycroft, adapt, pafy, pychromecast) to be importable,
+kodi itself is not needed.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SKILL_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_kodi import FakeKodi  # noqa: E402
+
+SIZES = [1000, 10000, 100000]
+MEMORY_ITERATIONS = 10  # scenario runs traced for the peak memory, tracing slows them so they are not timed
+REGRESSION_TOLERANCE = 1.5  # a p50 this many times the baseline p50 is a regression
+REGRESSION_SLACK = 0.002  # seconds, smaller differences are noise
+
+
+# import the skill directory as a package, its directory name need not be a valid module name
+def load_skill_module():
+    spec = importlib.util.spec_from_file_location("kodi_skill", os.path.join(SKILL_DIR, "__init__.py"),
+                                                  submodule_search_locations=[SKILL_DIR])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["kodi_skill"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# the skill with its voice output switched off, there is no message bus in the benchmark
+def make_skill(skill_module, url, db_path):
+    class BenchmarkSkill(skill_module.KodiSkill):
+        def speak_dialog(self, *args, **kwargs):
+            pass
+
+        def set_context(self, *args, **kwargs):
+            pass
+
+    skill = BenchmarkSkill()
+    skill.kodi.configure(url, timeout=30.0)
+    skill.library = skill_module.KodiLibrary(skill.kodi, db_path)
+    skill.library.set_host(skill.kodi.url)
+    return skill
+
+
+# scenario name -> callable(rng) running one request against the skill
+def make_scenarios(skill, server):
+    movies = server.library["movie"]
+    songs = server.library["song"]
+
+    def spoken(label):  # the first word or two of a title, as a user would say it
+        words = label.lower().split()
+        return " ".join(words[:random.Random(label).randint(1, min(2, len(words)))])
+
+    def music_query(rng):
+        song = rng.choice(songs)
+        return rng.choice([song["label"], song["artist"][0], song["album"]])
+
+    return [
+        ("find_movies_with_filter", lambda rng: skill.find_movies_with_filter(spoken(rng.choice(movies)["label"]))),
+        ("search_music_library", lambda rng: skill.search_music_library(music_query(rng), category="any")),
+        ("queue_and_play_music", lambda rng: skill.queue_and_play_music(rng.sample(songs, min(20, len(songs))))),
+        ("play_film", lambda rng: skill.play_film(rng.choice(movies)["movieid"])),
+        ("random_movie", lambda rng: skill.handle_random_movie_select_intent())
+    ]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def run_scenario(run, iterations, seed):
+    rng = random.Random(seed)
+    latencies = []
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        run(rng)
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start_time
+    tracemalloc.start()
+    for _ in range(MEMORY_ITERATIONS):
+        run(rng)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "throughput": iterations / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "peak_memory": peak
+    }
+
+
+def run_size(skill_module, size, latency, iterations):
+    server = FakeKodi(movies=size, songs=size, latency=latency)
+    url = server.start()
+    with tempfile.TemporaryDirectory() as data_dir:
+        skill = make_skill(skill_module, url, os.path.join(data_dir, "kodi_library.db"))
+        try:
+            sync_start = time.perf_counter()
+            skill.library.sync()
+            for each_media_type in ("movie", "song"):
+                skill.library.index(each_media_type, "title")
+            skill.library.index("movie", "fuzzy")
+            results = {"sync": {"seconds": time.perf_counter() - sync_start,
+                                "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}}
+            for each_name, each_run in make_scenarios(skill, server):
+                results[each_name] = run_scenario(each_run, iterations, seed=size)
+        finally:
+            skill.library.close()
+            skill.kodi.close()
+            server.stop()
+    return results
+
+
+def print_results(size, results):
+    print("%d movies and songs, synced and indexed in %.2f s, max rss %.1f MiB" %
+          (size, results["sync"]["seconds"], results["sync"]["max_rss"] / 1048576.0))
+    print("  %-24s %10s %10s %10s %12s" % ("scenario", "ops/s", "p50 ms", "p99 ms", "peak KiB"))
+    for each_name, each_result in results.items():
+        if each_name != "sync":
+            print("  %-24s %10.1f %10.2f %10.2f %12.1f" % (each_name, each_result["throughput"],
+                                                           each_result["p50"] * 1000, each_result["p99"] * 1000,
+                                                           each_result["peak_memory"] / 1024.0))
+
+
+# the scenarios whose p50 grew past the tolerance since the baseline run
+def find_regressions(report, baseline):
+    regressions = []
+    for each_size, each_results in report["sizes"].items():
+        for each_name, each_result in each_results.items():
+            before = baseline.get("sizes", {}).get(each_size, {}).get(each_name)
+            if each_name == "sync" or not before:
+                continue
+            if each_result["p50"] > before["p50"] * REGRESSION_TOLERANCE + REGRESSION_SLACK:
+                regressions.append("%s at %s: p50 %.2f ms, was %.2f ms" % (each_name, each_size,
+                                                                            each_result["p50"] * 1000,
+                                                                            before["p50"] * 1000))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(each_size) for each_size in SIZES),
+                        help="comma separated library sizes")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds the fake kodi waits per request")
+    parser.add_argument("--iterations", type=int, default=50, help="timed runs per scenario")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with the results of an earlier --json run")
+    parser.add_argument("--verbose", action="store_true", help="keep the skill's info logging")
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    skill_module = load_skill_module()
+    report = {"latency": args.latency, "iterations": args.iterations, "sizes": {}}
+    for each_size in [int(each_size) for each_size in args.sizes.split(",")]:
+        report["sizes"][str(each_size)] = run_size(skill_module, each_size, args.latency, args.iterations)
+        print_results(each_size, report["sizes"][str(each_size)])
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump(report, results_file, indent=1)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(report, json.load(baseline_file))
+        for each_regression in regressions:
+            print("REGRESSION: " + each_regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
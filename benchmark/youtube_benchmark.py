@@ -0,0 +1,161 @@
+"""
+Offline benchmark of "play ... from youtube" against a fake kodi and a fake youtube.
+The intent handler is run for new queries (the search overlaps the youtube addon check) and
+for repeated ones (answered from the search cache), with both search backends, and the ids
+it plays are checked against what the fake youtube served. The single pass link extraction
+is timed against the old regex scans of a results page. Audio stream urls are resolved for
+new videos, repeated videos and a playlist walked with its next items prefetched, and the
+audio only intent is timed for new and repeated queries, checking the next results get queued.
+
+    python3 benchmark/youtube_benchmark.py --latency 0.3 --resolve-latency 1.0
+
+It needs the skill's own requirements (mycroft, adapt, pafy, pychromecast) to be importable.
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+import timeit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_kodi import FakeKodi  # noqa: E402
+from fake_youtube import FakeYoutube, results_for, results_page  # noqa: E402
+from skill_benchmark import load_skill_module, make_skill, percentile  # noqa: E402
+
+
+class Message(object):
+    def __init__(self, utterance, **keywords):
+        self.data = {"utterance": utterance}
+        self.data.update(keywords)
+
+
+# the links of a results page found the way the skill did before, for comparison
+def old_extract_links(html):
+    video_links = []
+    for each_video in re.findall(r'href=\"\/watch\?v=(.{11})', html.decode()):
+        if each_video not in video_links:
+            video_links.append(each_video)
+    playlist_links = []
+    for each_playlist in re.findall(r'href=\"\/playlist\?list\=(.{34})', html.decode()):
+        if each_playlist not in playlist_links:
+            playlist_links.append(each_playlist.split('"', 1)[0])
+    return video_links, playlist_links
+
+
+def time_handler(skill, queries):
+    latencies = []
+    for each_query in queries:
+        start_time = time.perf_counter()
+        skill.handle_play_youtube_intent(Message("ask kodi to play " + each_query + " from youtube"))
+        latencies.append(time.perf_counter() - start_time)
+        video_ids, playlist_ids = results_for(each_query)
+        expected = [video_ids[0], playlist_ids[0]]
+        assert skill.youtube_id == expected, (each_query, skill.youtube_id, expected)
+    latencies.sort()
+    return percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+# time the audio only intent, every query must queue its first stream_prefetch + 1 videos on kodi
+def time_audio_handler(skill, kodi, queries):
+    latencies = []
+    for each_query in queries:
+        added = kodi.calls.get("Playlist.Add", 0)
+        start_time = time.perf_counter()
+        skill.handle_play_youtube_intent(Message("ask kodi to play the audio of " + each_query + " from youtube",
+                                                 AudioKeyword="audio"))
+        latencies.append(time.perf_counter() - start_time)
+        queued = 1 + skill.stream_prefetch
+        end_time = time.monotonic() + skill.stream_timeout
+        while kodi.calls.get("Playlist.Add", 0) - added < queued and time.monotonic() < end_time:
+            time.sleep(0.01)
+        assert kodi.calls.get("Playlist.Add", 0) - added == queued, (each_query, kodi.calls)
+    latencies.sort()
+    return percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+# time get_yt_audio_url for every video, play_seconds is how long each one plays before the next
+def time_audio_urls(skill, video_ids, prefetch, play_seconds=0.0):
+    latencies = []
+    for each_index, each_id in enumerate(video_ids):
+        next_urls = ["/watch?v=" + each_next for each_next in video_ids[each_index + 1:]] if prefetch else []
+        start_time = time.perf_counter()
+        audio_url = skill.get_yt_audio_url("/watch?v=" + each_id, next_urls)
+        latencies.append(time.perf_counter() - start_time)
+        assert "&id=" + each_id + "&" in audio_url, (each_id, audio_url)
+        time.sleep(play_seconds)
+    latencies.sort()
+    return percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds the fake youtube waits per request")
+    parser.add_argument("--resolve-latency", type=float, default=1.0, help="seconds a stream url takes to resolve")
+    parser.add_argument("--kodi-latency", type=float, default=0.05, help="seconds the fake kodi waits per request")
+    parser.add_argument("--iterations", type=int, default=10, help="queries per scenario")
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+
+    page = results_page("lofi hip hop").encode("utf-8")
+    skill_module = load_skill_module()
+    kodi_youtube = sys.modules["kodi_skill.kodi_youtube"]
+    assert kodi_youtube.extract_links(page.decode()) == old_extract_links(page)
+    runs = 50
+    old_seconds = min(timeit.repeat(lambda: old_extract_links(page), number=runs, repeat=3)) / runs
+    new_seconds = min(timeit.repeat(lambda: kodi_youtube.extract_links(page.decode()), number=runs,
+                                    repeat=3)) / runs
+    print("link extraction of a %d KB page: %.2f ms, was %.2f ms" % (len(page) // 1024, new_seconds * 1000,
+                                                                      old_seconds * 1000))
+
+    kodi = FakeKodi(movies=10, songs=10, latency=args.kodi_latency, addons=["plugin.video.youtube"])
+    youtube = FakeYoutube(latency=args.latency, resolve_latency=args.resolve_latency)
+    youtube_url = youtube.start()
+    with tempfile.TemporaryDirectory() as data_dir:
+        skill = make_skill(skill_module, kodi.start(), os.path.join(data_dir, "kodi_library.db"))
+        skill.parser = skill_module.UtteranceParser(os.path.join(skill_module.__path__[0], "vocab", "en-us"))
+        skill.kodi_is_down = lambda: False
+        try:
+            print("  %-30s %10s %10s" % ("scenario", "p50 ms", "p99 ms"))
+            for each_name, each_backend in (("html", kodi_youtube.HtmlSearch(youtube_url)),
+                                            ("data api", kodi_youtube.DataApiSearch("key",
+                                                                                    youtube_url + "/youtube/v3"))):
+                skill.youtube.set_backend(each_backend)
+                queries = [each_name + " query " + str(each_index) for each_index in range(args.iterations)]
+                skill.addons = skill_module.AddonRegistry(skill.kodi)  # the first query also loads the addon list
+                for each_scenario, each_queries in (("new query", queries), ("repeated query", queries)):
+                    p50, p99 = time_handler(skill, each_queries)
+                    print("  %-30s %10.2f %10.2f" % (each_name + ", " + each_scenario, p50 * 1000, p99 * 1000))
+            skill.streams = skill_module.StreamResolver(youtube.resolve)
+            video_ids = results_for("audio")[0][:args.iterations]
+            for each_scenario, each_prefetch, each_play in (("audio url, new video", False, 0.0),
+                                                            ("audio url, repeated video", False, 0.0)):
+                p50, p99 = time_audio_urls(skill, video_ids, each_prefetch, each_play)
+                print("  %-30s %10.2f %10.2f" % (each_scenario, p50 * 1000, p99 * 1000))
+            skill.streams.close()
+            skill.streams = skill_module.StreamResolver(youtube.resolve)
+            # every video plays a little longer than a resolution takes, the next ones resolve meanwhile
+            p50, p99 = time_audio_urls(skill, results_for("playlist")[0][:args.iterations], True,
+                                       args.resolve_latency * 1.2)
+            print("  %-30s %10.2f %10.2f" % ("audio url, prefetched playlist", p50 * 1000, p99 * 1000))
+            queries = ["audio query " + str(each_index) for each_index in range(args.iterations)]
+            for each_scenario, each_queries in (("audio intent, new query", queries),
+                                                ("audio intent, repeated query", queries)):
+                p50, p99 = time_audio_handler(skill, kodi, each_queries)
+                print("  %-30s %10.2f %10.2f" % (each_scenario, p50 * 1000, p99 * 1000))
+        finally:
+            skill.youtube.close()
+            skill.streams.close()
+            skill.library.close()
+            skill.kodi.close()
+            kodi.stop()
+            youtube.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from mycroft.util.log import LOG
+
+
+class AddonRegistry(object):
+    """
+    A cached view of the addons installed on kodi.
+    The addon list is fetched once and kept for ttl seconds. A stale list is still answered
+    from the cache while a fresh copy is fetched in the background, so a capability check
+    never waits on kodi once the list has been loaded.
+    """
+    def __init__(self, rpc, ttl=3600):
+        self.rpc = rpc
+        self.ttl = ttl
+        self.addons = None
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+        self.refreshing = False
+
+    def refresh(self):
+        result = self.rpc.call("Addons.GetAddons", {"enabled": True})["result"]
+        self.addons = set(each_addon["addonid"] for each_addon in result.get("addons", []))
+        self.loaded_at = time.time()
+        LOG.info("Kodi addons found: " + str(len(self.addons)))
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self.background_refresh, daemon=True).start()
+
+    def background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            LOG.error("Kodi addon refresh failed: " + str(e))
+        finally:
+            self.refreshing = False
+
+    # mark the list stale, forget it entirely when it belongs to another kodi instance
+    def invalidate(self, method=None, params=None, forget=False):
+        self.loaded_at = 0
+        if forget:
+            self.addons = None
+        self.refresh_in_background()
+
+    # true when the addon is installed and enabled on kodi
+    def has_addon(self, addon_id):
+        if self.addons is None:
+            self.refresh()
+        elif time.time() - self.loaded_at > self.ttl:
+            self.refresh_in_background()
+        return addon_id in self.addons
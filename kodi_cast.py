@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pychromecast
+from pychromecast.controllers.youtube import YouTubeController
+
+from mycroft.util.log import LOG
+
+from .kodi_metrics import metrics
+
+# media player states of a cast device that has loaded the media
+READY_STATES = ("BUFFERING", "PLAYING", "PAUSED")
+
+
+class MediaStatusWaiter(object):
+    """
+    Follows the media status of one cast device, registered as its status listener, so a
+    command can wait for the device to report a state instead of sleeping for a fixed time.
+    """
+    def __init__(self):
+        self.status = None
+        self.condition = threading.Condition()
+
+    # called by pychromecast on its socket thread with every media status the device sends
+    def new_media_status(self, status):
+        with self.condition:
+            self.status = status
+            self.condition.notify_all()
+
+    # the player state of the last status, only when it is about content_id if one is given
+    def player_state(self, content_id=None):
+        if content_id is not None and getattr(self.status, "content_id", None) != content_id:
+            return None
+        return getattr(self.status, "player_state", None)
+
+    # wait until the device reports one of the states, returns the state or None on timeout
+    # with content_id, a status left over from the media played before is not taken for the new one
+    def wait_for(self, states, timeout, content_id=None):
+        end_time = time.monotonic() + timeout
+        with self.condition:
+            while self.player_state(content_id) not in states:
+                remaining = end_time - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            return self.player_state(content_id)
+
+
+class CastSession(object):
+    """
+    A connected cast device with its controllers, kept for the next command.
+    """
+    def __init__(self, cast):
+        self.cast = cast
+        self.media = MediaStatusWaiter()
+        self.youtube = None
+        self.lock = threading.Lock()  # one command at a time per device
+        cast.media_controller.register_status_listener(self.media)
+
+    def is_connected(self):
+        socket_client = getattr(self.cast, "socket_client", None)
+        return socket_client is None or getattr(socket_client, "is_connected", True)
+
+    # the youtube controller of the device, registered on first use
+    def youtube_controller(self):
+        if self.youtube is None:
+            self.youtube = YouTubeController()
+            self.cast.register_handler(self.youtube)
+        return self.youtube
+
+
+class CastSessions(object):
+    """
+    The cast devices the skill has talked to, by ip address. A device is connected once and its
+    session reused by later commands, a session whose connection was lost is connected again.
+    connect is the function making a pychromecast.Chromecast for an ip address.
+    """
+    def __init__(self, connect=None, connect_timeout=10.0, ready_timeout=20.0):
+        self.connect = connect or pychromecast.Chromecast
+        self.connect_timeout = connect_timeout
+        self.ready_timeout = ready_timeout  # seconds to wait for the device to load the media
+        self.sessions = {}  # ip -> CastSession
+        self.connecting = {}  # ip -> lock held while that device is connected
+        self.lock = threading.Lock()  # guards the two dicts, never held while a device connects
+
+    def session(self, device_ip):
+        with self.lock:
+            connect_lock = self.connecting.setdefault(device_ip, threading.Lock())
+        # only the commands for this device wait for its connection, the others go on
+        with connect_lock:
+            with self.lock:
+                session = self.sessions.get(device_ip)
+            if session is not None and session.is_connected():
+                metrics.increment("kodi_cast_sessions_total", {"result": "reused"})
+                return session
+            if session is not None:
+                self.disconnect(session)
+            with metrics.timer("kodi_cast_connect_seconds"):
+                cast = self.connect(device_ip)
+                cast.wait(timeout=self.connect_timeout)
+            metrics.increment("kodi_cast_sessions_total", {"result": "connected"})
+            session = CastSession(cast)
+            with self.lock:
+                self.sessions[device_ip] = session
+            return session
+
+    # load the media on the device and start it once the device reports it has loaded it
+    def play_media(self, device_ip, source_link, content_type):
+        session = self.session(device_ip)
+        with session.lock, metrics.timer("kodi_cast_start_seconds", {"kind": "media"}):
+            media_controller = session.cast.media_controller
+            media_controller.play_media(source_link, content_type)
+            state = session.media.wait_for(READY_STATES, self.ready_timeout, source_link)
+            if state is None:
+                LOG.error("Cast device " + str(device_ip) + " did not load " + str(source_link))
+                return False
+            if state != "PLAYING":
+                media_controller.play()
+            return True
+
+    # play a youtube video id on the device with its youtube app
+    def play_youtube(self, device_ip, video_id):
+        session = self.session(device_ip)
+        with session.lock, metrics.timer("kodi_cast_start_seconds", {"kind": "youtube"}):
+            session.youtube_controller().play_video(video_id)
+
+    @staticmethod
+    def disconnect(session):
+        try:
+            session.cast.disconnect()
+        except Exception as e:
+            LOG.error(e)
+
+    def close(self):
+        with self.lock:
+            for each_session in self.sessions.values():
+                self.disconnect(each_session)
+            self.sessions = {}
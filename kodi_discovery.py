@@ -0,0 +1,103 @@
+import socket
+import time
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ElementTree
+
+from mycroft.util.log import LOG
+
+
+class KodiDiscovery(object):
+    """
+    Finds kodi instances on the local network with an SSDP search. Kodi answers as a UPnP
+    device when "allow remote control via UPnP" is on, its device description names it and,
+    when the web server is on, points presentationURL at the web (json-rpc) port.
+    """
+    ssdp_address = ("239.255.255.250", 1900)
+    search_targets = ("urn:schemas-upnp-org:device:MediaRenderer:1", "upnp:rootdevice")
+
+    def __init__(self, address=None, timeout=2.0, default_port=8080):
+        self.address = address or self.ssdp_address  # a unicast address reaches a single responder
+        self.timeout = timeout
+        self.default_port = default_port
+
+    # returns a list of {"name", "ip", "port", "location"}, one per kodi that answered
+    def search(self):
+        found = {}
+        for each_location in self.locations():
+            try:
+                kodi = self.describe(each_location)
+            except Exception as e:
+                LOG.info("Could not read the UPnP description at " + each_location + ": " + str(e))
+                continue
+            if kodi is not None and kodi["ip"] not in found:
+                found[kodi["ip"]] = kodi
+        LOG.info("Discovered kodi instances: " + str(list(found.values())))
+        return list(found.values())
+
+    # send an M-SEARCH for each search target and collect the distinct description urls
+    def locations(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        locations = []
+        try:
+            for each_target in self.search_targets:
+                sock.sendto(self.m_search(each_target).encode("ascii"), self.address)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, _ = sock.recvfrom(65507)
+                except socket.timeout:
+                    break
+                location = self.parse_headers(data.decode("utf-8", "replace")).get("location")
+                if location and location not in locations:
+                    locations.append(location)
+        finally:
+            sock.close()
+        return locations
+
+    def m_search(self, search_target):
+        return ("M-SEARCH * HTTP/1.1\r\n"
+                "HOST: " + self.ssdp_address[0] + ":" + str(self.ssdp_address[1]) + "\r\n"
+                "MAN: \"ssdp:discover\"\r\n"
+                "MX: " + str(max(1, int(self.timeout))) + "\r\n"
+                "ST: " + search_target + "\r\n"
+                "\r\n")
+
+    # the headers of an SSDP response, with lower case names
+    @staticmethod
+    def parse_headers(response):
+        headers = {}
+        for each_line in response.split("\r\n")[1:]:
+            name, separator, value = each_line.partition(":")
+            if separator:
+                headers[name.strip().lower()] = value.strip()
+        return headers
+
+    # read the UPnP device description, returns None when the device is not kodi
+    def describe(self, location):
+        with urllib.request.urlopen(location, timeout=self.timeout) as response:
+            root = ElementTree.fromstring(response.read())
+        device = {}
+        for each_element in root.iter():
+            tag = each_element.tag.rsplit("}", 1)[-1]  # drop the xml namespace
+            if tag not in device and each_element.text:
+                device[tag] = each_element.text.strip()
+        brand = (device.get("modelName", "") + " " + device.get("manufacturer", "")).lower()
+        if "kodi" not in brand and "xbmc" not in brand:
+            return None
+        ip = urllib.parse.urlsplit(location).hostname
+        port = self.default_port
+        presentation = urllib.parse.urlsplit(device.get("presentationURL", ""))
+        if presentation.port and presentation.hostname in (None, ip):
+            port = presentation.port
+        return {
+            "name": device.get("friendlyName", "Kodi"),
+            "ip": ip,
+            "port": port,
+            "location": location
+        }
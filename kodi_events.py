@@ -0,0 +1,203 @@
+import asyncio
+import codecs
+import json
+import threading
+
+from mycroft.util.log import LOG
+
+
+class KodiState(object):
+    """
+    The live player, playlist and volume state of kodi, kept current from its notifications
+    so intent handlers can read it without a round trip.
+    """
+    def __init__(self):
+        self.players = {}  # playerid -> {"type", "item", "speed"}
+        self.volume = None
+        self.muted = None
+        self.playlist_changes = 0
+
+    # true when kodi has an active player, playing or paused
+    @property
+    def active(self):
+        return bool(self.players)
+
+    # true when an active player is not paused
+    @property
+    def playing(self):
+        return any(each_player.get("speed") != 0 for each_player in self.players.values())
+
+    def reset(self):
+        self.players = {}
+        self.volume = None
+        self.muted = None
+
+    # apply a single kodi notification to the state, data of an unexpected shape is ignored
+    def apply(self, method, params):
+        data = params.get("data") if isinstance(params, dict) else None
+        data = data if isinstance(data, dict) else {}
+        player = data.get("player")
+        player = player if isinstance(player, dict) else {}
+        if method in ("Player.OnPlay", "Player.OnResume", "Player.OnAVStart", "Player.OnPause",
+                      "Player.OnSpeedChanged") and "playerid" in player:
+            state = self.players.setdefault(player["playerid"], {})
+            state["item"] = data.get("item", state.get("item"))
+            state["speed"] = 0 if method == "Player.OnPause" else player.get("speed", 1)
+        elif method == "Player.OnStop":
+            self.players = {}
+        elif method == "Application.OnVolumeChanged":
+            self.volume = data.get("volume", self.volume)
+            self.muted = data.get("muted", self.muted)
+        elif method.startswith("Playlist."):
+            self.playlist_changes += 1
+
+
+class KodiEventListener(object):
+    """
+    A background asyncio client for the kodi json-rpc notification socket (tcp port 9090).
+    It keeps a KodiState current and passes notifications to the registered listeners,
+    reconnecting with an exponential backoff whenever kodi goes away.
+    """
+    reconnect_delay = 1.0
+    max_reconnect_delay = 60.0
+
+    def __init__(self):
+        self.state = KodiState()
+        self.listeners = []  # (method prefix, callback(method, params))
+        self.connected = False
+        self.host = ""
+        self.port = 9090
+        self.loop = None
+        self.task = None
+        self.thread = None
+        self.writer = None
+
+    # call back(method, params) for every notification whose method starts with prefix
+    def add_listener(self, prefix, callback):
+        self.listeners.append((prefix, callback))
+
+    def start(self, host, port=9090):
+        self.stop()
+        self.host = host
+        self.port = int(port)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run_loop, name="KodiEventListener", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.cancel)
+        except RuntimeError:  # the loop has already closed, its thread is finished
+            pass
+        self.thread.join(5)
+        self.loop = None
+        self.task = None
+        self.thread = None
+
+    # runs on the event loop, where the task is guaranteed to exist
+    def cancel(self):
+        self.task.cancel()
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self.run())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            LOG.error("Kodi notification listener stopped: " + str(e))
+        finally:
+            self.connected = False
+            self.loop.close()
+
+    async def run(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                LOG.info("Connected to the kodi notification port " + self.host + ":" + str(self.port))
+                self.connected = True
+                delay = self.reconnect_delay
+                await self.listen(reader)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+                LOG.info("Kodi notification port unavailable: " + str(e))
+            except Exception as e:  # never let the listener die, reconnect as for a dropped socket
+                LOG.error("Kodi notification listener failed: " + str(e))
+            finally:
+                self.connected = False
+                self.state.reset()
+                if self.writer is not None:
+                    self.writer.close()
+                    self.writer = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def send(self, method, params=None, req_id=None):
+        payload = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            payload["params"] = params
+        if req_id is not None:
+            payload["id"] = req_id
+        self.writer.write(json.dumps(payload).encode("utf-8"))
+
+    # kodi streams json objects back to back with no delimiter, decode them as they complete
+    async def listen(self, reader):
+        self.send("Player.GetActivePlayers", req_id="state.players")
+        self.send("Application.GetProperties", {"properties": ["volume", "muted"]}, req_id="state.volume")
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        buffer = ""
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                raise ConnectionError("kodi closed the notification socket")
+            buffer += text_decoder.decode(chunk)
+            while True:
+                buffer = buffer.lstrip()
+                try:
+                    message, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    break  # wait for the rest of the object
+                buffer = buffer[end:]
+                try:
+                    self.dispatch(message)
+                except Exception as e:  # one malformed message must not drop the connection
+                    LOG.error("Kodi notification could not be applied: " + str(e))
+
+    def dispatch(self, message):
+        if not isinstance(message, dict):
+            return
+        if "method" in message:
+            method = message["method"]
+            params = message.get("params") or {}
+            self.state.apply(method, params)
+            for prefix, callback in self.listeners:
+                if method.startswith(prefix):
+                    self.loop.run_in_executor(None, self.notify, callback, method, params)
+        elif "result" in message:
+            self.apply_result(str(message.get("id")), message["result"])
+
+    @staticmethod
+    def notify(callback, method, params):
+        try:
+            callback(method, params)
+        except Exception as e:
+            LOG.error("Kodi notification listener failed for " + method + ": " + str(e))
+
+    # seed the state from the requests sent when the socket connects
+    def apply_result(self, req_id, result):
+        if req_id == "state.players":
+            for each_player in result:
+                self.state.players[each_player["playerid"]] = {"type": each_player.get("type"), "speed": None}
+                self.send("Player.GetProperties", {"playerid": each_player["playerid"], "properties": ["speed"]},
+                          req_id="state.speed." + str(each_player["playerid"]))
+        elif req_id.startswith("state.speed."):
+            player_state = self.state.players.get(int(req_id.rsplit(".", 1)[1]))
+            if player_state is not None:
+                player_state["speed"] = result.get("speed")
+        elif req_id == "state.volume":
+            self.state.volume = result.get("volume")
+            self.state.muted = result.get("muted")
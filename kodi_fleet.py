@@ -0,0 +1,176 @@
+import concurrent.futures
+import time
+import urllib.parse
+
+from mycroft.util.log import LOG
+
+from .kodi_rpc import KodiRpc
+
+# the fleet name of the skill's own kodi, every utterance says "kodi" so it is never matched as a room
+DEFAULT_NAME = "kodi"
+
+
+# parse the kodi_fleet setting, eg. "bedroom=192.168.0.33:8080, kitchen=192.168.0.34"
+# returns an ordered list of (name, ip, port), the port defaults to default_port
+def parse_targets(text, default_port=8080):
+    targets = []
+    for each_entry in str(text or "").split(","):
+        name, _, address = each_entry.partition("=")
+        name = " ".join(name.lower().split())
+        address = address.strip()
+        if not name or not address:
+            continue
+        ip, _, port = address.partition(":")
+        targets.append((name, ip.strip(), int(port) if port.strip().isdigit() else int(default_port)))
+    return targets
+
+
+# build the json-rpc path of a kodi instance, credentials are quoted so they can hold any character
+def build_kodi_path(ip, port, user="", password=""):
+    credentials = ""
+    if user or password:
+        credentials = urllib.parse.quote(user, safe="") + ":" + urllib.parse.quote(password, safe="") + "@"
+    return "http://" + credentials + ip + ":" + str(port) + "/jsonrpc"
+
+
+class KodiFleet(object):
+    """
+    The named kodi instances of the house. A command is fanned out to all or some of them at
+    once on a thread pool, so it finishes in the time of the slowest host rather than the sum
+    of them. Every host has its own transport and timeout, a dead box only fails its own result.
+    """
+    def __init__(self, timeout=2.0, connect_timeout=1.0, max_workers=8):
+        self.targets = {}  # name -> KodiRpc, in the order they were configured
+        self.owned = set()  # names of the transports created, and closed, by the fleet
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_workers = max_workers
+        self.executor = None
+
+    # targets is a list of (name, KodiRpc or kodi path), a shared KodiRpc is used as it is
+    def configure(self, targets, timeout=None):
+        self.close_targets()
+        if timeout is not None:
+            self.timeout = timeout
+        for name, target in targets:
+            if isinstance(target, KodiRpc):
+                self.targets[name] = target
+            else:
+                self.targets[name] = KodiRpc(target, timeout=self.timeout, connect_timeout=self.connect_timeout)
+                self.owned.add(name)
+        LOG.info("Kodi fleet: " + ", ".join(self.targets))
+
+    def names(self):
+        return list(self.targets)
+
+    # the names of the configured instances mentioned in the utterance, the default instance is only
+    # reached through "all" or by naming no room at all
+    def names_in(self, utterance):
+        utterance = " " + " ".join(str(utterance).lower().split()) + " "
+        return [each_name for each_name in self.targets
+                if each_name != DEFAULT_NAME and " " + each_name + " " in utterance]
+
+    # run action(rpc, timeout) on every selected instance at once, names None selects them all,
+    # round_trips is how many requests the action makes one after another on each instance
+    # returns a dict of name -> {"ok", "result" or "error", "seconds"}
+    def run(self, action, names=None, timeout=None, round_trips=1):
+        selected = [each_name for each_name in (self.targets if names is None else names) if each_name in self.targets]
+        if not selected:
+            return {}
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                  thread_name_prefix="KodiFleet")
+        host_timeout = (self.connect_timeout, timeout or self.timeout)
+        start_time = time.monotonic()
+        futures = {}
+        for each_name in selected:
+            futures[self.executor.submit(self.timed, action, self.targets[each_name], host_timeout)] = each_name
+        # the transports enforce the per host timeout on every request, this only guards against a stuck resolver
+        done, _ = concurrent.futures.wait(futures, timeout=round_trips * sum(host_timeout) + 1.0)
+        results = {}
+        for each_future, each_name in futures.items():
+            if each_future in done:
+                try:
+                    result, seconds = each_future.result()
+                    results[each_name] = {"ok": True, "result": result, "seconds": seconds}
+                except Exception as e:
+                    results[each_name] = {"ok": False, "error": str(e), "seconds": time.monotonic() - start_time}
+            else:
+                each_future.cancel()
+                results[each_name] = {"ok": False, "error": "timed out", "seconds": time.monotonic() - start_time}
+        LOG.info("Kodi fleet answered in " + str(round(time.monotonic() - start_time, 3)) + " seconds: " +
+                 str(dict((each_name, each_result["ok"]) for each_name, each_result in results.items())))
+        return results
+
+    @staticmethod
+    def timed(action, rpc, timeout):
+        start_time = time.monotonic()
+        result = action(rpc, timeout)
+        return result, time.monotonic() - start_time
+
+    # the result of a json-rpc response, raises when kodi answered with an error
+    @staticmethod
+    def checked(kodi_response):
+        if kodi_response is None:
+            raise Exception("no response from kodi")
+        if "error" in kodi_response:
+            raise Exception(str(kodi_response["error"]))
+        return kodi_response.get("result")
+
+    # send one json-rpc call to every selected instance
+    def call(self, method, params=None, names=None, timeout=None, record_failures=True):
+        return self.run(lambda rpc, host_timeout: self.checked(rpc.call(method, params, timeout=host_timeout,
+                                                                        record_failures=record_failures)),
+                        names, timeout)
+
+    # send method to every active player of one instance, one round trip for the lookup and one for the calls
+    def each_player(self, rpc, timeout, method, params=None):
+        active_players = self.checked(rpc.call("Player.GetActivePlayers", timeout=timeout))
+        batch = rpc.batch()
+        for each_player in active_players:
+            player_params = dict(params or {})
+            player_params["playerid"] = each_player["playerid"]
+            batch.add(method, player_params)
+        return [self.checked(each_response) for each_response in batch.send(timeout=timeout)]
+
+    def stop(self, names=None):
+        return self.run(lambda rpc, timeout: self.each_player(rpc, timeout, "Player.Stop"), names, round_trips=2)
+
+    def pause(self, names=None):
+        return self.run(lambda rpc, timeout: self.each_player(rpc, timeout, "Player.PlayPause", {"play": False}),
+                        names, round_trips=2)
+
+    def resume(self, names=None):
+        return self.run(lambda rpc, timeout: self.each_player(rpc, timeout, "Player.PlayPause", {"play": True}),
+                        names, round_trips=2)
+
+    def set_volume(self, level, names=None):
+        return self.call("Application.SetVolume", {"volume": level}, names)
+
+    def notify(self, title, message, names=None, timeout=None, display_time=5000):
+        params = {
+            "title": title,
+            "message": str(message),
+            "displaytime": display_time
+        }
+        # a notification is best effort, one that times out must not open the breaker of the host
+        return self.call("GUI.ShowNotification", params, names, timeout, record_failures=False)
+
+    # split a fan-out result into the names that succeeded and the names that failed
+    @staticmethod
+    def summarize(results):
+        succeeded = [each_name for each_name, each_result in results.items() if each_result["ok"]]
+        failed = [each_name for each_name, each_result in results.items() if not each_result["ok"]]
+        return succeeded, failed
+
+    def close_targets(self):
+        for each_name in self.owned:
+            self.targets[each_name].close()
+        self.targets = {}
+        self.owned = set()
+
+    def close(self):
+        self.close_targets()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
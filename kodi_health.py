@@ -0,0 +1,115 @@
+import threading
+import time
+
+from mycroft.util.log import LOG
+
+
+class KodiHealth(object):
+    """
+    Pings every watched kodi with JSONRPC.Ping in the background and keeps an up or down
+    state per host. A host is down after failure_threshold pings in a row go unanswered, with no
+    command answered in between, and is then checked again after an exponential backoff.
+    Meanwhile its transport is marked unavailable so commands fail at once instead of waiting
+    on a TCP timeout.
+    """
+    def __init__(self, interval=30.0, min_backoff=5.0, max_backoff=60.0, ping_timeout=1.0, failure_threshold=3,
+                 retry_interval=1.0):
+        self.interval = interval  # seconds between pings of a host that is up
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.ping_timeout = ping_timeout
+        self.failure_threshold = failure_threshold  # failed pings in a row before a host is down
+        self.retry_interval = retry_interval  # seconds before a host that missed a ping is pinged again
+        # name -> {"rpc", "url", "up", "failures", "next_check", "checked_at", "changed"}
+        self.hosts = {}
+        self.listeners = []  # callback(name, up) on every up / down transition
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = None
+
+    # watch the hosts of targets, a dict of name -> KodiRpc, hosts not in it are forgotten
+    # a transport pointed at a new url starts over, its backoff was that of the old host
+    def watch(self, targets):
+        with self.lock:
+            hosts = {}
+            for name, rpc in targets.items():
+                host = self.hosts.get(name)
+                if host is None or host["rpc"] is not rpc or host["url"] != rpc.url:
+                    host = {"rpc": rpc, "url": rpc.url, "up": None, "failures": 0, "next_check": 0.0,
+                            "checked_at": 0.0, "changed": None}
+                hosts[name] = host
+            self.hosts = hosts
+        self.wake.set()  # check the new hosts now
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def start(self):
+        if self.thread is None:
+            self.stopping = False
+            self.thread = threading.Thread(target=self.run, name="KodiHealth", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopping = True
+            self.wake.set()
+            self.thread.join(5)
+            self.thread = None
+
+    # True or False once the host has been checked, None before the first ping
+    def is_up(self, name):
+        host = self.hosts.get(name)
+        return None if host is None else host["up"]
+
+    # the names of the hosts known to be down
+    def down_hosts(self):
+        return [each_name for each_name, each_host in self.hosts.items() if each_host["up"] is False]
+
+    def run(self):
+        while not self.stopping:
+            self.wake.clear()
+            now = time.monotonic()
+            with self.lock:
+                due_hosts = [(each_name, each_host) for each_name, each_host in self.hosts.items()
+                             if each_host["next_check"] <= now]
+            for name, host in due_hosts:
+                if self.stopping:
+                    return
+                self.check(name, host)
+            with self.lock:
+                next_checks = [each_host["next_check"] for each_host in self.hosts.values()]
+            wait = min(next_checks) - time.monotonic() if next_checks else self.interval
+            self.wake.wait(max(wait, 0.1))
+
+    # ping one host, update its state and schedule its next check
+    def check(self, name, host):
+        checked_at = time.monotonic()
+        up = host["rpc"].ping(timeout=(self.ping_timeout, self.ping_timeout))
+        if up:
+            host["failures"] = 0
+            host["next_check"] = time.monotonic() + self.interval
+        else:
+            if host["rpc"].last_success > host["checked_at"]:  # kodi answered a command since the last ping
+                host["failures"] = 0
+            host["failures"] += 1
+            if host["failures"] < self.failure_threshold:  # a single missed ping, ask again soon
+                host["next_check"] = time.monotonic() + self.retry_interval
+            else:
+                backoff = min(self.min_backoff * 2 ** (host["failures"] - self.failure_threshold), self.max_backoff)
+                host["next_check"] = time.monotonic() + backoff
+        host["checked_at"] = checked_at
+        if not up and host["failures"] < self.failure_threshold:
+            up = host["up"]  # not down yet, the host keeps the state it had
+        host["rpc"].available = up is not False
+        if up != host["up"]:
+            host["up"] = up
+            host["changed"] = time.time()
+            LOG.info("Kodi " + name + " is " + ("up" if up else "down, next check in " +
+                                                 str(round(host["next_check"] - time.monotonic())) + " seconds"))
+            for each_listener in self.listeners:
+                try:
+                    each_listener(name, up)
+                except Exception as e:
+                    LOG.error(e)
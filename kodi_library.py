@@ -0,0 +1,402 @@
+import datetime
+import json
+import sqlite3
+import threading
+
+from mycroft.util.log import LOG
+
+from .kodi_search import FuzzyIndex, TitleIndex
+from .kodi_store import SongStore
+
+
+# describes how each kodi media type is fetched and stored in the local index
+MEDIA_TYPES = {
+    "movie": {
+        "table": "movies",
+        "id": "movieid",
+        "columns": ["movieid", "label", "dateadded"],
+        "search_fields": ["label"],
+        "properties": ["dateadded"],
+        "method": "VideoLibrary.GetMovies",
+        "result": "movies",
+        "details_method": "VideoLibrary.GetMovieDetails",
+        "details_result": "moviedetails"
+    },
+    "song": {
+        "table": "songs",
+        "id": "songid",
+        "columns": ["songid", "label", "artist", "album", "duration", "track", "dateadded"],
+        "search_fields": ["label", "artist", "album"],
+        "properties": ["artist", "duration", "album", "track", "dateadded"],
+        "method": "AudioLibrary.GetSongs",
+        "result": "songs",
+        "details_method": "AudioLibrary.GetSongDetails",
+        "details_result": "songdetails"
+    }
+}
+
+
+# maps the skill's search categories onto kodi's library filter fields
+FILTER_FIELDS = {
+    "movie": {"label": "title"},
+    "song": {"label": "title", "artist": "artist", "album": "album"}
+}
+
+
+class LibraryQuery(object):
+    """
+    A server side kodi library query. The filter rules, sort, paging limits and the properties
+    projection are all sent to kodi, so only the matching rows and only the needed fields come back.
+    """
+    def __init__(self, media_type, properties=None, page_size=500):
+        self.media_type = media_type
+        self.spec = MEDIA_TYPES[media_type]
+        self.properties = self.spec["properties"] if properties is None else properties
+        self.page_size = page_size
+        self.rules = []
+        self.sort = None
+
+    # add a rule every returned item must match, eg. where("dateadded", "after", "2020-05-14")
+    def where(self, field, operator, value):
+        self.rules.append({"field": field, "operator": operator, "value": value})
+        return self
+
+    # every search word must be in the category, with several categories any one of them may match
+    def contains_words(self, categories, search_words):
+        groups = []
+        for each_category in categories:
+            field = FILTER_FIELDS[self.media_type][each_category]
+            group = [{"field": field, "operator": "contains", "value": each_word} for each_word in search_words]
+            if group:
+                groups.append(group[0] if len(group) == 1 else {"and": group})
+        if len(groups) == 1:
+            self.rules.append(groups[0])
+        elif groups:
+            self.rules.append({"or": groups})
+        return self
+
+    def order_by(self, method, order="ascending"):
+        self.sort = {"method": method, "order": order}
+        return self
+
+    def params(self, start=0, end=None):
+        params = {
+            "properties": self.properties,
+            "limits": {"start": start, "end": start + self.page_size if end is None else end}
+        }
+        if len(self.rules) == 1:
+            params["filter"] = self.rules[0]
+        elif self.rules:
+            params["filter"] = {"and": self.rules}
+        if self.sort:
+            params["sort"] = self.sort
+        return params
+
+    # yields the matching items one at a time, each page is stream decoded as kodi sends it
+    def items(self, rpc, limit=None):
+        start = 0
+        while limit is None or start < limit:
+            end = start + self.page_size if limit is None else min(start + self.page_size, limit)
+            stream = rpc.stream(self.spec["method"], self.params(start, end), self.spec["result"])
+            count = 0
+            for each_item in stream:
+                count += 1
+                yield each_item
+            if "result" not in stream.envelope:
+                raise Exception("Kodi library query failed: " + str(stream.envelope.get("error")))
+            start += count
+            if not count or start >= stream.envelope["result"]["limits"]["total"]:
+                return
+
+    # yields the matching items in lists of up to size items
+    def pages(self, rpc, limit=None, size=500):
+        page = []
+        for each_item in self.items(rpc, limit):
+            page.append(each_item)
+            if len(page) >= size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def fetch(self, rpc, limit=None):
+        return list(self.items(rpc, limit))
+
+    # the number of matching items, without transferring any of them
+    def count(self, rpc):
+        params = self.params(0, 1)
+        params["properties"] = []
+        return rpc.call(self.spec["method"], params)["result"]["limits"]["total"]
+
+
+class KodiLibrary(object):
+    """
+    A persistent local copy of the kodi movie and music libraries.
+    The index is stored in sqlite and kept current with incremental, paged syncs
+    on dateadded plus the library OnUpdate / OnRemove notifications, so searches
+    never have to download the library from kodi.
+    """
+    page_size = 5000  # items per kodi request, responses are stream decoded so this does not raise memory use
+    store_size = 500  # items per sqlite write
+
+    def __init__(self, rpc, db_path):
+        self.rpc = rpc
+        self.lock = threading.RLock()  # guards the database and caches, never held over a kodi request
+        self.sync_lock = threading.Lock()  # one sync at a time
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.item_cache = {}
+        self.index_cache = {}
+        self.stale = set()  # media types whose cached items and indexes are being rebuilt
+        self.rebuilding = False
+        self.create_tables()
+        self.synced = set(each_type for each_type in MEDIA_TYPES if self.get_meta(each_type + ".synced"))
+
+    def create_tables(self):
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS movies (movieid INTEGER PRIMARY KEY, label TEXT, "
+                            "dateadded TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS songs (songid INTEGER PRIMARY KEY, label TEXT, "
+                            "artist TEXT, album TEXT, duration INTEGER, track INTEGER, dateadded TEXT)")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def get_meta(self, key, default=""):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # the index belongs to a single kodi instance, start over when the host changes
+    def set_host(self, kodi_url):
+        if self.get_meta("host") == kodi_url:
+            return
+        LOG.info("Kodi host changed, clearing the local library index")
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM movies")
+            self.db.execute("DELETE FROM songs")
+            self.db.execute("DELETE FROM meta")
+            self.db.execute("INSERT INTO meta (key, value) VALUES ('host', ?)", (kodi_url,))
+            self.item_cache = {}
+            self.index_cache = {}
+            self.synced = set()
+            self.stale = set()
+
+    # returns every movie in the index as {"label", "movieid"} dicts
+    def movies(self):
+        return self.items("movie")
+
+    # returns every song in the index as a SongStore, which reads as {"label", "songid", "artist", "album",
+    # "duration", "track"} dicts
+    def songs(self):
+        return self.items("song")
+
+    # true once the index holds a full copy of media_type, read without the lock so a running sync never blocks it
+    def is_synced(self, media_type):
+        return media_type in self.synced
+
+    # the indexed items of media_type, only what has been synced so far, this never starts a sync
+    # after a library change the previous items are returned until the background rebuild replaces them
+    def items(self, media_type):
+        with self.lock:
+            if media_type not in self.item_cache:
+                self.item_cache[media_type] = self.load_items(media_type)
+            return self.item_cache[media_type]
+
+    def load_items(self, media_type):
+        spec = MEDIA_TYPES[media_type]
+        with self.lock:
+            if media_type == "song":  # songs are held in a compact columnar store
+                cursor = self.db.execute("SELECT " + ", ".join(SongStore.fields) + " FROM " + spec["table"] +
+                                         " ORDER BY " + spec["id"])
+                return SongStore(cursor)
+            cursor = self.db.execute("SELECT " + ", ".join(spec["columns"]) + " FROM " + spec["table"] +
+                                     " ORDER BY " + spec["id"])
+            return [self.row_to_item(media_type, row) for row in cursor]
+
+    # returns the named search index of media_type, built on its first use
+    def index(self, media_type, index_name):
+        with self.lock:
+            items = self.items(media_type)
+            indexes = self.index_cache.setdefault(media_type, {})
+            if index_name not in indexes:
+                indexes[index_name] = self.build_index(media_type, index_name, items)
+            return indexes[index_name]
+
+    @staticmethod
+    def build_index(media_type, index_name, items):
+        if index_name == "fuzzy":
+            return FuzzyIndex(items)
+        return TitleIndex(items, MEDIA_TYPES[media_type]["search_fields"])
+
+    # the cached items and indexes of media_type no longer match the database, rebuild them in the
+    # background so no search waits on it, searches read the previous ones meanwhile
+    def invalidate(self, media_type):
+        with self.lock:
+            if media_type not in self.item_cache:
+                self.index_cache.pop(media_type, None)
+                return  # nothing was built yet, the first use builds it
+            self.stale.add(media_type)
+            if not self.rebuilding:
+                self.rebuilding = True
+                threading.Thread(target=self.rebuild, name="KodiLibraryRebuild", daemon=True).start()
+
+    # rebuild the items and the indexes in use of every stale media type, until none is stale
+    def rebuild(self):
+        while True:
+            with self.lock:
+                if not self.stale:
+                    self.rebuilding = False
+                    return
+                media_type = self.stale.pop()
+                index_names = list(self.index_cache.get(media_type, {}))
+            try:
+                items = self.load_items(media_type)
+                # the indexes are built without the lock, searches go on with the previous ones
+                indexes = dict((each_name, self.build_index(media_type, each_name, items))
+                               for each_name in index_names)
+            except Exception as e:
+                LOG.error("Library index rebuild failed for " + media_type + ": " + str(e))
+                with self.lock:
+                    self.item_cache.pop(media_type, None)  # the next use builds them
+                    self.index_cache.pop(media_type, None)
+                continue
+            with self.lock:
+                if media_type in self.item_cache:  # else the index was cleared meanwhile, eg. by set_host
+                    self.item_cache[media_type] = items
+                    self.index_cache[media_type] = indexes
+
+    # returns the items of media_type where every search word is found in the field
+    def search(self, media_type, search_words, field="label", limit=None):
+        return self.index(media_type, "title").search(search_words, field, limit)
+
+    # returns a dict of field -> the items of media_type where every search word is found in that field
+    def search_fields(self, media_type, search_words, fields, limit=None):
+        return self.index(media_type, "title").search_fields(search_words, fields, limit)
+
+    # returns up to limit (score, item) tuples ranked by how closely their label matches the query
+    def fuzzy_search(self, media_type, query, limit=5, min_score=0.0):
+        return self.index(media_type, "fuzzy").search(query, limit, min_score)
+
+    def row_to_item(self, media_type, row):
+        item = dict(zip(MEDIA_TYPES[media_type]["columns"], row))
+        del item["dateadded"]
+        return item
+
+    def store_items(self, media_type, items):
+        spec = MEDIA_TYPES[media_type]
+        rows = []
+        for each_item in items:
+            row = []
+            for each_column in spec["columns"]:
+                value = each_item.get(each_column, "")
+                if each_column == "artist":
+                    value = json.dumps(value or [])
+                row.append(value)
+            rows.append(tuple(row))
+        with self.lock:
+            stored = self.stored_rows(media_type, [each_row[0] for each_row in rows])
+            rows = [each_row for each_row in rows if stored.get(each_row[0]) != each_row]
+            if not rows:
+                return  # eg. an OnUpdate for a playcount or resume point, nothing the index holds changed
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO " + spec["table"] + " (" + ", ".join(spec["columns"]) +
+                                    ") VALUES (" + ", ".join("?" * len(spec["columns"])) + ")", rows)
+            self.invalidate(media_type)
+
+    # the stored rows of item_ids by id, called with the lock held
+    def stored_rows(self, media_type, item_ids):
+        spec = MEDIA_TYPES[media_type]
+        stored = {}
+        for each_start in range(0, len(item_ids), self.store_size):
+            chunk = item_ids[each_start:each_start + self.store_size]
+            for each_row in self.db.execute("SELECT " + ", ".join(spec["columns"]) + " FROM " + spec["table"] +
+                                            " WHERE " + spec["id"] + " IN (" + ", ".join("?" * len(chunk)) + ")",
+                                            chunk):
+                stored[each_row[0]] = each_row
+        return stored
+
+    def remove_items(self, media_type, item_ids):
+        spec = MEDIA_TYPES[media_type]
+        with self.lock:
+            with self.db:
+                removed = self.db.executemany("DELETE FROM " + spec["table"] + " WHERE " + spec["id"] + " = ?",
+                                              [(each_id,) for each_id in item_ids]).rowcount
+            if removed:
+                self.invalidate(media_type)
+
+    def sync(self):
+        for each_type in MEDIA_TYPES:
+            try:
+                self.sync_type(each_type)
+            except Exception as e:
+                LOG.error("Library sync failed for " + each_type + ": " + str(e))
+
+    # fetch everything added since the last sync, a page at a time
+    # pages are fetched without the lock, searches keep reading the index while kodi answers
+    def sync_type(self, media_type):
+        with self.sync_lock:
+            watermark = self.get_meta(media_type + ".dateadded")
+            query = LibraryQuery(media_type, page_size=self.page_size).order_by("dateadded")
+            if watermark:
+                # kodi compares dates by day, so re-read the last day and let the upsert drop the duplicates
+                since = datetime.datetime.strptime(watermark[:10], "%Y-%m-%d") - datetime.timedelta(days=1)
+                query.where("dateadded", "after", since.strftime("%Y-%m-%d"))
+            fetched = 0
+            for each_page in query.pages(self.rpc, size=self.store_size):
+                self.store_items(media_type, each_page)
+                watermark = max(watermark, max(each_item.get("dateadded", "") for each_item in each_page))
+                fetched += len(each_page)
+            LOG.info("Library sync fetched " + str(fetched) + " new " + media_type + " items")
+            self.set_meta(media_type + ".dateadded", watermark)
+            self.set_meta(media_type + ".synced", "1")
+            self.synced.add(media_type)
+            self.reconcile(media_type)
+
+    # drop items that were removed from kodi while we were not listening for notifications
+    def reconcile(self, media_type):
+        spec = MEDIA_TYPES[media_type]
+        query = LibraryQuery(media_type, properties=[], page_size=5000)
+        kodi_count = query.count(self.rpc)
+        with self.lock:
+            local_count = self.db.execute("SELECT COUNT(*) FROM " + spec["table"]).fetchone()[0]
+        if local_count == kodi_count:
+            return
+        LOG.info("Library index out of step with kodi, reconciling " + media_type + " ids")
+        kodi_ids = set(each_item[spec["id"]] for each_item in query.fetch(self.rpc))
+        with self.lock:
+            local_ids = set(row[0] for row in self.db.execute("SELECT " + spec["id"] + " FROM " + spec["table"]))
+        self.remove_items(media_type, local_ids - kodi_ids)
+        if kodi_ids - local_ids:
+            self.update_items(media_type, kodi_ids - local_ids)
+
+    # refresh individual items from kodi, used for OnUpdate notifications
+    def update_items(self, media_type, item_ids):
+        spec = MEDIA_TYPES[media_type]
+        batch = self.rpc.batch()
+        for each_id in item_ids:
+            batch.add(spec["details_method"], {spec["id"]: each_id, "properties": spec["properties"]})
+        items = []
+        for each_response in batch.send():
+            if each_response and "result" in each_response:
+                items.append(each_response["result"][spec["details_result"]])
+        self.store_items(media_type, items)
+
+    # apply a VideoLibrary / AudioLibrary notification received from kodi
+    def handle_notification(self, method, params):
+        data = params.get("data") or {}
+        item = data.get("item", data)  # kodi v8 sends the item fields at the top level
+        media_type = item.get("type")
+        if media_type not in MEDIA_TYPES or "id" not in item:
+            if method.endswith(".OnScanFinished") or method.endswith(".OnCleanFinished"):
+                self.sync()
+            return
+        if method.endswith(".OnRemove"):
+            self.remove_items(media_type, [item["id"]])
+        elif method.endswith(".OnUpdate"):
+            self.update_items(media_type, [item["id"]])
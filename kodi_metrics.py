@@ -0,0 +1,124 @@
+import bisect
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Metrics(object):
+    """
+    A small in-process registry of counters and latency histograms, labelled like prometheus
+    metrics. Kodi calls and intent handlers record into it through timer() and timed(), and
+    the totals are read back as prometheus text or written to a json file.
+    """
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> {"counts": [per bucket and +Inf], "sum", "count"}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def increment(self, name, labels=None, amount=1):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self.histograms[key] = histogram
+            histogram["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    # time the block into the name histogram, an exception leaving it is counted in name_errors_total
+    @contextlib.contextmanager
+    def timer(self, name, labels=None):
+        start_time = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            error_labels = dict(labels or {})
+            error_labels["error"] = type(e).__name__
+            self.increment(name.rsplit("_seconds", 1)[0] + "_errors_total", error_labels)
+            raise
+        finally:
+            self.observe(name, time.monotonic() - start_time, labels)
+
+    # decorator timing every call of a method, labelled with the method name
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, {"handler": func.__name__}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(each_name + '="' + str(each_value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+                              for each_name, each_value in labels) + "}"
+
+    # the prometheus text exposition format of every metric
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(value, counts=list(value["counts"])))
+                                for key, value in self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append("# TYPE " + name + " counter")
+                typed.add(name)
+            lines.append(name + self.format_labels(labels) + " " + str(value))
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append("# TYPE " + name + " histogram")
+                typed.add(name)
+            cumulative = 0
+            for each_bound, each_count in zip(self.buckets + ("+Inf",), histogram["counts"]):
+                cumulative += each_count
+                lines.append(name + "_bucket" + self.format_labels(labels + (("le", str(each_bound)),)) + " " +
+                             str(cumulative))
+            lines.append(name + "_sum" + self.format_labels(labels) + " " + repr(histogram["sum"]))
+            lines.append(name + "_count" + self.format_labels(labels) + " " + str(histogram["count"]))
+        return "\n".join(lines) + "\n"
+
+    # every metric as a json friendly dict
+    def snapshot(self):
+        with self.lock:
+            return {
+                "time": time.time(),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [{"name": name, "labels": dict(labels), "buckets": list(self.buckets),
+                                "counts": list(histogram["counts"]), "sum": histogram["sum"],
+                                "count": histogram["count"]}
+                               for (name, labels), histogram in sorted(self.histograms.items())]
+            }
+
+    # write the json snapshot and the prometheus text next to each other, replacing the old files
+    def dump(self, json_path, prometheus_path=None):
+        for each_path, each_text in ((json_path, json.dumps(self.snapshot(), indent=1)),
+                                     (prometheus_path, self.prometheus_text())):
+            if each_path:
+                with open(each_path + ".tmp", "w") as metrics_file:
+                    metrics_file.write(each_text)
+                os.replace(each_path + ".tmp", each_path)
+
+
+# the registry shared by the skill and its kodi transports
+metrics = Metrics()
@@ -0,0 +1,70 @@
+import queue
+import threading
+import time
+
+from mycroft.util.log import LOG
+
+
+class KodiNotifier(object):
+    """
+    Mirrors mycroft events to the kodi notification popup without blocking the message bus.
+    Messages go into a bounded queue that a worker thread drains. A burst of messages inside
+    the coalesce window is reduced to the latest one, and messages are dropped, not waited on,
+    when the queue is full.
+    """
+    stop_message = object()
+
+    def __init__(self, send, max_pending=8, coalesce_window=0.3):
+        self.send = send  # callable(message) that pushes one message to kodi
+        self.coalesce_window = coalesce_window
+        self.queue = queue.Queue(max_pending)
+        self.counters = {"queued": 0, "sent": 0, "coalesced": 0, "dropped": 0, "failed": 0}
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="KodiNotifier", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(self.stop_message)
+            self.thread.join(5)
+            self.thread = None
+
+    # queue a message for kodi, never blocks
+    def post(self, message):
+        try:
+            self.queue.put_nowait(message)
+            self.counters["queued"] += 1
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    def run(self):
+        while True:
+            message = self.queue.get()
+            if message is self.stop_message:
+                return
+            stopping = False
+            deadline = time.monotonic() + self.coalesce_window
+            while True:  # anything newer inside the window replaces the message
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    newer_message = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if newer_message is self.stop_message:
+                    stopping = True
+                    break
+                self.counters["coalesced"] += 1
+                message = newer_message
+            try:
+                self.send(message)
+                self.counters["sent"] += 1
+            except Exception as e:
+                self.counters["failed"] += 1
+                LOG.error("Kodi notification failed: " + str(e))
+            if stopping:
+                return
@@ -0,0 +1,160 @@
+import collections
+import os
+import re
+
+# what was asked for in an utterance
+# media_type: "movie", "music" or "youtube", field: the library field searched ("label", "artist",
+# "album" or "any"), query: the spoken title or name ("" when none was found), modifiers: a
+# frozenset of "random", "cinemavision", "cast" (play it on the chromecast), "audio" (play
+# only the sound of a youtube video) and "some" (more than one item was asked for)
+ParseResult = collections.namedtuple("ParseResult", ["media_type", "field", "query", "modifiers"])
+
+NON_WORD = re.compile(r"\W+")
+SPACES = re.compile(r"\s+")
+NUMBER = re.compile(r"\d+")
+
+# the words naming a music library field, and the field they name
+MUSIC_FIELDS = {"album": "album", "artist": "artist", "song": "label"}
+
+# how speech to text writes the name of a letter or digit, and the letter or digit it names
+LETTER_NAMES = {
+    "ay": "a", "eh": "a", "bee": "b", "be": "b", "see": "c", "sea": "c", "cee": "c", "dee": "d", "ef": "f",
+    "eff": "f", "gee": "g", "jee": "g", "aitch": "h", "haitch": "h", "eye": "i", "aye": "i", "jay": "j",
+    "kay": "k", "el": "l", "ell": "l", "em": "m", "en": "n", "oh": "o", "pee": "p", "pea": "p", "queue": "q",
+    "cue": "q", "are": "r", "ar": "r", "ess": "s", "es": "s", "tee": "t", "tea": "t", "you": "u", "vee": "v",
+    "double you": "w", "double u": "w", "ex": "x", "why": "y", "wye": "y", "zed": "z", "zee": "z",
+    "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+    "eight": "8", "nine": "9"
+}
+LETTER_NAMES.update((each_letter, each_letter) for each_letter in "abcdefghijklmnopqrstuvwxyz0123456789")
+
+# the vocab files the grammar is built from
+GRAMMAR_VOCABS = ("PlayKeyword", "FilmKeyword", "CinemaVisionKeyword", "RandomKeyword", "FromYoutubeKeyword",
+                  "CastKeyword", "AudioKeyword")
+
+
+# the phrases of one vocab file, lower case, without blank lines and comments
+def load_vocab(vocab_dir, name):
+    with open(os.path.join(vocab_dir, name + ".voc")) as vocab_file:
+        return [" ".join(each_line.lower().split()) for each_line in vocab_file
+                if each_line.strip() and not each_line.startswith("#")]
+
+
+# a regex alternation of the phrases, longest first so "movies" wins over "movie"
+def phrases_pattern(phrases):
+    return "(?:" + "|".join(re.escape(each_phrase).replace(r"\ ", r"\s+")
+                            for each_phrase in sorted(phrases, key=len, reverse=True)) + ")"
+
+
+LETTER = re.compile(r"\bletter\s+(" + phrases_pattern(LETTER_NAMES) + r")\b")
+
+
+# the first number in the utterance, eg. the level in "set kodi volume to 25", None without one
+def parse_volume(utterance):
+    number = NUMBER.search(str(utterance))
+    return int(number.group()) if number else None
+
+
+# the letter or digit after "letter", eg. "m" in "jump to letter m" or "jump to letter em", None without one
+def parse_letter(utterance):
+    letter = LETTER.search(str(utterance).lower())
+    return LETTER_NAMES[" ".join(letter.group(1).split())] if letter else None
+
+
+class UtteranceParser(object):
+    """
+    Turns a spoken request into a ParseResult. The grammar (play, film, cinemavision, random
+    and youtube phrases) is read from the skill's vocab files once and compiled into the
+    patterns here, so parsing an utterance is a few regex searches.
+    """
+    def __init__(self, vocab_dir):
+        grammar = dict((each_name, load_vocab(vocab_dir, each_name)) for each_name in GRAMMAR_VOCABS)
+        play = phrases_pattern(grammar["PlayKeyword"])
+        film = phrases_pattern(grammar["FilmKeyword"])
+        cinemavision = phrases_pattern(grammar["CinemaVisionKeyword"])
+        from_youtube = phrases_pattern(grammar["FromYoutubeKeyword"])
+        cast = phrases_pattern(grammar["CastKeyword"])
+        audio = phrases_pattern(grammar["AudioKeyword"])
+        self.film_pattern = re.compile(r"\b" + film + r"\s+(?P<query>.*)$")
+        self.cinemavision_pattern = re.compile(r"\b" + cinemavision + r"\b")
+        self.cinemavision_suffix = re.compile(r"(?:\s+(?:with|using))?\s+" + cinemavision + r"\s*$")
+        self.cast_pattern = re.compile(r"\b" + cast + r"\b")
+        self.cast_suffix = re.compile(r"(?:\s+(?:on|to|with|using))?(?:\s+(?:the|my))?\s+" + cast + r"\s*$")
+        self.audio_pattern = re.compile(r"\b" + audio + r"\b")
+        self.audio_prefix = re.compile(r"^" + audio + r"(?:\s+of)?\s+")
+        self.audio_suffix = re.compile(r"\s+(?:just\s+)?(?:the\s+)?" + audio + r"$")
+        self.random_pattern = re.compile(r"\b" + phrases_pattern(grammar["RandomKeyword"]) + r"\b")
+        self.youtube_pattern = re.compile(r"\b" + from_youtube + r"\b")
+        self.youtube_query_pattern = re.compile(r"\b" + play + r"\s+(?P<some>some\s+|the\s+)?(?P<query>.*?)\s*" +
+                                                from_youtube)
+        self.field_pattern = re.compile(r"\b(?P<field>" + "|".join(MUSIC_FIELDS) + r")\s+(?P<query>.*)$")
+        self.some_pattern = re.compile(r"\bsome\s+(?P<query>.*)$")
+        self.play_pattern = re.compile(r"\b" + play + r"\s+(?P<query>.*)$")
+
+    @staticmethod
+    def clean(utterance):
+        return SPACES.sub(" ", str(utterance or "")).strip().lower()
+
+    def modifiers(self, utterance):
+        modifiers = set()
+        if self.random_pattern.search(utterance):
+            modifiers.add("random")
+        if self.cinemavision_pattern.search(utterance):
+            modifiers.add("cinemavision")
+        if self.cast_pattern.search(utterance):
+            modifiers.add("cast")
+        if self.audio_pattern.search(utterance):
+            modifiers.add("audio")
+        return modifiers
+
+    # classify the utterance as a youtube, movie or music request and parse it as one
+    def parse(self, utterance):
+        utterance = self.clean(utterance)
+        if self.youtube_pattern.search(utterance):
+            return self.parse_youtube(utterance)
+        if self.film_pattern.search(utterance) or "random" in self.modifiers(utterance):
+            return self.parse_movie(utterance)
+        return self.parse_music(utterance)
+
+    # eg. "ask kodi to play the movie planet of the apes with cinemavision"
+    # or "ask kodi to play the movie iron man on the chromecast"
+    def parse_movie(self, utterance):
+        utterance = self.clean(utterance)
+        modifiers = self.modifiers(utterance)
+        query = ""
+        film_match = self.film_pattern.search(utterance)
+        if film_match:
+            query = self.cast_suffix.sub("", film_match.group("query"))
+            query = self.cinemavision_suffix.sub("", query)
+            query = SPACES.sub(" ", NON_WORD.sub(" ", query)).strip()
+        return ParseResult("movie", "label", query, frozenset(modifiers))
+
+    # eg. "ask kodi to play the artist elvis presley" or "ask kodi to play all shook up"
+    def parse_music(self, utterance):
+        utterance = self.clean(utterance)
+        modifiers = self.modifiers(utterance)
+        field_match = self.field_pattern.search(utterance)
+        if field_match:
+            return ParseResult("music", MUSIC_FIELDS[field_match.group("field")],
+                               field_match.group("query").strip(), frozenset(modifiers))
+        any_match = self.some_pattern.search(utterance)
+        if any_match:
+            modifiers.add("some")
+        else:
+            any_match = self.play_pattern.search(utterance)
+        query = any_match.group("query").strip() if any_match else ""
+        return ParseResult("music", "any", query, frozenset(modifiers))
+
+    # eg. "ask kodi to play some queen from youtube" or "ask kodi to play the audio of queen from youtube"
+    def parse_youtube(self, utterance):
+        utterance = self.clean(utterance)
+        modifiers = self.modifiers(utterance)
+        youtube_match = self.youtube_query_pattern.search(utterance)
+        query = ""
+        if youtube_match:
+            query = youtube_match.group("query").strip()
+            if "audio" in modifiers:
+                query = self.audio_suffix.sub("", self.audio_prefix.sub("", query))
+            if (youtube_match.group("some") or "").startswith("some"):
+                modifiers.add("some")
+        return ParseResult("youtube", "any", query, frozenset(modifiers))
@@ -0,0 +1,287 @@
+import base64
+import collections
+import http.client
+import http.server
+import mimetypes
+import os
+import queue
+import re
+import secrets
+import socket
+import threading
+import time
+import urllib.parse
+
+from mycroft.util.log import LOG
+
+from .kodi_metrics import metrics
+
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# headers of kodi's answer passed on to the cast device
+RELAYED_HEADERS = ("Content-Type", "Content-Length", "Content-Range", "Accept-Ranges", "Last-Modified", "ETag")
+
+
+# the (first, last) byte of a single "bytes=" range header within a file of size bytes
+# returns None without a range header, and raises ValueError for a range the file cannot satisfy
+def parse_range(range_header, size):
+    if not range_header:
+        return None
+    byte_range = BYTE_RANGE.match(range_header.strip())
+    if not byte_range or not (byte_range.group(1) or byte_range.group(2)):
+        raise ValueError("unsupported range " + range_header)
+    if not byte_range.group(1):  # the last n bytes
+        first = max(0, size - int(byte_range.group(2)))
+        last = size - 1
+    else:
+        first = int(byte_range.group(1))
+        last = min(int(byte_range.group(2)), size - 1) if byte_range.group(2) else size - 1
+    if first >= size or first > last:
+        raise ValueError("range " + range_header + " is outside " + str(size) + " bytes")
+    return first, last
+
+
+# the address this host reaches the device from, the one the device can connect back to
+def lan_address(device_ip):
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect((device_ip, 8009))  # udp, nothing is sent
+        return probe.getsockname()[0]
+    except Exception as e:
+        LOG.error(e)
+        return "127.0.0.1"
+    finally:
+        probe.close()
+
+
+class UpstreamPool(object):
+    """
+    Keep-alive connections to kodi's web server. A connection whose response was read to the
+    end is put back for the next request, one left half read, by a seek, is closed.
+    """
+    def __init__(self, timeout=10.0, max_idle=4):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle = {}  # (scheme, netloc) -> queue of idle connections
+
+    def get(self, scheme, netloc):
+        try:
+            connection = self.idle.setdefault((scheme, netloc), queue.LifoQueue()).get_nowait()
+            metrics.increment("kodi_proxy_upstream_connections_total", {"result": "reused"})
+            return connection, True
+        except queue.Empty:
+            return self.connect(scheme, netloc), False
+
+    def connect(self, scheme, netloc):
+        metrics.increment("kodi_proxy_upstream_connections_total", {"result": "new"})
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def put(self, scheme, netloc, connection):
+        idle = self.idle.setdefault((scheme, netloc), queue.LifoQueue())
+        if idle.qsize() < self.max_idle:
+            idle.put(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        for each_idle in self.idle.values():
+            while not each_idle.empty():
+                each_idle.get_nowait().close()
+        self.idle = {}
+
+
+class KodiStreamProxy(object):
+    """
+    A local http server streaming kodi library files to a cast device, which can neither send
+    kodi's credentials nor reach a file kodi only knows the path of. Every request is answered
+    for the byte range asked for, so seeking on the device only fetches from the new position.
+    A file this host can read directly is sent with sendfile, anything else is relayed in
+    chunks from kodi's /vfs/ url over kept-alive connections.
+    The server only listens on the address the device reaches this host from, and a stream is
+    only served under a random token, which is forgotten once the stream has not been asked
+    for in stream_ttl seconds or max_streams newer ones were added.
+    """
+    def __init__(self, port=0, chunk_size=262144, timeout=10.0, stream_ttl=21600, max_streams=16):
+        self.port = port
+        self.chunk_size = chunk_size
+        self.stream_ttl = stream_ttl
+        self.max_streams = max_streams
+        self.upstream = UpstreamPool(timeout)
+        self.streams = collections.OrderedDict()  # token -> {"url", "authorization", "local_path", "expires_at"}
+        self.streams_lock = threading.Lock()
+        self.server = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    # listen on address, a server listening on another one is stopped first
+    def start(self, address="127.0.0.1"):
+        with self.lock:
+            if self.server is not None:
+                if self.server.server_address[0] == address:
+                    return
+                LOG.info("Kodi stream proxy moving to " + address)
+                self.server.shutdown()
+                self.server.server_close()
+                self.server = None
+            proxy = self
+
+            class Handler(http.server.BaseHTTPRequestHandler):
+                protocol_version = "HTTP/1.1"
+                disable_nagle_algorithm = True
+
+                def do_GET(self):
+                    proxy.handle(self, send_body=True)
+
+                def do_HEAD(self):
+                    proxy.handle(self, send_body=False)
+
+                def log_message(self, *args):
+                    pass
+
+            self.server = http.server.ThreadingHTTPServer((address, self.port), Handler)
+            self.server.daemon_threads = True
+            self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+            self.thread.start()
+            LOG.info("Kodi stream proxy listening on " + address + ":" + str(self.server.server_port))
+
+    def stop(self):
+        with self.lock:
+            if self.server is not None:
+                self.server.shutdown()
+                self.server.server_close()
+                self.server = None
+        self.upstream.close()
+
+    # serve upstream_url, a kodi /vfs/ url, and return the url the device at device_ip can play it from
+    # auth is kodi's (user, password), local_path the same file when this host can read it
+    def add(self, upstream_url, auth=None, local_path=None, device_ip="127.0.0.1"):
+        address = lan_address(device_ip)
+        self.start(address)
+        token = secrets.token_urlsafe(16)
+        authorization = None
+        if auth:
+            authorization = "Basic " + base64.b64encode((auth[0] + ":" + auth[1]).encode("utf-8")).decode("ascii")
+        if local_path and not os.path.isfile(local_path):
+            local_path = None
+        with self.streams_lock:
+            self.expire_streams()
+            self.streams[token] = {"url": upstream_url, "authorization": authorization, "local_path": local_path,
+                                   "expires_at": time.monotonic() + self.stream_ttl}
+            while len(self.streams) > self.max_streams:
+                self.streams.popitem(last=False)
+        file_name = urllib.parse.quote(os.path.basename(urllib.parse.unquote(upstream_url)), safe="")
+        return "http://" + address + ":" + str(self.server.server_port) + "/stream/" + token + "/" + file_name
+
+    # forget the streams nobody asked for in stream_ttl seconds, called with streams_lock held
+    def expire_streams(self):
+        now = time.monotonic()
+        for each_token in [each_token for each_token, each_stream in self.streams.items()
+                           if each_stream["expires_at"] <= now]:
+            del self.streams[each_token]
+
+    # the stream of a token, kept for another stream_ttl seconds, None for an unknown or expired token
+    def stream(self, token):
+        with self.streams_lock:
+            self.expire_streams()
+            stream = self.streams.get(token)
+            if stream is not None:
+                stream["expires_at"] = time.monotonic() + self.stream_ttl
+                self.streams.move_to_end(token)
+            return stream
+
+    def handle(self, handler, send_body):
+        parts = handler.path.split("/")
+        stream = self.stream(parts[2]) if len(parts) > 2 and parts[1] == "stream" else None
+        if stream is None:
+            handler.send_error(404)
+            return
+        try:
+            if stream["local_path"]:
+                self.send_file(handler, stream["local_path"], send_body)
+            else:
+                self.relay(handler, stream, send_body)
+        except (BrokenPipeError, ConnectionResetError):
+            handler.close_connection = True  # the device dropped the request, eg. to seek elsewhere
+        except Exception as e:
+            LOG.error("Kodi stream proxy failed for " + stream["url"] + ": " + str(e))
+            handler.close_connection = True
+
+    # answer from a file on this host, the body goes from the page cache to the socket with sendfile
+    def send_file(self, handler, local_path, send_body):
+        with open(local_path, "rb") as movie_file:
+            size = os.fstat(movie_file.fileno()).st_size
+            try:
+                byte_range = parse_range(handler.headers.get("Range"), size)
+            except ValueError:
+                handler.send_response(416)
+                handler.send_header("Content-Range", "bytes */" + str(size))
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+            first, last = byte_range or (0, size - 1)
+            handler.send_response(206 if byte_range else 200)
+            handler.send_header("Content-Type", mimetypes.guess_type(local_path)[0] or "application/octet-stream")
+            handler.send_header("Accept-Ranges", "bytes")
+            handler.send_header("Content-Length", str(last - first + 1))
+            if byte_range:
+                handler.send_header("Content-Range", "bytes " + str(first) + "-" + str(last) + "/" + str(size))
+            handler.end_headers()
+            metrics.increment("kodi_proxy_requests_total", {"source": "file", "status": 206 if byte_range else 200})
+            if send_body and size:
+                sent = handler.connection.sendfile(movie_file, first, last - first + 1)
+                metrics.increment("kodi_proxy_bytes_total", {"source": "file"}, sent)
+
+    # pass the request, with its range, on to kodi and relay the answer as it arrives
+    def relay(self, handler, stream, send_body):
+        url = urllib.parse.urlsplit(stream["url"])
+        headers = {}
+        if stream["authorization"]:
+            headers["Authorization"] = stream["authorization"]
+        if handler.headers.get("Range"):
+            headers["Range"] = handler.headers["Range"]
+        method = "GET" if send_body else "HEAD"
+        path = url.path + ("?" + url.query if url.query else "")
+        connection, reused = self.upstream.get(url.scheme, url.netloc)
+        try:
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            if not reused:
+                raise
+            # kodi closed the kept connection while it was idle, try once on a new one
+            connection = self.upstream.connect(url.scheme, url.netloc)
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+        handler.send_response(response.status)
+        for each_header in RELAYED_HEADERS:
+            if response.getheader(each_header):
+                handler.send_header(each_header, response.getheader(each_header))
+        if not response.getheader("Content-Length"):
+            handler.send_header("Connection", "close")  # the body then ends when the connection does
+        handler.end_headers()
+        metrics.increment("kodi_proxy_requests_total", {"source": "kodi", "status": response.status})
+        finished = False
+        try:
+            if send_body:
+                self.copy_body(response, handler.wfile)
+            else:
+                response.read()
+            finished = True
+        finally:
+            if finished and not response.will_close:
+                self.upstream.put(url.scheme, url.netloc, connection)
+            else:
+                connection.close()
+
+    # copy the response body through one reused buffer, no bytes object is made per chunk
+    def copy_body(self, response, output):
+        buffer = memoryview(bytearray(self.chunk_size))
+        copied = 0
+        while True:
+            length = response.readinto(buffer)
+            if not length:
+                break
+            output.write(buffer[:length])
+            copied += length
+        metrics.increment("kodi_proxy_bytes_total", {"source": "kodi"}, copied)
@@ -0,0 +1,419 @@
+import codecs
+import collections
+import contextlib
+import json
+import re
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from mycroft.util.log import LOG
+
+from .kodi_metrics import metrics
+
+
+class KodiUnavailable(Exception):
+    """
+    Raised without contacting kodi when its host is known to be down.
+    """
+    pass
+
+
+class KodiTimeout(Exception):
+    """
+    Raised when a command has used up its deadline before kodi answered.
+    """
+    pass
+
+
+# the deadline of the command running on each thread, shared by every kodi call it makes
+command_deadline = threading.local()
+
+
+# give every kodi call made inside the block, on this thread, a share of one time budget
+# a nested deadline can only shorten the budget of the one around it
+@contextlib.contextmanager
+def deadline(seconds):
+    outer_deadline = getattr(command_deadline, "at", None)
+    command_deadline.at = time.monotonic() + seconds
+    if outer_deadline is not None:
+        command_deadline.at = min(command_deadline.at, outer_deadline)
+    try:
+        yield
+    finally:
+        command_deadline.at = outer_deadline
+
+
+class CircuitBreaker(object):
+    """
+    Stops sending to a kodi that keeps failing. After failure_threshold failures in a row the
+    breaker opens and calls fail at once. Once reset_timeout has passed a single trial call is
+    let through (half open), its success closes the breaker and its failure opens it again.
+    """
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.counters = {"opened": 0, "half_opened": 0, "closed": 0, "rejected": 0}
+        self.history = collections.deque(maxlen=20)  # (time, from state, to state)
+        self.lock = threading.Lock()
+
+    # true when a call may be sent, false when it must fail at once
+    def allow(self):
+        with self.lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.transition("half_open")
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial_running = False
+            if self.state != "closed":
+                self.transition("closed")
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.transition("open")
+
+    # the call ended without telling whether kodi is healthy, eg. it ran out of its deadline
+    def release(self):
+        with self.lock:
+            self.trial_running = False
+
+    def transition(self, state):
+        LOG.info("Kodi circuit breaker: " + self.state + " -> " + state)
+        self.history.append((time.time(), self.state, state))
+        metrics.increment("kodi_breaker_transitions_total", {"from": self.state, "to": state})
+        self.counters[{"open": "opened", "half_open": "half_opened", "closed": "closed"}[state]] += 1
+        self.state = state
+
+
+class KodiRpc(object):
+    """
+    A pooled, keep-alive transport for the kodi json-rpc interface.
+    One requests.Session is shared by every call so the TCP connection and the
+    parsed credentials are reused between voice commands.
+    """
+    json_header = {'content-type': 'application/json'}
+
+    def __init__(self, kodi_path="", timeout=5.0, connect_timeout=2.0, pool_size=4, breaker=None):
+        self.url = ""
+        self.auth = None
+        self.timeout = (connect_timeout, timeout)
+        self.pool_size = pool_size
+        self.session = None
+        self.session_lock = threading.Lock()  # guards swapping the session, requests never wait on it
+        self.available = True  # cleared by the health monitor while the host does not answer
+        self.last_success = 0.0  # time.monotonic() of the last request kodi answered
+        self.breaker = breaker or CircuitBreaker()
+        if kodi_path:
+            self.configure(kodi_path)
+
+    # (re)build the transport from the path assembled in on_websettings_changed
+    def configure(self, kodi_path, timeout=None, connect_timeout=None):
+        split_path = urllib.parse.urlsplit(kodi_path)
+        host = split_path.hostname or ""
+        if split_path.port:
+            host = host + ":" + str(split_path.port)
+        url = urllib.parse.urlunsplit((split_path.scheme, host, split_path.path, "", ""))
+        if url != self.url:  # the down state and the failures were those of the old host
+            self.breaker.record_success()
+        self.url = url
+        self.available = True  # until the health monitor has checked the host
+        if split_path.username or split_path.password:
+            self.auth = (urllib.parse.unquote(split_path.username or ""),
+                         urllib.parse.unquote(split_path.password or ""))
+        else:
+            self.auth = None
+        if timeout is not None or connect_timeout is not None:
+            self.timeout = (connect_timeout or self.timeout[0], timeout or self.timeout[1])
+        self.reconnect()
+
+    # drop any pooled connections and start a fresh session, returns the new session
+    # the new session is swapped in before the old one is closed, so other threads always find one to post on
+    def reconnect(self):
+        session = requests.Session()
+        session.headers.update(self.json_header)
+        session.auth = self.auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        with self.session_lock:
+            old_session, self.session = self.session, session
+        if old_session is not None:
+            old_session.close()
+        return session
+
+    def close(self):
+        with self.session_lock:
+            old_session, self.session = self.session, None
+        if old_session is not None:
+            old_session.close()
+
+    # the session to post on, a new one when the transport was closed
+    def current_session(self):
+        session = self.session
+        return session if session is not None else self.reconnect()
+
+    # send a pre-built json-rpc payload, returns the requests response object
+    # fails at once with KodiUnavailable when the host is known to be down or its breaker is open,
+    # and with KodiTimeout when the command's deadline has passed, every request is timed into the metrics
+    # record_failures False keeps a best effort request, eg. a notification with a short timeout, from
+    # opening the breaker for the commands that follow it
+    def post(self, payload, timeout=None, stream=False, record_failures=True):
+        with metrics.timer("kodi_rpc_seconds", {"method": self.method_label(payload)}):
+            return self.checked_post(payload, timeout=timeout, stream=stream, record_failures=record_failures)
+
+    def checked_post(self, payload, timeout=None, stream=False, record_failures=True):
+        if not self.available:
+            raise KodiUnavailable("Kodi is not answering at " + self.url)
+        timeout, shortened = self.bounded_timeout(timeout)
+        if not self.breaker.allow():
+            raise KodiUnavailable("Kodi circuit breaker is open for " + self.url)
+        try:
+            response = self.send(payload, timeout=timeout, stream=stream)
+        except requests.exceptions.Timeout as e:
+            if shortened:  # only the deadline was too short, that says nothing about kodi
+                self.breaker.release()
+                raise KodiTimeout("Kodi did not answer within the command deadline: " + str(e))
+            self.record_failure(record_failures)
+            raise
+        except requests.exceptions.RequestException:
+            self.record_failure(record_failures)
+            raise
+        except Exception:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        self.last_success = time.monotonic()
+        self.available = True  # kodi answered, whatever the last ping said
+        return response
+
+    def record_failure(self, record_failures=True):
+        if record_failures:
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+
+    # the (connect, read) timeout of one call, cut down to what is left of the command deadline
+    # returns the timeout and whether the deadline shortened it
+    def bounded_timeout(self, timeout=None):
+        timeout = timeout or self.timeout
+        if not isinstance(timeout, tuple):
+            timeout = (min(self.timeout[0], timeout), timeout)
+        deadline_at = getattr(command_deadline, "at", None)
+        if deadline_at is None:
+            return timeout, False
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise KodiTimeout("The command deadline passed before kodi was asked")
+        return (min(timeout[0], remaining), min(timeout[1], remaining)), remaining < max(timeout)
+
+    def send(self, payload, timeout=None, stream=False):
+        data = json.dumps(payload)
+        method_label = self.method_label(payload)
+        for each_call in payload if isinstance(payload, list) else [payload]:
+            metrics.increment("kodi_rpc_calls_total", {"method": each_call.get("method", "")})
+        metrics.increment("kodi_rpc_request_bytes_total", {"method": method_label}, len(data))
+        response = self.send_data(data, timeout, stream, self.is_read_only(payload))
+        if response.headers.get("content-length", "").isdigit():  # a streamed body is not read here
+            metrics.increment("kodi_rpc_response_bytes_total", {"method": method_label},
+                              int(response.headers["content-length"]))
+        return response
+
+    # the method a payload is counted under, batches are counted as one "batch" request
+    @staticmethod
+    def method_label(payload):
+        if isinstance(payload, list):
+            return "batch"
+        return payload.get("method", "")
+
+    # true when every call of the payload only reads from kodi, so sending it twice changes nothing
+    @staticmethod
+    def is_read_only(payload):
+        return all(each_call.get("method", "").split(".")[-1].startswith(("Get", "Ping"))
+                   for each_call in (payload if isinstance(payload, list) else [payload]))
+
+    # true when the request never reached kodi, the connection for it could not be opened
+    @staticmethod
+    def was_not_sent(error):
+        reason = getattr(error.args[0] if error.args else None, "reason", None)
+        return isinstance(reason, NewConnectionError)
+
+    # a failed request is retried once on a new connection, unless it may have reached kodi and changes
+    # something there, eg. a Playlist.Add and Player.Open batch would queue and start the item twice
+    def send_data(self, data, timeout=None, stream=False, read_only=True):
+        try:
+            return self.current_session().post(self.url, data=data, timeout=timeout or self.timeout, stream=stream)
+        except requests.exceptions.ConnectTimeout:
+            raise  # the host is unreachable, a retry would only double the wait
+        except requests.exceptions.ConnectionError as e:
+            if not read_only and not self.was_not_sent(e):
+                raise
+            # a kept-alive socket may have been closed by kodi, retry once on a new connection
+            LOG.info("Kodi connection lost, reconnecting: " + str(e))
+            session = self.reconnect()
+            timeout, _ = self.bounded_timeout(timeout)  # the retry gets what is left of the deadline
+            return session.post(self.url, data=data, timeout=timeout, stream=stream)
+
+    # true when kodi answers JSONRPC.Ping, sent even while the host is marked down
+    def ping(self, timeout=None):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "JSONRPC.Ping",
+            "id": 1
+        }
+        try:
+            return self.send(payload, timeout=timeout).json().get("result") == "pong"
+        except Exception as e:
+            LOG.info("Kodi ping failed for " + self.url + ": " + str(e))
+            return False
+
+    # build and send a single json-rpc request, returns the decoded response
+    def call(self, method, params=None, req_id=1, timeout=None, record_failures=True):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "id": req_id
+        }
+        if params is not None:
+            payload["params"] = params
+        return self.post(payload, timeout=timeout, record_failures=record_failures).json()
+
+    # send a request and decode the items of result[key] one at a time as the response arrives
+    def stream(self, method, params, key, req_id=1, timeout=None):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "id": req_id,
+            "params": params
+        }
+        return JsonArrayStream(self.iter_text(self.post(payload, timeout=timeout, stream=True)), key)
+
+    @staticmethod
+    def iter_text(response, chunk_size=65536):
+        text_decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        with response:
+            for each_chunk in response.iter_content(chunk_size):
+                yield text_decoder.decode(each_chunk)
+        yield text_decoder.decode(b"", True)
+
+    # start collecting calls that will be sent to kodi as a single batch request
+    def batch(self):
+        return KodiBatch(self)
+
+
+class JsonArrayStream(object):
+    """
+    Decodes the items of one array in a json document one at a time as its text arrives, so a
+    large library response is never held in memory as a whole. The rest of the document, with
+    the array left empty, is available from envelope once the items have been read.
+    """
+    separators = re.compile(r"[\s,]*")
+
+    def __init__(self, chunks, key):
+        self.chunks = chunks
+        self.marker = '"' + key + '"'
+        self.head = ""  # the document text before the array
+        self.tail = ""  # the document text after the array
+        self.envelope = None
+
+    def __iter__(self):
+        decoder = json.JSONDecoder()
+        buffer = ""
+        position = 0
+        in_array = False
+        array_done = False
+        for each_chunk in self.chunks:
+            if array_done:
+                self.tail += each_chunk
+                continue
+            buffer = buffer[position:] + each_chunk
+            position = 0
+            if not in_array:
+                marker_at = buffer.find(self.marker)
+                array_at = buffer.find("[", marker_at) if marker_at >= 0 else -1
+                if array_at < 0:
+                    # keep enough text to find a marker split across chunks
+                    keep_from = marker_at if marker_at >= 0 else max(0, len(buffer) - len(self.marker) + 1)
+                    self.head += buffer[:keep_from]
+                    buffer = buffer[keep_from:]
+                    continue
+                self.head += buffer[:marker_at]
+                position = array_at + 1
+                in_array = True
+            while True:
+                position = self.separators.match(buffer, position).end()
+                if position >= len(buffer):
+                    break
+                if buffer[position] == "]":
+                    self.tail = buffer[position + 1:]
+                    array_done = True
+                    break
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    break  # wait for the rest of the item
+                yield item
+        if in_array:
+            self.envelope = json.loads(self.head + self.marker + ": []" + self.tail)
+        else:  # no array in the response, eg. an error or an empty kodi result
+            self.envelope = json.loads(self.head + buffer)
+
+
+class KodiBatch(object):
+    """
+    Collects json-rpc calls and sends them to kodi as one batched array.
+    Responses are matched back to their calls by id and returned in call order.
+    """
+    def __init__(self, rpc):
+        self.rpc = rpc
+        self.calls = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    # queue a call, returns the position of its response in the list returned by send()
+    def add(self, method, params=None):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "id": len(self.calls) + 1
+        }
+        if params is not None:
+            payload["params"] = params
+        self.calls.append(payload)
+        return len(self.calls) - 1
+
+    # send every queued call in one round trip, returns one response dict (or None) per call
+    def send(self, timeout=None):
+        if not self.calls:
+            return []
+        kodi_response = self.rpc.post(self.calls, timeout=timeout).json()
+        if isinstance(kodi_response, dict):  # kodi rejected the whole batch with a single error
+            LOG.error("Kodi batch request failed: " + str(kodi_response.get("error")))
+            kodi_response = []
+        responses = {}
+        for each_response in kodi_response:
+            responses[each_response.get("id")] = each_response
+        results = [responses.get(each_call["id"]) for each_call in self.calls]
+        self.calls = []
+        return results
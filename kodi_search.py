@@ -0,0 +1,421 @@
+import bisect
+import functools
+import heapq
+import re
+from array import array
+
+UNIT_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+              "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen",
+              "nineteen"]
+TENS_WORDS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+ORDINAL_WORDS = ["", "first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth",
+                 "tenth", "eleventh", "twelfth", "thirteenth", "fourteenth", "fifteenth", "sixteenth",
+                 "seventeenth", "eighteenth", "nineteenth", "twentieth"]
+# single letter numerals are left alone, "I, Robot" and "Malcolm X" are not numbered titles
+ROMAN_NUMERALS = ["", "", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x", "xi", "xii", "xiii", "xiv",
+                  "xv", "xvi", "xvii", "xviii", "xix", "xx"]
+
+
+# precomputed lookup of every number word to its value, including the "twentyone" form left
+# behind when the hyphen is stripped from "twenty-one"
+def build_number_words():
+    number_words = {}
+    for value, each_word in enumerate(UNIT_WORDS):
+        number_words[each_word] = value
+    for tens_value, each_tens in enumerate(TENS_WORDS):
+        if each_tens:
+            number_words[each_tens] = tens_value * 10
+            for unit_value in range(1, 10):
+                number_words[each_tens + UNIT_WORDS[unit_value]] = tens_value * 10 + unit_value
+    return number_words
+
+
+def ordinal_suffix(value):
+    if value % 100 in (11, 12, 13):
+        return str(value) + "th"
+    return str(value) + {1: "st", 2: "nd", 3: "rd"}.get(value % 10, "th")
+
+
+NUMBER_WORDS = build_number_words()
+SCALE_WORDS = {"hundred": 100, "thousand": 1000, "million": 1000000}
+# single word replacements, "eight" is accepted as an ordinal in OrdinalKeyword.voc but is a number here
+WORD_REPLACEMENTS = {}
+WORD_REPLACEMENTS.update((each_word, ordinal_suffix(value)) for value, each_word in enumerate(ORDINAL_WORDS)
+                         if each_word)
+WORD_REPLACEMENTS.update((each_numeral, str(value)) for value, each_numeral in enumerate(ROMAN_NUMERALS)
+                         if len(each_numeral) > 1)
+TITLE_TOKEN_REGEX = re.compile(r"[A-Za-z]+|[^A-Za-z]+")
+
+
+# replace number words, ordinals and roman numerals in a title with digits in a single pass,
+# eg. "Rocky II" and "rocky two" both become "rocky 2"
+@functools.lru_cache(maxsize=8192)
+def normalize_title(title):
+    normalized = []
+    total = current = None  # the number being read from a run of number words
+    last_word = ""
+    separators = []  # text seen between number words, kept when the number ends
+    for each_token in TITLE_TOKEN_REGEX.findall(str(title)):
+        lower_token = each_token.lower()
+        if lower_token in NUMBER_WORDS:
+            value = NUMBER_WORDS[lower_token]
+            # "nineteen eighty four" is two numbers, "twenty one" is one
+            if current is not None and (current % 100 == 0 or (current % 100 >= 20 and current % 10 == 0 and
+                                                               value < 10)):
+                current += value
+            else:
+                if current is not None:
+                    normalized.append(str(total + current))
+                total, current = 0, value
+                normalized.extend(separators)
+            separators = []
+            last_word = lower_token
+            continue
+        if lower_token in SCALE_WORDS and current is not None:
+            if SCALE_WORDS[lower_token] == 100:
+                current = (current or 1) * 100
+            else:
+                total, current = total + (current or 1) * SCALE_WORDS[lower_token], 0
+            separators = []
+            last_word = lower_token
+            continue
+        if current is not None:
+            if not each_token.strip(" -") or (lower_token == "and" and last_word in SCALE_WORDS):
+                separators.append(each_token)  # may still be inside the number, eg. "one hundred and one"
+                continue
+            normalized.append(str(total + current))
+            normalized.extend(separators)
+            total = current = None
+            separators = []
+        normalized.append(WORD_REPLACEMENTS.get(lower_token, each_token))
+    if current is not None:
+        normalized.append(str(total + current))
+        normalized.extend(separators)
+    return "".join(normalized)
+
+
+class PackedStrings(object):
+    """
+    A read only list of strings packed into one string with an offset table, so each entry
+    costs a few bytes instead of a python object.
+    """
+    def __init__(self, strings=()):
+        self.offsets = array("i", [0])
+        parts = []
+        end = 0
+        for each_string in strings:
+            parts.append(each_string)
+            end += len(each_string)
+            self.offsets.append(end)
+        self.text = "".join(parts)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        return self.text[self.offsets[position]:self.offsets[position + 1]]
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    # the positions of the entries containing text, found with str.find over the packed text
+    def positions_containing(self, text):
+        positions = []
+        found_at = self.text.find(text)
+        while found_at >= 0:
+            position = bisect.bisect_right(self.offsets, found_at) - 1
+            entry_end = self.offsets[position + 1]
+            if found_at + len(text) <= entry_end:
+                positions.append(position)
+                found_at = self.text.find(text, entry_end)
+            else:  # the match runs into the next entry
+                found_at = self.text.find(text, found_at + 1)
+        return positions
+
+
+class TitleIndex(object):
+    """
+    An inverted trigram index over the title fields (label, artist, album) of library items.
+    Every word of a normalized title is split into 3 character grams with a sorted postings
+    array per gram, so a spoken word is found as a substring by intersecting postings instead
+    of scanning the whole library. Names and postings are packed to keep the index small.
+    """
+    gram_size = 3
+
+    def __init__(self, items, fields, normalize=None):
+        self.items = items
+        self.normalize = normalize or normalize_title
+        self.names = {}
+        self.postings = {}
+        for each_field in fields:
+            names = []
+            postings = {}
+            for position, each_value in enumerate(self.field_values(items, each_field)):
+                name = self.normalize_name(each_value)
+                names.append(name)
+                for each_gram in self.name_grams(name):
+                    if each_gram in postings:
+                        postings[each_gram].append(position)
+                    else:
+                        postings[each_gram] = [position]
+            self.names[each_field] = PackedStrings(names)
+            self.postings[each_field] = dict((each_gram, array("l", each_posting))
+                                             for each_gram, each_posting in postings.items())
+
+    @staticmethod
+    def field_value(item, field):
+        value = item.get(field) or ""
+        if isinstance(value, list):  # artist is an array element, the first artist is searched
+            value = value[0] if value else ""
+        return str(value)
+
+    # the text of one field for every item, read straight from a compact store when there is one
+    def field_values(self, items, field):
+        if hasattr(items, "field_values"):
+            return items.field_values(field)
+        return (self.field_value(each_item, field) for each_item in items)
+
+    def normalize_name(self, name):
+        return str(self.normalize(name.replace("-", ""))).lower()
+
+    # every distinct 3 character gram of every word in the name
+    def name_grams(self, name):
+        grams = set()
+        for each_word in name.split():
+            for each_start in range(0, len(each_word) - self.gram_size + 1):
+                grams.add(each_word[each_start:each_start + self.gram_size])
+        return grams
+
+    # the grams that every name containing the word must also contain, none for short words
+    def word_grams(self, word):
+        return set(word[each_start:each_start + self.gram_size]
+                   for each_start in range(0, len(word) - self.gram_size + 1))
+
+    # the grams of all the search words, worked out once however many fields are searched
+    def search_grams(self, search_words):
+        grams = set()
+        for each_word in search_words:
+            grams.update(self.word_grams(each_word))
+        return grams
+
+    # returns the positions of the items where every search word is found in the field, the
+    # first limit of them when a limit is given
+    def search_positions(self, search_words, field="label", grams=None, limit=None):
+        names = self.names[field]
+        postings = self.postings[field]
+        word_postings = []
+        for each_gram in self.search_grams(search_words) if grams is None else grams:
+            if each_gram not in postings:
+                return []
+            word_postings.append(postings[each_gram])
+        if word_postings:
+            word_postings.sort(key=len)
+            candidates = word_postings[0]
+            if len(word_postings) > 1:
+                # the set intersections run in c, far quicker than a python bisect per candidate
+                candidate_set = set(candidates)
+                for each_posting in word_postings[1:]:
+                    candidate_set.intersection_update(each_posting)
+                    if not candidate_set:
+                        return []
+                candidates = sorted(candidate_set)
+        elif search_words:  # only words shorter than a gram, find the longest in the packed names
+            candidates = names.positions_containing(max(search_words, key=len))
+        else:
+            candidates = range(len(names))
+        # grams only narrow the candidates, confirm the words are really substrings of the name
+        found_positions = []
+        for position in candidates:
+            name = names[position]
+            if name and all(each_word in name for each_word in search_words):
+                found_positions.append(position)
+                if limit is not None and len(found_positions) >= limit:
+                    break
+        return found_positions
+
+    # returns the items where every search word is found in the field
+    def search(self, search_words, field="label", limit=None):
+        return [self.items[position] for position in self.search_positions(search_words, field, limit=limit)]
+
+    # returns a dict of field -> items where every search word is found in that field, all the
+    # fields are answered from one pass over the query instead of one search per field
+    def search_fields(self, search_words, fields, limit=None):
+        grams = self.search_grams(search_words)
+        found = {}
+        for each_field in fields:
+            found[each_field] = [self.items[position]
+                                 for position in self.search_positions(search_words, each_field, grams, limit)]
+        return found
+
+
+# a metaphone style phonetic key for a single word, so "night" and "knight" share the key "NT"
+@functools.lru_cache(maxsize=65536)
+def phonetic_key(word):
+    word = "".join(each_letter for each_letter in word.upper() if each_letter.isalnum())
+    if not word or not word.isalpha():
+        return word  # numbers are matched as they are
+    for each_prefix in ("KN", "GN", "PN", "WR", "AE"):
+        if word.startswith(each_prefix):
+            word = word[1:]
+    if word.startswith("X"):
+        word = "S" + word[1:]
+    if word.startswith("WH"):
+        word = "W" + word[2:]
+    key = []
+    for position, letter in enumerate(word):
+        previous = word[position - 1] if position else ""
+        following = word[position + 1:position + 2]
+        after_next = word[position + 2:position + 3]
+        if letter == previous and letter != "C":
+            continue
+        if letter in "AEIOU":
+            code = letter if position == 0 else ""
+        elif letter == "B":
+            code = "" if previous == "M" and not following else "B"
+        elif letter == "C":
+            if following == "H":
+                code = "K" if previous == "S" else "X"
+            elif following == "I" and after_next == "A":
+                code = "X"
+            elif following in ("I", "E", "Y") and following:
+                code = "" if previous == "S" else "S"
+            else:
+                code = "K"
+        elif letter == "D":
+            code = "J" if following == "G" and after_next and after_next in "EIY" else "T"
+        elif letter == "G":
+            if following == "H" and not (after_next and after_next in "AEIOU"):
+                code = ""  # silent as in "night" and "though"
+            elif following == "N" and (not after_next or word[position + 2:position + 4] == "ED"):
+                code = ""
+            elif following and following in "EIY":
+                code = "J"
+            else:
+                code = "K"
+        elif letter == "H":
+            code = "H" if following and following in "AEIOU" and not (previous and previous in "CGPST") else ""
+        elif letter == "K":
+            code = "" if previous == "C" else "K"
+        elif letter == "P":
+            code = "F" if following == "H" else "P"
+        elif letter == "Q":
+            code = "K"
+        elif letter == "S":
+            code = "X" if following == "H" or word[position + 1:position + 3] in ("IO", "IA") else "S"
+        elif letter == "T":
+            if word[position + 1:position + 3] in ("IA", "IO"):
+                code = "X"
+            elif following == "H":
+                code = "0"
+            else:
+                code = "" if word[position + 1:position + 3] == "CH" else "T"
+        elif letter == "V":
+            code = "F"
+        elif letter in ("W", "Y"):
+            code = letter if following and following in "AEIOU" else ""
+        elif letter == "X":
+            code = "KS"
+        elif letter == "Z":
+            code = "S"
+        else:
+            code = letter
+        key.append(code)
+    return "".join(key)
+
+
+# the character trigrams of every word in a normalized title, words are padded so their
+# first and last letters weigh as much as the middle
+def title_trigrams(name):
+    trigrams = set()
+    for each_word in name.split():
+        padded_word = " " + each_word + " "
+        for each_start in range(0, len(padded_word) - 2):
+            trigrams.add(padded_word[each_start:each_start + 3])
+    return trigrams
+
+
+class FuzzyIndex(object):
+    """
+    A ranked, approximate title matcher for spoken requests.
+    Each title is indexed by its character trigrams and the phonetic key of every word, so a
+    misheard "the dark night" still ranks "The Dark Knight" first. Candidates are gathered from
+    the postings of the query's selective grams and keys and only those candidates are scored.
+    """
+    max_posting_share = 0.1  # grams found in more titles than this share do not select candidates
+    candidate_pool = 20  # candidates scored for every result asked for
+
+    def __init__(self, items, field="label", normalize=None):
+        self.items = items
+        self.normalize = normalize or normalize_title
+        self.trigrams = []
+        self.keys = []
+        self.gram_postings = {}
+        self.key_postings = {}
+        for position, each_item in enumerate(items):
+            name = self.normalize_name(TitleIndex.field_value(each_item, field))
+            trigrams = title_trigrams(name)
+            keys = self.name_keys(name)
+            # kept as tuples of strings, which the garbage collector stops tracking, where 100k sets
+            # of a large library would add a pause to every full collection
+            self.trigrams.append(tuple(trigrams))
+            self.keys.append(tuple(keys))
+            for each_gram in trigrams:
+                self.gram_postings.setdefault(each_gram, []).append(position)
+            for each_key in keys:
+                self.key_postings.setdefault(each_key, []).append(position)
+        self.gram_postings = dict((each_gram, array("l", each_posting))
+                                  for each_gram, each_posting in self.gram_postings.items())
+        self.key_postings = dict((each_key, array("l", each_posting))
+                                 for each_key, each_posting in self.key_postings.items())
+
+    def normalize_name(self, name):
+        return str(self.normalize(name.replace("-", ""))).lower()
+
+    @staticmethod
+    def name_keys(name):
+        return set(phonetic_key(each_word) for each_word in name.split()) - {""}
+
+    # similarity between 0 and 1, the mean of the trigram dice coefficient and the share of phonetic keys in common
+    def score(self, trigrams, keys, position):
+        title_trigrams = self.trigrams[position]
+        title_keys = self.keys[position]
+        gram_score = 2.0 * len(trigrams.intersection(title_trigrams)) / (len(trigrams) + len(title_trigrams) or 1)
+        key_score = float(len(keys.intersection(title_keys))) / (max(len(keys), len(title_keys)) or 1)
+        return (gram_score + key_score) / 2
+
+    # returns up to limit (score, item) tuples, best match first
+    def search(self, query, limit=5, min_score=0.0):
+        name = self.normalize_name(query)
+        trigrams = title_trigrams(name)
+        keys = self.name_keys(name)
+        max_postings = max(50, int(len(self.items) * self.max_posting_share))
+        postings = [self.gram_postings.get(each_gram) for each_gram in trigrams] + \
+                   [self.key_postings.get(each_key) for each_key in keys]
+        postings = [each_posting for each_posting in postings if each_posting]
+        selective_postings = [each_posting for each_posting in postings if len(each_posting) <= max_postings]
+        hits = {}
+        for each_posting in selective_postings or postings:  # a query of only common words still gets ranked
+            for position in each_posting:
+                hits[position] = hits.get(position, 0) + 1
+        candidates = heapq.nlargest(limit * self.candidate_pool, hits, key=hits.get)
+        ranked = heapq.nsmallest(limit, ((-self.score(trigrams, keys, position), position)
+                                         for position in candidates))
+        return [(-score, self.items[position]) for score, position in ranked if -score >= min_score]
+
+
+# the key two results are considered the same title by
+def title_key(label):
+    return " ".join(str(label).lower().split())
+
+
+# drop results that repeat an earlier title in a single pass, the first one found is kept
+def unique_titles(items):
+    seen_titles = set()
+    unique_items = []
+    for each_item in items:
+        key = title_key(each_item["label"])
+        if key not in seen_titles:
+            seen_titles.add(key)
+            unique_items.append(each_item)
+    return unique_items
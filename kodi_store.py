@@ -0,0 +1,73 @@
+import json
+import sys
+from array import array
+
+from .kodi_search import PackedStrings
+
+
+class SongStore(object):
+    """
+    A compact, columnar copy of the music library.
+    Ids, durations and track numbers are held in int arrays, labels in a PackedStrings table
+    and artists and albums are interned once and referenced by index. It reads like a list
+    of song dicts, each dict is only built when a song is looked at.
+    """
+    fields = ("songid", "label", "artist", "album", "duration", "track")
+
+    def __init__(self, rows=()):
+        self.songids = array("i")
+        self.durations = array("i")
+        self.tracks = array("i")
+        self.artist_ids = array("i")
+        self.album_ids = array("i")
+        self.artist_table = []  # tuples of artist names
+        self.album_table = []
+        artist_lookup = {}
+        album_lookup = {}
+        labels = []
+        for songid, label, artist, album, duration, track in rows:  # rows are in the order of fields
+            if isinstance(artist, str):
+                artist = json.loads(artist or "[]")
+            artist = tuple(sys.intern(each_artist) for each_artist in artist)
+            if artist not in artist_lookup:
+                artist_lookup[artist] = len(self.artist_table)
+                self.artist_table.append(artist)
+            album = album or ""
+            if album not in album_lookup:
+                album_lookup[album] = len(self.album_table)
+                self.album_table.append(sys.intern(album))
+            self.songids.append(songid)
+            self.durations.append(duration or 0)
+            self.tracks.append(track or 0)
+            self.artist_ids.append(artist_lookup[artist])
+            self.album_ids.append(album_lookup[album])
+            labels.append(label or "")
+        self.labels = PackedStrings(labels)
+
+    def __len__(self):
+        return len(self.songids)
+
+    def __getitem__(self, position):
+        return {
+            "songid": self.songids[position],
+            "label": self.labels[position],
+            "artist": list(self.artist_table[self.artist_ids[position]]),
+            "album": self.album_table[self.album_ids[position]],
+            "duration": self.durations[position],
+            "track": self.tracks[position]
+        }
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    # the searchable text of one field for every song, without building the song dicts
+    def field_values(self, field):
+        if field == "label":
+            return iter(self.labels)
+        if field == "artist":  # the first artist is searched
+            return (self.artist_table[each_id][0] if self.artist_table[each_id] else ""
+                    for each_id in self.artist_ids)
+        if field == "album":
+            return (self.album_table[each_id] for each_id in self.album_ids)
+        return (str(self[position].get(field) or "") for position in range(len(self)))
@@ -0,0 +1,313 @@
+import collections
+import concurrent.futures
+import re
+import threading
+import time
+import urllib.parse
+
+import pafy
+import requests
+
+from mycroft.util.log import LOG
+
+from .kodi_metrics import metrics
+
+# one pass over the results page finds both the video and the playlist links
+YOUTUBE_LINK = re.compile(r'href="/(?:watch\?v=(?P<video>[\w-]{11})|playlist\?list=(?P<playlist>[\w-]+))')
+# the unix time a signed stream url stops working, as a query parameter or a path segment
+STREAM_EXPIRY = re.compile(r"[?&/]expire[=/](\d+)")
+
+
+# the video ids and playlist ids of a youtube results page, in page order without repeats
+def extract_links(html):
+    video_ids = []
+    playlist_ids = []
+    seen = set()
+    for each_match in YOUTUBE_LINK.finditer(html):
+        video_id, playlist_id = each_match.group("video", "playlist")
+        link_id = video_id or playlist_id
+        if link_id in seen:
+            continue
+        seen.add(link_id)
+        if video_id:
+            video_ids.append(video_id)
+        else:
+            playlist_ids.append(playlist_id)
+    return video_ids, playlist_ids
+
+
+class HtmlSearch(object):
+    """
+    Searches youtube by reading its results page, no api key is needed.
+    """
+    def __init__(self, base_url="https://www.youtube.com", timeout=5.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()  # keeps the connection to youtube open between searches
+
+    # returns (video ids, playlist ids)
+    def search(self, query):
+        response = self.session.get(self.base_url + "/results", params={"search_query": query},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        return extract_links(response.text)
+
+    def close(self):
+        self.session.close()
+
+
+class DataApiSearch(object):
+    """
+    Searches youtube with the youtube data api (v3), needs an api key.
+    """
+    def __init__(self, api_key, base_url="https://www.googleapis.com/youtube/v3", timeout=5.0, max_results=10):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_results = max_results
+        self.session = requests.Session()
+
+    # returns (video ids, playlist ids)
+    def search(self, query):
+        response = self.session.get(self.base_url + "/search",
+                                    params={"part": "id", "q": query, "type": "video,playlist",
+                                            "maxResults": self.max_results, "key": self.api_key},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        video_ids = []
+        playlist_ids = []
+        for each_item in response.json().get("items", []):
+            item_id = each_item.get("id", {})
+            if item_id.get("videoId") and item_id["videoId"] not in video_ids:
+                video_ids.append(item_id["videoId"])
+            elif item_id.get("playlistId") and item_id["playlistId"] not in playlist_ids:
+                playlist_ids.append(item_id["playlistId"])
+        return video_ids, playlist_ids
+
+    def close(self):
+        self.session.close()
+
+
+# the unix time the signed stream url expires at, None when it carries no expiry
+def stream_expiry(stream_url):
+    expiry = STREAM_EXPIRY.search(str(stream_url))
+    return int(expiry.group(1)) if expiry else None
+
+
+# the video id of a youtube link, eg. "/watch?v=<id>", "https://youtu.be/<id>" or the id itself
+def video_id_of(youtube_url):
+    url = urllib.parse.urlsplit(str(youtube_url))
+    video_id = urllib.parse.parse_qs(url.query).get("v")
+    if video_id:
+        return video_id[0]
+    return url.path.rstrip("/").rsplit("/", 1)[-1]
+
+
+# the url of the best audio stream of the video, a full youtube_dl extraction of its page
+def resolve_audio_url(video_id):
+    LOG.debug('pafy processing: ' + video_id)
+    streams = pafy.new(video_id)
+    LOG.debug('audiostreams found: ' + str(streams.audiostreams))
+    bestaudio = streams.getbestaudio()
+    LOG.debug('audiostream selected: ' + str(bestaudio))
+    return bestaudio.url
+
+
+class SearchCache(object):
+    """
+    Remembers the links found for a query for ttl seconds, the least recently used query is
+    dropped once max_entries are held.
+    """
+    def __init__(self, max_entries=64, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()  # query -> (expires at, links)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(query):
+        return " ".join(str(query).lower().split())
+
+    # the cached links of the query, None when it was not searched or has expired
+    def get(self, query):
+        key = self.key(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry[0]:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    # expires_at is a unix time, by default the entry is kept for ttl seconds
+    def put(self, query, links, expires_at=None):
+        key = self.key(query)
+        with self.lock:
+            self.entries[key] = (expires_at or time.time() + self.ttl, links)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class StreamCache(SearchCache):
+    """
+    Remembers the resolved stream url of a video until its signature expires. Video ids are
+    case sensitive, so they are used as they are.
+    """
+    @staticmethod
+    def key(video_id):
+        return str(video_id)
+
+
+class YoutubeSearch(object):
+    """
+    Runs youtube searches in the background so the skill can check kodi's youtube addon while
+    the search is on the wire. search() returns a future of the links: the first video id and
+    the first playlist id found. Results are cached per query, and a query already being
+    searched shares the search in flight rather than starting another.
+    """
+    def __init__(self, backend=None, cache=None, max_workers=2):
+        self.backend = backend or HtmlSearch()
+        self.cache = cache or SearchCache()
+        self.videos = SearchCache(self.cache.max_entries, self.cache.ttl)  # query -> every video id found
+        self.max_workers = max_workers
+        self.executor = None
+        self.pending = {}  # query key -> future of the search in flight
+        self.lock = threading.Lock()
+
+    # swap the search backend, eg. when an api key is set, the cached results are dropped with the old one
+    def set_backend(self, backend):
+        old_backend = self.backend
+        self.backend = backend
+        self.cache.clear()
+        self.videos.clear()
+        if old_backend is not backend:
+            old_backend.close()
+
+    # a future of the links found for the query
+    def search(self, query):
+        links = self.cache.get(query)
+        if links is not None:
+            metrics.increment("kodi_youtube_cache_total", {"result": "hit"})
+            future = concurrent.futures.Future()
+            future.set_result(links)
+            return future
+        metrics.increment("kodi_youtube_cache_total", {"result": "miss"})
+        key = self.cache.key(query)
+        with self.lock:
+            future = self.pending.get(key)
+            if future is None:
+                if self.executor is None:
+                    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                          thread_name_prefix="YoutubeSearch")
+                future = self.executor.submit(self.fetch, query)
+                self.pending[key] = future
+        # outside the lock, the callback runs at once when the search has already finished
+        future.add_done_callback(lambda done: self.finished(key, done))
+        return future
+
+    def finished(self, key, future):
+        with self.lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+
+    # every video id the last search for the query found, in result order, [] when it was not searched
+    def video_ids(self, query):
+        return self.videos.get(query) or []
+
+    def fetch(self, query):
+        with metrics.timer("kodi_youtube_search_seconds", {"backend": type(self.backend).__name__}):
+            video_ids, playlist_ids = self.backend.search(query)
+        links = []
+        if video_ids:
+            links.append(video_ids[0])
+            LOG.info("Found Single Links: " + str(video_ids))
+        if playlist_ids:
+            links.append(playlist_ids[0])
+            LOG.info("Found Playlist Links: " + str(playlist_ids))
+        if links:  # an empty answer is not kept, youtube may have failed to answer properly
+            self.cache.put(query, links)
+        if video_ids:
+            self.videos.put(query, video_ids)
+        return links
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.backend.close()
+
+
+class StreamResolver(object):
+    """
+    Resolves youtube videos to playable audio stream urls on a worker pool. A resolved url is
+    reused until shortly before the expiry signed into it, and the next videos of a playlist
+    can be prefetched while the current one plays. The resolve function is pluggable, it
+    takes a video id and returns a stream url.
+    """
+    def __init__(self, resolve=None, cache=None, max_workers=3, expiry_margin=600, ttl=1800):
+        self.resolve = resolve or resolve_audio_url
+        self.cache = cache or StreamCache(max_entries=128, ttl=ttl)
+        self.max_workers = max_workers
+        self.expiry_margin = expiry_margin  # seconds of playback left on the url when it is dropped
+        self.executor = None
+        self.pending = {}  # video id -> future of the resolution in flight
+        self.lock = threading.Lock()
+
+    # a future of the stream url of the video
+    def stream(self, video_id):
+        stream_url = self.cache.get(video_id)
+        if stream_url is not None:
+            metrics.increment("kodi_youtube_stream_cache_total", {"result": "hit"})
+            future = concurrent.futures.Future()
+            future.set_result(stream_url)
+            return future
+        metrics.increment("kodi_youtube_stream_cache_total", {"result": "miss"})
+        with self.lock:
+            future = self.pending.get(video_id)
+            if future is None:
+                if self.executor is None:
+                    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                          thread_name_prefix="YoutubeStream")
+                future = self.executor.submit(self.fetch, video_id)
+                self.pending[video_id] = future
+        future.add_done_callback(lambda done: self.finished(video_id, done))
+        return future
+
+    def finished(self, video_id, future):
+        with self.lock:
+            if self.pending.get(video_id) is future:
+                del self.pending[video_id]
+
+    # the stream url of the video, waits at most timeout seconds for it to be resolved
+    def url(self, video_id, timeout=None):
+        return self.stream(video_id).result(timeout=timeout)
+
+    # start resolving the videos not cached or in flight yet, eg. the next items of a playlist
+    def prefetch(self, video_ids):
+        for each_id in video_ids:
+            with self.lock:
+                in_flight = each_id in self.pending
+            if not in_flight and self.cache.get(each_id) is None:
+                self.stream(each_id)
+
+    def fetch(self, video_id):
+        with metrics.timer("kodi_youtube_resolve_seconds"):
+            stream_url = self.resolve(video_id)
+        expires_at = stream_expiry(stream_url)
+        if expires_at is None:
+            self.cache.put(video_id, stream_url)
+        elif expires_at - self.expiry_margin > time.time():
+            self.cache.put(video_id, stream_url, expires_at - self.expiry_margin)
+        return stream_url
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None